@@ -0,0 +1,109 @@
+"""
+Indexing throughput with N concurrent writers: refresh per bulk vs coordinated refresh.
+
+Requires the docker-compose Elasticsearch (http://localhost:9200).
+
+$ PYTHONPATH=src python benchmarks/bench_es_refresh.py --writers 1 4 8 --docs 50
+"""
+
+import argparse
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from elasticsearch import Elasticsearch
+from elasticsearch.helpers import bulk
+
+from clients.elasticsearch.schema import DocMetadata, DocSchema
+from docs.tasks.clients.es_task import EsTaskClient
+
+ES_URL = "http://localhost:9200"
+INDEX_NAME = "bench-refresh"
+CHUNK_TEXT = "업사이클링 산업을 육성하고 지원하기 위한 정책 문단입니다. " * 20
+
+
+def make_chunks(chunks_per_doc: int):
+    doc_id = uuid.uuid4()
+    return [
+        DocSchema(
+            doc_id=doc_id,
+            order=order,
+            content=CHUNK_TEXT,
+            chunk_version="bench",
+            metadata=DocMetadata(ext="txt"),
+        )
+        for order in range(1, chunks_per_doc + 1)
+    ]
+
+
+def index_with_refresh_per_bulk(es: Elasticsearch, chunks):
+    # Previous behaviour: every document forces a segment refresh
+    bulk(
+        client=es,
+        actions=({"_id": c.chunk_id, "_source": c.model_dump()} for c in chunks),
+        index=INDEX_NAME,
+        refresh=True,
+    )
+
+
+def run(writers: int, docs_per_writer: int, chunks_per_doc: int, coordinated: bool):
+    es = Elasticsearch(ES_URL)
+    client = EsTaskClient(es_client=es)
+    stop = threading.Event()
+
+    def refresher():
+        # Stand-in for the periodic refresh_indexed_docs beat task
+        while not stop.wait(2):
+            client.refresh(INDEX_NAME)
+
+    def writer():
+        for _ in range(docs_per_writer):
+            chunks = make_chunks(chunks_per_doc)
+            if coordinated:
+                client.index_docs(chunks, INDEX_NAME)
+            else:
+                index_with_refresh_per_bulk(es, chunks)
+
+    refresh_thread = threading.Thread(target=refresher, daemon=True)
+    if coordinated:
+        refresh_thread.start()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=writers) as pool:
+        for future in [pool.submit(writer) for _ in range(writers)]:
+            future.result()
+    if coordinated:
+        # Docs only count as done once searchable
+        client.refresh(INDEX_NAME)
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    return writers * docs_per_writer / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--writers", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--docs", type=int, default=50, help="docs per writer")
+    parser.add_argument("--chunks", type=int, default=20, help="chunks per doc")
+    args = parser.parse_args()
+
+    es = Elasticsearch(ES_URL)
+    if es.indices.exists(index=INDEX_NAME):
+        es.indices.delete(index=INDEX_NAME)
+    es.indices.create(index=INDEX_NAME)
+
+    print(f"{'writers':>8} {'refresh=True':>14} {'coordinated':>14} {'speedup':>8}")
+    for writers in args.writers:
+        before = run(writers, args.docs, args.chunks, coordinated=False)
+        after = run(writers, args.docs, args.chunks, coordinated=True)
+        print(
+            f"{writers:>8} {before:>10.1f} d/s {after:>10.1f} d/s {after / before:>7.2f}x"
+        )
+
+    es.indices.delete(index=INDEX_NAME)
+
+
+if __name__ == "__main__":
+    main()
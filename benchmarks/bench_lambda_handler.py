@@ -0,0 +1,105 @@
+"""
+Upload Lambda throughput on generated S3 events: one record per invocation with a
+fresh connection (previous handler) vs. batched records on a warm connection.
+
+Requires the docker-compose MySQL and Redis. Seeds its docs in the application
+database and deletes them afterwards; the queued index tasks are purged.
+
+$ PYTHONPATH=lambda_handlers/index_doc DB_WRITE_URL=localhost REDIS_HOST=localhost \
+    python benchmarks/bench_lambda_handler.py --docs 2000 --batch-size 1 10 50
+"""
+
+import argparse
+import os
+import random
+import time
+import uuid
+
+import pymysql
+
+import index_docs
+
+SIZES = {"txt": 4 * 1024, "json": 16 * 1024, "pdf": 2 * 1024 * 1024}
+
+
+def make_record(bucket: str, doc_id: uuid.UUID, ext: str) -> dict:
+    return {
+        "eventSource": "aws:s3",
+        "eventName": "ObjectCreated:Put",
+        "s3": {
+            "bucket": {"name": bucket},
+            "object": {"key": f"docs/{doc_id}.{ext}", "size": SIZES[ext]},
+        },
+    }
+
+
+def make_events(records: list[dict], batch_size: int) -> list[dict]:
+    return [
+        {"Records": records[start : start + batch_size]}
+        for start in range(0, len(records), batch_size)
+    ]
+
+
+def seed(doc_ids: list[uuid.UUID]) -> None:
+    connection = index_docs._get_connection()
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            "INSERT INTO docs (id, name, size, extension, status, bucket, `key`, "
+            "created_at, updated_at) VALUES (%s, 'bench', 0, 'txt', "
+            "'UPLOAD_REQUESTED', 'documents', %s, NOW(), NOW())",
+            [(doc_id.hex, f"docs/{doc_id}.txt") for doc_id in doc_ids],
+        )
+    connection.commit()
+
+
+def cleanup(doc_ids: list[uuid.UUID]) -> None:
+    connection = index_docs._get_connection()
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            "DELETE FROM docs WHERE id = %s", [(doc_id.hex,) for doc_id in doc_ids]
+        )
+    connection.commit()
+    index_docs.celery_app.control.purge()
+
+
+def run(events: list[dict], cold: bool) -> float:
+    started = time.perf_counter()
+    for event in events:
+        if cold and index_docs._connection is not None:
+            # What every invocation paid before: a new connection
+            index_docs._connection.close()
+            index_docs._connection = None
+        index_docs.lambda_handler(event, None)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--bucket", default=os.getenv("BUCKET", "documents"))
+    args = parser.parse_args()
+
+    doc_ids = [uuid.uuid4() for _ in range(args.docs)]
+    records = [
+        make_record(args.bucket, doc_id, random.choice(list(SIZES)))
+        for doc_id in doc_ids
+    ]
+    seed(doc_ids)
+
+    try:
+        baseline = run(make_events(records, 1), cold=True)
+        print(f"{'batch':>6} {'conn':>5} {'docs/s':>10} {'speedup':>8}")
+        print(f"{1:>6} {'cold':>5} {args.docs / baseline:>10.1f} {1:>7.2f}x")
+        for batch_size in args.batch_size:
+            elapsed = run(make_events(records, batch_size), cold=False)
+            print(
+                f"{batch_size:>6} {'warm':>5} {args.docs / elapsed:>10.1f} "
+                f"{baseline / elapsed:>7.2f}x"
+            )
+    finally:
+        cleanup(doc_ids)
+
+
+if __name__ == "__main__":
+    main()
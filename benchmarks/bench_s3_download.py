@@ -0,0 +1,88 @@
+"""
+Download throughput of a DOC_SIZE_LIMIT sized object: single stream vs ranged parallel parts.
+
+Requires the docker-compose localstack (http://localhost:4566).
+
+$ PYTHONPATH=src python benchmarks/bench_s3_download.py --size-mb 20 --part-mb 2 4 8 --concurrency 4 8
+"""
+
+import argparse
+import os
+import time
+
+import boto3
+from botocore.config import Config as BotoConfig
+
+from clients.s3.s3 import S3Client
+
+ENDPOINT_URL = "http://localhost:4566"
+BUCKET_NAME = "bench-download"
+KEY = "docs/bench.bin"
+MB = 1024 * 1024
+
+
+def make_boto_client(max_pool_connections: int):
+    return boto3.client(
+        service_name="s3",
+        region_name="ap-northeast-2",
+        aws_access_key_id="test",
+        aws_secret_access_key="test",
+        endpoint_url=ENDPOINT_URL,
+        config=BotoConfig(max_pool_connections=max_pool_connections),
+    )
+
+
+def single_stream(boto_client, rounds: int) -> float:
+    # Previous behaviour: one GET streamed from start to end
+    started = time.perf_counter()
+    size = 0
+    for _ in range(rounds):
+        body = boto_client.get_object(Bucket=BUCKET_NAME, Key=KEY)["Body"]
+        for chunk in body.iter_chunks(chunk_size=MB):
+            size += len(chunk)
+    return size / (time.perf_counter() - started) / MB
+
+
+def ranged(boto_client, part_size: int, concurrency: int, rounds: int) -> float:
+    client = S3Client(boto_client, part_size=part_size, max_concurrency=concurrency)
+    throughputs = []
+    for _ in range(rounds):
+        downloaded = client.download_fileobj(BUCKET_NAME, KEY, max_memory_size=64 * MB)
+        throughputs.append(downloaded.throughput)
+        downloaded.close()
+    return sum(throughputs) / len(throughputs) / MB
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, default=20)
+    parser.add_argument("--part-mb", type=int, nargs="+", default=[2, 4, 8])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[4, 8])
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    boto_client = make_boto_client(max_pool_connections=max(args.concurrency))
+    boto_client.create_bucket(
+        Bucket=BUCKET_NAME,
+        CreateBucketConfiguration={"LocationConstraint": "ap-northeast-2"},
+    )
+    boto_client.put_object(
+        Bucket=BUCKET_NAME, Key=KEY, Body=os.urandom(args.size_mb * MB)
+    )
+
+    baseline = single_stream(boto_client, args.rounds)
+    print(f"{'part':>6} {'threads':>8} {'MB/s':>10} {'speedup':>8}")
+    print(f"{'-':>6} {1:>8} {baseline:>10.1f} {1:>7.2f}x")
+    for part_mb in args.part_mb:
+        for concurrency in args.concurrency:
+            mbps = ranged(boto_client, part_mb * MB, concurrency, args.rounds)
+            print(
+                f"{part_mb:>4}MB {concurrency:>8} {mbps:>10.1f} {mbps / baseline:>7.2f}x"
+            )
+
+    boto_client.delete_object(Bucket=BUCKET_NAME, Key=KEY)
+    boto_client.delete_bucket(Bucket=BUCKET_NAME)
+
+
+if __name__ == "__main__":
+    main()
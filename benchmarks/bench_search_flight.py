@@ -0,0 +1,85 @@
+"""
+Fan-in of `DocReader.search_docs` under bursts of identical questions, with and
+without single-flight coalescing.
+
+Each burst fires `--burst` concurrent `/question` calls at a popular doc, spread
+over `--spread` ms, against a fake Elasticsearch taking `--latency` ms per
+search. Reports ES calls, fan-in and mean latency. No services needed.
+
+$ PYTHONPATH=src python benchmarks/bench_search_flight.py --burst 10 50 200
+"""
+
+import argparse
+import asyncio
+import random
+import time
+import uuid
+
+from base.single_flight import SingleFlight
+from clients.elasticsearch.schema import DocMetadata, DocSchema
+from docs.services.doc_reader import DocReader
+
+
+class FakeEsClient:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+
+    async def search_docs(self, index_name: str, doc_id: str, query: str, size: int):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return [
+            DocSchema(
+                doc_id=doc_id, order=1, content=query, metadata=DocMetadata(ext="txt")
+            )
+        ]
+
+
+async def run_burst(
+    burst: int, spread: float, latency: float, coalesce: bool
+) -> tuple[int, float]:
+    es_client = FakeEsClient(latency)
+    doc_reader = DocReader(
+        es_client=es_client,
+        doc_index_name="documents",
+        session_manager=None,
+        repo=None,
+        status_hub=None,
+        events_heartbeat=15,
+        events_timeout=600,
+        search_flight=SingleFlight() if coalesce else None,
+    )
+    doc_id = str(uuid.uuid4())
+
+    async def ask() -> float:
+        await asyncio.sleep(random.uniform(0, spread))
+        start = time.perf_counter()
+        await doc_reader.search_docs(question="shared question", doc_id=doc_id)
+        return time.perf_counter() - start
+
+    latencies = await asyncio.gather(*(ask() for _ in range(burst)))
+    return es_client.calls, sum(latencies) / len(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--burst", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--spread", type=float, default=20, help="ms")
+    parser.add_argument("--latency", type=float, default=30, help="ms")
+    args = parser.parse_args()
+
+    print(f"{'burst':>6} {'mode':>10} {'es calls':>9} {'fan-in':>7} {'mean ms':>8}")
+    for burst in args.burst:
+        for coalesce in (False, True):
+            calls, mean = asyncio.run(
+                run_burst(burst, args.spread / 1000, args.latency / 1000, coalesce)
+            )
+            mode = "coalesced" if coalesce else "direct"
+            print(
+                f"{burst:>6} {mode:>10} {calls:>9} {burst / calls:>7.1f} "
+                f"{mean * 1000:>8.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
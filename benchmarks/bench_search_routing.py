@@ -0,0 +1,131 @@
+"""
+Per-doc search latency by shard count, with chunks routed by doc_id vs spread
+over every shard.
+
+Indexes `--docs` docs of `--chunks` chunks into an index per shard count and
+layout, then runs `--searches` single-doc searches against each and reports
+p50/p99 latency.
+
+Requires the docker-compose Elasticsearch (http://localhost:9200).
+
+$ PYTHONPATH=src python benchmarks/bench_search_routing.py --shards 1 3 6
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+import uuid
+
+from elasticsearch import AsyncElasticsearch, Elasticsearch
+from elasticsearch.helpers import bulk
+
+from clients.elasticsearch.es import ANALYZER_NAME, EsClient
+from clients.elasticsearch.schema import DocMetadata, DocSchema
+from docs.tasks.clients.es_task import EsTaskClient
+
+ES_URL = "http://localhost:9200"
+INDEX_PREFIX = "bench-routing"
+CHUNK_TEXT = "업사이클링 산업을 육성하고 지원하기 위한 정책 문단입니다. "
+QUESTIONS = ["업사이클링 정책", "산업 육성", "지원 문단"]
+
+
+def make_chunks(doc_id: uuid.UUID, chunks_per_doc: int):
+    return [
+        DocSchema(
+            doc_id=doc_id,
+            order=order,
+            content=CHUNK_TEXT * random.randint(5, 20),
+            chunk_version="bench",
+            metadata=DocMetadata(ext="txt"),
+        )
+        for order in range(1, chunks_per_doc + 1)
+    ]
+
+
+def create_index(es: Elasticsearch, index_name: str, shards: int, routed: bool):
+    if es.indices.exists(index=index_name):
+        es.indices.delete(index=index_name)
+
+    mappings = {"properties": DocSchema.create_map(ANALYZER_NAME)}
+    if routed:
+        mappings["_routing"] = {"required": True}
+    es.indices.create(
+        index=index_name,
+        settings={
+            "number_of_shards": shards,
+            "number_of_replicas": 0,
+            "analysis": EsClient(es_client=None)._get_settings(),
+        },
+        mappings=mappings,
+    )
+
+
+def index_docs(es: Elasticsearch, index_name: str, chunks, routed: bool):
+    if routed:
+        EsTaskClient(es_client=es).index_docs(chunks, index_name)
+    else:
+        # Previous behaviour: chunks spread over shards by their own id
+        bulk(
+            client=es,
+            actions=({"_id": c.chunk_id, "_source": c.model_dump()} for c in chunks),
+            index=index_name,
+        )
+
+
+async def measure(index_name: str, doc_ids, searches: int, routed: bool):
+    es = AsyncElasticsearch(ES_URL)
+    es_client = EsClient(es_client=es)
+    latencies = []
+    try:
+        for _ in range(searches):
+            doc_id = str(random.choice(doc_ids))
+            body = es_client._search_body(
+                random.choice(QUESTIONS), 10, {"term": {"doc_id": doc_id}}
+            )
+            start = time.perf_counter()
+            await es.search(
+                index=index_name, body=body, routing=doc_id if routed else None
+            )
+            latencies.append(time.perf_counter() - start)
+    finally:
+        await es.close()
+    return latencies
+
+
+def percentile(latencies, pct: float) -> float:
+    return statistics.quantiles(latencies, n=100)[int(pct) - 1] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 3, 6])
+    parser.add_argument("--docs", type=int, default=200)
+    parser.add_argument("--chunks", type=int, default=50, help="chunks per doc")
+    parser.add_argument("--searches", type=int, default=2000)
+    args = parser.parse_args()
+
+    es = Elasticsearch(ES_URL)
+    doc_ids = [uuid.uuid4() for _ in range(args.docs)]
+
+    print(f"{'shards':>7} {'layout':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for shards in args.shards:
+        for routed in (False, True):
+            index_name = f"{INDEX_PREFIX}-{shards}-{'routed' if routed else 'spread'}"
+            create_index(es, index_name, shards, routed)
+            for doc_id in doc_ids:
+                index_docs(es, index_name, make_chunks(doc_id, args.chunks), routed)
+            es.indices.refresh(index=index_name)
+
+            latencies = asyncio.run(measure(index_name, doc_ids, args.searches, routed))
+            layout = "routed" if routed else "spread"
+            print(
+                f"{shards:>7} {layout:>8} {percentile(latencies, 50):>8.1f} "
+                f"{percentile(latencies, 99):>8.1f}"
+            )
+            es.indices.delete(index=index_name)
+
+
+if __name__ == "__main__":
+    main()
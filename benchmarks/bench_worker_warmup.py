@@ -0,0 +1,69 @@
+"""
+First-task latency of a fresh worker process, cold vs. warmed up at startup.
+
+Each round spawns a new process, like a worker child, and times its first parse of
+a sample file. With --warm the process runs `warm_up` first, as `init_worker` does.
+
+$ PYTHONPATH=src python benchmarks/bench_worker_warmup.py --rounds 5
+"""
+
+import argparse
+import multiprocessing
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from docs.tasks.services.doc_parser import (
+    DEFAULT_CHUNK_OVERLAP,
+    DEFAULT_CHUNK_SIZE,
+    parse_chunks,
+    warm_up,
+)
+
+SAMPLE_DIR = Path(__file__).parent.parent / "sample_files"
+
+
+def timed_parse(path: str, ext: str) -> float:
+    started = time.perf_counter()
+    parse_chunks(path, ext, DEFAULT_CHUNK_SIZE, DEFAULT_CHUNK_OVERLAP)
+    return time.perf_counter() - started
+
+
+def timed_warm_up() -> float:
+    started = time.perf_counter()
+    warm_up()
+    return time.perf_counter() - started
+
+
+def first_task(path: Path, warm: bool) -> tuple[float, float]:
+    # Returns (startup, first parse) seconds of a fresh process
+    with ProcessPoolExecutor(
+        max_workers=1, mp_context=multiprocessing.get_context("spawn")
+    ) as pool:
+        startup = pool.submit(timed_warm_up).result() if warm else 0.0
+        first = pool.submit(timed_parse, str(path), path.suffix[1:]).result()
+    return startup, first
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument(
+        "--files", nargs="+", default=["sample.txt", "sample.pdf", "sample.docx"]
+    )
+    args = parser.parse_args()
+
+    print(f"{'file':<14} {'mode':<6} {'startup ms':>11} {'first task ms':>14}")
+    for name in args.files:
+        path = SAMPLE_DIR / name
+        for warm in (False, True):
+            runs = [first_task(path, warm) for _ in range(args.rounds)]
+            startup = statistics.median(run[0] for run in runs) * 1000
+            first = statistics.median(run[1] for run in runs) * 1000
+            mode = "warm" if warm else "cold"
+            print(f"{name:<14} {mode:<6} {startup:>11.1f} {first:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+import json
 import time
 import requests
 import pprint
@@ -7,6 +8,14 @@ UPLOAD_URL = "http://localhost:8000/api/v1/docs/upload-url"
 GET_DOCS_URL = "http://localhost:8000/api/v1/docs"
 QUESTION_URL = "http://localhost:8000/api/v1/docs/question"
 
+IN_PROGRESS_STATUSES = {
+    "UPLOAD_REQUESTED",
+    "UPLOADED",
+    "INDEXING",
+    "RETRYING",
+    "REFRESH_PENDING",
+}
+
 # sample_files 디렉터리 설정
 BASE_DIR = Path(__file__).parent
 SAMPLE_DIR = BASE_DIR / "sample_files"
@@ -33,6 +42,25 @@ def get_file_info(file_path: Path) -> tuple[str, int]:
     size = file_path.stat().st_size
     return extension, size
 
+def wait_for_indexing(doc_id: str) -> str | None:
+    # 상태 변경은 SSE 로 전달받고, 스트림이 끊기면 다시 연결
+    while True:
+        status = None
+        with requests.get(GET_DOCS_URL + f"/{doc_id}/events", stream=True) as res:
+            res.raise_for_status()
+            for line in res.iter_lines(decode_unicode=True):
+                if not line.startswith("data:"):
+                    continue
+
+                status = json.loads(line[len("data:"):])["status"]
+                if status not in IN_PROGRESS_STATUSES:
+                    return status
+                print(f"파일 인덱싱 상태: {status}")
+
+        if status is None:
+            return None
+        time.sleep(1)
+
 def upload_all_files():
     if not SAMPLE_DIR.exists():
         raise FileNotFoundError(f"디렉터리가 존재하지 않습니다: {SAMPLE_DIR}")
@@ -63,19 +91,8 @@ def upload_all_files():
                 response.raise_for_status()
                 print(f"업로드 성공: {file_path.name}")
 
-            time.sleep(1)
             print(f"파일 인덱싱 상태 확인...")
-            status = None
-            while True:
-                res = requests.get(GET_DOCS_URL + f"/{doc_id}")
-                data = res.json()
-
-                if (data["status"] != "UPLOADED"):
-                    status = data["status"]
-                    break
-
-                print(f"파일 인덱싱 상태: {data['status']}")
-                time.sleep(1)
+            status = wait_for_indexing(doc_id)
             
             if status != "INDEXED":
                 print(f"파일 인덱싱 실패: {file_path.name} (상태: {status})")
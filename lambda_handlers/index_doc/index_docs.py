@@ -1,13 +1,26 @@
+import json
 import os
 import uuid
+from collections import defaultdict
+from typing import Dict, List, Optional
 
 import pymysql
 import pymysql.cursors
+import redis
 from celery import Celery
 
 REDIS_HOST = os.getenv("REDIS_HOST", "redis")
 REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
 
+# Same routing as the worker's DocQueueRouter
+SMALL_DOC_QUEUE = os.getenv("SMALL_DOC_QUEUE", "docs.small")
+BULK_DOC_QUEUE = os.getenv("BULK_DOC_QUEUE", "docs.bulk")
+SMALL_DOC_SIZE_LIMIT = int(os.getenv("SMALL_DOC_SIZE_LIMIT", 1024 * 1024))
+SMALL_DOC_EXTENSIONS = os.getenv("SMALL_DOC_EXTENSIONS", "txt,json,py").split(",")
+
+# Same channels as the worker's StatusPublisher
+STATUS_CHANNEL_PREFIX = os.getenv("STATUS_CHANNEL_PREFIX", "docs:status:")
+
 celery_app = Celery(
     "tasks",
     broker=f"redis://{REDIS_HOST}:{REDIS_PORT}/0",
@@ -17,40 +30,114 @@ celery_app = Celery(
     accept_content=["msgpack"],
 )
 
+status_redis = redis.Redis(host=REDIS_HOST, port=REDIS_PORT)
+
+# Kept across warm invocations of the same container
+_connection: Optional[pymysql.connections.Connection] = None
+
 
 def lambda_handler(event, _):
-    try:
-        s3_record = event["Records"][0]["s3"]
-        bucket_name = s3_record["bucket"]["name"]
-        object_key = s3_record["object"]["key"]
-    except (KeyError, IndexError):
+    uploads = _parse_records(event)
+    if not uploads:
         return {"statusCode": 400, "body": "Invalid S3 event format"}
 
-    print(f"File received: s3://{bucket_name}/{object_key}")
+    print(f"Files received: {len(uploads)}")
+
+    # One UPDATE for every doc of the event
+    doc_ids = [upload["doc_id"] for upload in uploads]
+    connection = _get_connection()
+    with connection.cursor() as cursor:
+        placeholders = ", ".join(["%s"] * len(doc_ids))
+        sql = f"UPDATE docs SET status = %s WHERE id IN ({placeholders})"
+        cursor.execute(sql, ("UPLOADED", *doc_ids))
+    connection.commit()
+    _publish_uploaded(doc_ids)
+
+    # One message per queue, a single doc keeps the plain index task
+    by_queue: Dict[str, List[Dict[str, str]]] = defaultdict(list)
+    for upload in uploads:
+        by_queue[upload["queue"]].append(
+            {"bucket": upload["bucket"], "key": upload["key"]}
+        )
+
+    for queue, req in by_queue.items():
+        if len(req) == 1:
+            celery_app.send_task("docs.tasks.index_docs", args=req, queue=queue)
+        else:
+            celery_app.send_task("docs.tasks.index_docs_batch", args=[req], queue=queue)
+
+    return {"statusCode": 200, "body": f"{len(uploads)} files queued"}
 
-    # Extract doc_id from object_key (last part without extension)
-    doc_id = uuid.UUID(os.path.splitext(object_key.split("/")[-1])[0]).hex
 
-    # Connect to MySQL
-    connection = pymysql.connect(
+def _parse_records(event) -> List[Dict]:
+    # Direct S3 notifications carry the S3 records, SQS deliveries wrap an S3
+    # event in each record's body. Malformed records are skipped, not fatal.
+    uploads = []
+    for record in event.get("Records", []):
+        if "body" in record:
+            try:
+                uploads.extend(_parse_records(json.loads(record["body"])))
+            except (TypeError, ValueError):
+                print(f"Skipped record with invalid body: {record.get('messageId')}")
+            continue
+
+        try:
+            s3_record = record["s3"]
+            bucket_name = s3_record["bucket"]["name"]
+            object_key = s3_record["object"]["key"]
+            object_size = s3_record["object"]["size"]
+            # Extract doc_id from object_key (last part without extension)
+            doc_id = uuid.UUID(os.path.splitext(object_key.split("/")[-1])[0]).hex
+        except (KeyError, TypeError, ValueError):
+            print(f"Skipped invalid S3 record: {record}")
+            continue
+
+        uploads.append(
+            {
+                "bucket": bucket_name,
+                "key": object_key,
+                "doc_id": doc_id,
+                "queue": _route(object_size, os.path.splitext(object_key)[1][1:]),
+            }
+        )
+    return uploads
+
+
+def _get_connection() -> pymysql.connections.Connection:
+    global _connection
+
+    if _connection is not None:
+        try:
+            # Reconnects in place when the server closed the idle connection
+            _connection.ping(reconnect=True)
+            return _connection
+        except pymysql.err.Error:
+            _connection = None
+
+    _connection = pymysql.connect(
         host=os.getenv("DB_WRITE_URL", "db"),
         user=os.getenv("DB_WRITE_USER", "root"),
         password=os.getenv("DB_WRITE_PASSWORD", "rag"),
         database=os.getenv("DB_WRITE_NAME", "rag"),
         cursorclass=pymysql.cursors.DictCursor,
     )
+    return _connection
+
 
+def _publish_uploaded(doc_ids: List[str]) -> None:
+    # Best effort, clients waiting on the doc fall back to its DB status
+    pipe = status_redis.pipeline(transaction=False)
+    for doc_id in doc_ids:
+        doc_uuid = str(uuid.UUID(doc_id))
+        event = {"docId": doc_uuid, "status": "UPLOADED"}
+        pipe.publish(f"{STATUS_CHANNEL_PREFIX}{doc_uuid}", json.dumps(event))
     try:
-        with connection.cursor() as cursor:
-            # Update status to "uploaded" for the given doc_id
-            sql = "UPDATE docs SET status = %s WHERE id = %s"
-            cursor.execute(sql, ("UPLOADED", doc_id))
-            connection.commit()
-    finally:
-        connection.close()
-
-    celery_app.send_task(
-        "docs.tasks.index_docs", args=[{"bucket": bucket_name, "key": object_key}]
-    )
+        pipe.execute()
+    except redis.RedisError as e:
+        print(f"Failed to publish status events: {e}")
+
 
-    return {"statusCode": 200}
+def _route(size: int, extension: str) -> str:
+    if size <= SMALL_DOC_SIZE_LIMIT and extension in SMALL_DOC_EXTENSIONS:
+        return SMALL_DOC_QUEUE
+    return BULK_DOC_QUEUE
@@ -37,7 +37,7 @@ LAMBDA_ARN=$(awslocal lambda create-function \
   --zip-file fileb:///tmp/lambda.zip \
   --timeout 300 \
   --memory-size 512 \
-  --environment "Variables={ES_HOST=http://es_n1:9200,ES_INDEX=documents}" \
+  --environment "Variables={ES_HOST=http://es_n1:9200,ES_INDEX=documents,SMALL_DOC_QUEUE=docs.small,BULK_DOC_QUEUE=docs.bulk,SMALL_DOC_SIZE_LIMIT=1048576}" \
   --query 'FunctionArn' --output text)
 
 echo "Created Lambda function: ${LAMBDA_ARN}"
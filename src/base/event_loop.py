@@ -0,0 +1,21 @@
+import asyncio
+import threading
+from typing import Iterator
+
+__all__ = ["init_event_loop"]
+
+
+def init_event_loop() -> Iterator[asyncio.AbstractEventLoop]:
+    # A loop running for the life of the worker process, so async clients and
+    # their connection pools outlive a single task. Sync task code hands it
+    # coroutines with `asyncio.run_coroutine_threadsafe`.
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, name="event-loop", daemon=True)
+    thread.start()
+
+    try:
+        yield loop
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
@@ -0,0 +1,71 @@
+import asyncio
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Generic, Hashable, List, Tuple, TypeVar
+
+__all__ = ["FlightStats", "SingleFlight"]
+
+T = TypeVar("T")
+
+
+@dataclass
+class FlightStats:
+    calls: int = 0
+    flights: int = 0
+
+    @property
+    def fan_in(self) -> float:
+        # Callers served per call actually made
+        return self.calls / self.flights if self.flights else 0.0
+
+
+class SingleFlight(Generic[T]):
+    """Coalesces concurrent calls with the same key into one in-flight call.
+
+    Callers arriving while a call for their key is running wait for it and get
+    its result or exception. The call runs in a task of its own, so a caller
+    that is cancelled never cancels it for the others. Stats are kept for the
+    `max_tracked_keys` most recently used keys.
+    """
+
+    def __init__(self, max_tracked_keys: int = 1000):
+        self.max_tracked_keys = max_tracked_keys
+        self.total = FlightStats()
+        self._stats: OrderedDict[Hashable, FlightStats] = OrderedDict()
+        self._flights: Dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        stats = self._track(key)
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = asyncio.ensure_future(fn())
+            self._flights[key] = flight
+            flight.add_done_callback(lambda done: self._land(key, done))
+            stats.flights += 1
+            self.total.flights += 1
+
+        stats.calls += 1
+        self.total.calls += 1
+        return await asyncio.shield(flight)
+
+    def top_keys(self, limit: int) -> List[Tuple[Hashable, FlightStats]]:
+        return sorted(
+            self._stats.items(), key=lambda item: item[1].calls, reverse=True
+        )[:limit]
+
+    def _track(self, key: Hashable) -> FlightStats:
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = FlightStats()
+            if len(self._stats) > self.max_tracked_keys:
+                self._stats.popitem(last=False)
+        else:
+            self._stats.move_to_end(key)
+        return stats
+
+    def _land(self, key: Hashable, flight: asyncio.Task) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        # Every caller may have been cancelled, nobody else retrieves it
+        if not flight.cancelled():
+            flight.exception()
@@ -2,11 +2,20 @@ import os
 from pathlib import Path
 
 from celery import Celery
-from celery.signals import worker_process_init, worker_process_shutdown
+from celery.concurrency import get_implementation
+from celery.concurrency.prefork import TaskPool as PreforkPool
+from celery.concurrency.solo import TaskPool as SoloPool
+from celery.signals import (
+    worker_init,
+    worker_process_init,
+    worker_process_shutdown,
+    worker_shutdown,
+)
 
 from celery_containers import CeleryContainer
 from celery_schedule import CELERY_SCHEDULE
 from config.config import Config
+from docs.tasks.services.doc_parser import warm_up
 
 
 def _find_task_modules() -> list[str]:
@@ -57,11 +66,32 @@ def create_celery_app() -> Celery:
     celery_app.conf.beat_schedule = CELERY_SCHEDULE
     celery_app.container = container
 
-    @worker_process_init.connect(sender=celery_app)
-    def init_worker(**kwargs):
+    def init_process():
         celery_app.container.es_client()
+        celery_app.container.parser_pool.init()
+        # Readers, tokenizer and default splitter are ready before the first task
+        warm_up()
+
+    # worker_process_init is sent with sender=None, and signals only hold weak
+    # references by default, so these local handlers connect with weak=False.
+    # Prefork children and the solo pool send worker_process_init
+    @worker_process_init.connect(weak=False)
+    def init_worker_process(**kwargs):
+        init_process()
+
+    # gevent, eventlet and thread pools run tasks in the worker's own process
+    @worker_init.connect(weak=False)
+    def init_worker(sender, **kwargs):
+        if not issubclass(get_implementation(sender.pool_cls), (PreforkPool, SoloPool)):
+            init_process()
+
+    # Flushes the status buffer, among other resources. Prefork children send
+    # worker_process_shutdown, the worker's own process sends worker_shutdown
+    @worker_process_shutdown.connect(weak=False)
+    def shutdown_worker_process(**kwargs):
+        celery_app.container.shutdown_resources()
 
-    @worker_process_shutdown.connect(sender=celery_app)
+    @worker_shutdown.connect(weak=False)
     def shutdown_worker(**kwargs):
         celery_app.container.shutdown_resources()
 
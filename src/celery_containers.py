@@ -1,14 +1,25 @@
 import boto3
+import redis
+from botocore.config import Config as BotoConfig
 from dependency_injector import containers, providers
-from elasticsearch import Elasticsearch
+from elasticsearch import AsyncElasticsearch, Elasticsearch
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import Session, sessionmaker
 
-from clients.s3.s3 import S3Client
+from base.event_loop import init_event_loop
+from clients.s3.s3 import S3Client, init_async_s3_client
 from db.db import WriteSessionSyncManager
-from docs.tasks.clients.es_task import EsTaskClient
+from docs.tasks.clients.chunk_cache import ChunkCache
+from docs.tasks.clients.es_task import AsyncEsTaskClient, EsTaskClient
+from docs.tasks.clients.search_cache_invalidator import SearchCacheInvalidator
+from docs.tasks.clients.status_publisher import StatusPublisher
 from docs.tasks.repositories.doc_task_repository import DocTaskRepository
+from docs.tasks.services.async_doc_writer import AsyncDocWriter
+from docs.tasks.services.doc_parser import init_parser_pool
 from docs.tasks.services.doc_writer import DocWriter
+from docs.tasks.services.queue_router import DocQueueRouter
+from docs.tasks.services.status_buffer import init_status_buffer
 
 __all__ = ["CeleryContainer"]
 
@@ -45,6 +56,12 @@ class CeleryContainer(containers.DeclarativeContainer):
     es_client = providers.Factory(
         EsTaskClient,
         es_client=_es,
+        chunk_size=config.ELASTICSEARCH.BULK_CHUNK_SIZE,
+        max_chunk_bytes=config.ELASTICSEARCH.BULK_MAX_CHUNK_BYTES,
+        thread_count=config.ELASTICSEARCH.BULK_THREAD_COUNT,
+        max_retries=config.ELASTICSEARCH.BULK_MAX_RETRIES,
+        initial_backoff=config.ELASTICSEARCH.BULK_INITIAL_BACKOFF,
+        max_backoff=config.ELASTICSEARCH.BULK_MAX_BACKOFF,
     )
 
     # s3
@@ -55,15 +72,64 @@ class CeleryContainer(containers.DeclarativeContainer):
         aws_access_key_id=config.AWS.ACCESS_KEY_ID,
         aws_secret_access_key=config.AWS.SECRET_ACCESS_KEY,
         endpoint_url=config.AWS.ENDPOINT_URL,
+        config=providers.Factory(
+            BotoConfig,
+            max_pool_connections=config.S3.MAX_POOL_CONNECTIONS,
+        ),
     )
 
     s3_client = providers.Factory(
         S3Client,
         s3_client=_s3_boto_client,
+        part_size=config.S3.DOWNLOAD_PART_SIZE,
+        max_concurrency=config.S3.DOWNLOAD_CONCURRENCY,
     )
 
     doc_repository = providers.Factory(DocTaskRepository)
 
+    # Persistent, warmed-up processes for the CPU-bound read/split stage
+    parser_pool = providers.Resource(
+        init_parser_pool,
+        processes=config.DOCUMENT.PARSER_PROCESSES,
+    )
+
+    chunk_cache = providers.Singleton(
+        ChunkCache,
+        cache_dir=config.DOCUMENT.CHUNK_CACHE_DIR,
+        max_bytes=config.DOCUMENT.CHUNK_CACHE_SIZE,
+    )
+
+    queue_router = providers.Singleton(
+        DocQueueRouter,
+        small_queue=config.CELERY.SMALL_DOC_QUEUE,
+        bulk_queue=config.CELERY.BULK_DOC_QUEUE,
+        small_size_limit=config.CELERY.SMALL_DOC_SIZE_LIMIT,
+        small_extensions=config.CELERY.SMALL_DOC_EXTENSIONS,
+    )
+
+    # Status events and search cache invalidations go over the broker's Redis
+    _redis = providers.Singleton(redis.Redis.from_url, config.CELERY.BROKER_URL)
+    status_publisher = providers.Singleton(
+        StatusPublisher,
+        redis_client=_redis,
+        channel_prefix=config.DOCUMENT.STATUS_CHANNEL_PREFIX,
+    )
+    search_cache_invalidator = providers.Singleton(
+        SearchCacheInvalidator,
+        redis_client=_redis,
+        key_prefix=config.DOCUMENT.SEARCH_CACHE_PREFIX,
+    )
+
+    # Per worker process, flushed on worker_process_shutdown/worker_shutdown
+    status_buffer = providers.Resource(
+        init_status_buffer,
+        write_session_manager=write_session_manager.provider,
+        repo=doc_repository,
+        max_size=config.DOCUMENT.STATUS_BUFFER_SIZE,
+        flush_interval=config.DOCUMENT.STATUS_FLUSH_INTERVAL,
+        status_publisher=status_publisher,
+    )
+
     doc_writer = providers.Factory(
         DocWriter,
         s3_client=s3_client,
@@ -74,4 +140,81 @@ class CeleryContainer(containers.DeclarativeContainer):
         allowed_extensions=config.DOCUMENT.ALLOWED_EXTENSIONS,
         doc_size_limit=config.DOCUMENT.DOC_SIZE_LIMIT,
         doc_index_name=config.ELASTICSEARCH.INDEX,
+        refresh_mode=config.ELASTICSEARCH.REFRESH_MODE,
+        batch_concurrency=config.DOCUMENT.BATCH_CONCURRENCY,
+        in_memory_limit=config.DOCUMENT.IN_MEMORY_DOWNLOAD_LIMIT,
+        retry_batch_size=config.DOCUMENT.RETRY_BATCH_SIZE,
+        parser_pool=parser_pool,
+        chunk_cache=chunk_cache,
+        retry_max_attempts=config.DOCUMENT.RETRY_MAX_ATTEMPTS,
+        retry_base_delay=config.DOCUMENT.RETRY_BASE_DELAY,
+        retry_max_delay=config.DOCUMENT.RETRY_MAX_DELAY,
+        retry_lease_timeout=config.DOCUMENT.RETRY_LEASE_TIMEOUT,
+        queue_router=queue_router,
+        status_buffer=status_buffer,
+        status_publisher=status_publisher,
+        search_cache_invalidator=search_cache_invalidator,
+    )
+
+    # Async variant, driven from sync tasks on a per-process event loop
+    event_loop = providers.Resource(init_event_loop)
+
+    _async_write_db_engine = providers.Singleton(
+        create_async_engine,
+        url=providers.Callable(
+            "mysql+aiomysql://{user}:{password}@{url}/{name}".format,
+            user=config.DATABASE.WRITE_USER,
+            password=config.DATABASE.WRITE_PASSWORD,
+            url=config.DATABASE.WRITE_URL,
+            name=config.DATABASE.WRITE_NAME,
+        ),
+        pool_size=config.DATABASE.POOL_SIZE,
+        max_overflow=config.DATABASE.MAX_OVERFLOW,
+        pool_timeout=config.DATABASE.POOL_TIMEOUT,
+        pool_recycle=config.DATABASE.POOL_RECYCLE,
+        pool_pre_ping=config.DATABASE.POOL_PRE_PING,
+    )
+    _async_write_db_session_maker = providers.Singleton(
+        async_sessionmaker, bind=_async_write_db_engine, class_=AsyncSession
+    )
+
+    _async_es = providers.Singleton(
+        AsyncElasticsearch, hosts=config.ELASTICSEARCH.ENDPOINT
+    )
+    async_es_client = providers.Factory(
+        AsyncEsTaskClient,
+        es_client=_async_es,
+        chunk_size=config.ELASTICSEARCH.BULK_CHUNK_SIZE,
+        max_chunk_bytes=config.ELASTICSEARCH.BULK_MAX_CHUNK_BYTES,
+        concurrency=config.ELASTICSEARCH.BULK_THREAD_COUNT,
+        max_retries=config.ELASTICSEARCH.BULK_MAX_RETRIES,
+        initial_backoff=config.ELASTICSEARCH.BULK_INITIAL_BACKOFF,
+        max_backoff=config.ELASTICSEARCH.BULK_MAX_BACKOFF,
+    )
+
+    # Closes its aiohttp session on worker (process) shutdown
+    async_s3_client = providers.Resource(
+        init_async_s3_client,
+        loop=event_loop,
+        s3_client=_s3_boto_client,
+        part_size=config.S3.DOWNLOAD_PART_SIZE,
+        max_concurrency=config.S3.DOWNLOAD_CONCURRENCY,
+    )
+
+    async_doc_writer = providers.Factory(
+        AsyncDocWriter,
+        s3_client=async_s3_client,
+        es_client=async_es_client,
+        session_maker=_async_write_db_session_maker,
+        repo=doc_repository,
+        bucket_name=config.S3.DOCS_BUCKET,
+        allowed_extensions=config.DOCUMENT.ALLOWED_EXTENSIONS,
+        doc_index_name=config.ELASTICSEARCH.INDEX,
+        refresh_mode=config.ELASTICSEARCH.REFRESH_MODE,
+        in_memory_limit=config.DOCUMENT.IN_MEMORY_DOWNLOAD_LIMIT,
+        concurrency=config.DOCUMENT.ASYNC_CONCURRENCY,
+        parser_pool=parser_pool,
+        chunk_cache=chunk_cache,
+        status_publisher=status_publisher,
+        search_cache_invalidator=search_cache_invalidator,
     )
@@ -7,4 +7,8 @@ CELERY_SCHEDULE = {
         "task": "docs.tasks.handle_fail_indexing",
         "schedule": timedelta(minutes=10),
     },
+    "refresh_indexed_docs": {
+        "task": "docs.tasks.refresh_indexed_docs",
+        "schedule": timedelta(seconds=2),
+    },
 }
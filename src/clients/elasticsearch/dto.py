@@ -0,0 +1,9 @@
+from pydantic import BaseModel
+
+__all__ = ["SearchQuery"]
+
+
+class SearchQuery(BaseModel):
+    doc_id: str
+    query: str
+    size: int = 10
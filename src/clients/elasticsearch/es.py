@@ -1,15 +1,23 @@
-from typing import Type, List
+import logging
+from typing import Dict, Iterable, List, Optional, Type
 
 from elasticsearch import AsyncElasticsearch
 
+from clients.elasticsearch.dto import SearchQuery
+from clients.elasticsearch.exceptions import FailToSearchError
 from clients.elasticsearch.schema import DocSchema
 
 __all__ = ["EsClient"]
 
+logger = logging.getLogger(__name__)
+
 TOKENIZER_NAME = "kr_tokenizer"
 FILTER_NAME = "kr_filter"
 ANALYZER_NAME = "kr_analyzer"
 
+# Index name -> whether its chunks are routed by doc_id, read once per process
+_routed_indices: Dict[str, bool] = {}
+
 
 class EsClient:
     def __init__(self, es_client: AsyncElasticsearch):
@@ -18,6 +26,11 @@ class EsClient:
     async def create_idx(self, schema: Type[DocSchema], index_name: str, clear=False):
         idx_exists = await self.es_client.indices.exists(index=index_name)
         if idx_exists and not clear:
+            # Fields added to the schema after the index was created
+            await self.es_client.indices.put_mapping(
+                index=index_name, properties=schema.create_map(ANALYZER_NAME)
+            )
+            await self._check_routing(index_name)
             return
 
         if idx_exists:
@@ -27,41 +40,113 @@ class EsClient:
             index=index_name,
             body={
                 "settings": {"analysis": self._get_settings()},
-                "mappings": {"properties": schema.create_map(ANALYZER_NAME)},
+                "mappings": {
+                    # Chunks are routed by doc_id, see `EsTaskClient.index_docs`
+                    "_routing": {"required": True},
+                    "properties": schema.create_map(ANALYZER_NAME),
+                },
             },
         )
+        _routed_indices[index_name] = True
 
     async def search_docs(
         self, index_name: str, doc_id: str, query: str, size: int = 10
     ) -> List[DocSchema]:
         res = await self.es_client.search(
             index=index_name,
-            body={
-                "query": {
-                    "bool": {
-                        "must": [
-                            {
-                                "match": {
-                                    "content": {
-                                        "query": query,
-                                        "analyzer": ANALYZER_NAME,
-                                    }
-                                }
-                            },
-                        ],
-                        "filter": [
-                            {
-                                "term": {
-                                    "doc_id": doc_id,
+            body=self._search_body(query, size, {"term": {"doc_id": doc_id}}),
+            routing=await self._routing(index_name, [doc_id]),
+        )
+
+        return self._parse_hits(res)
+
+    async def search_docs_in(
+        self, index_name: str, doc_ids: List[str], query: str, size: int = 10
+    ) -> List[DocSchema]:
+        # One query over all the docs, ES merges the top `size` chunks by score
+        if not doc_ids:
+            return []
+
+        res = await self.es_client.search(
+            index=index_name,
+            body=self._search_body(query, size, {"terms": {"doc_id": doc_ids}}),
+            routing=await self._routing(index_name, doc_ids),
+        )
+
+        return self._parse_hits(res)
+
+    async def msearch_docs(
+        self, index_name: str, queries: List[SearchQuery]
+    ) -> List[List[DocSchema] | FailToSearchError]:
+        # One _msearch round trip, results in the order of `queries`. A failed
+        # query comes back as its error instead of failing the others.
+        if not queries:
+            return []
+
+        routed = await self._is_routed(index_name)
+        searches = []
+        for query in queries:
+            searches.append({"routing": query.doc_id} if routed else {})
+            searches.append(
+                self._search_body(
+                    query.query, query.size, {"term": {"doc_id": query.doc_id}}
+                )
+            )
+
+        res = await self.es_client.msearch(index=index_name, searches=searches)
+
+        results: List[List[DocSchema] | FailToSearchError] = []
+        for response in res["responses"]:
+            if "error" in response:
+                error = response["error"]
+                reason = error.get("reason") if isinstance(error, dict) else error
+                results.append(FailToSearchError(detail=reason))
+            else:
+                results.append(self._parse_hits(response))
+        return results
+
+    async def _check_routing(self, index_name: str) -> None:
+        if not await self._is_routed(index_name):
+            logger.warning(
+                "Index %s does not require routing, its searches hit every shard "
+                "until it is recreated and its docs re-indexed",
+                index_name,
+            )
+
+    async def _routing(self, index_name: str, doc_ids: Iterable[str]) -> Optional[str]:
+        if not await self._is_routed(index_name):
+            return None
+        return DocSchema.routing(doc_ids)
+
+    async def _is_routed(self, index_name: str) -> bool:
+        if index_name not in _routed_indices:
+            res = await self.es_client.indices.get_mapping(index=index_name)
+            _routed_indices[index_name] = DocSchema.is_routed(
+                res[index_name]["mappings"]
+            )
+        return _routed_indices[index_name]
+
+    def _search_body(self, query: str, size: int, doc_filter: dict) -> dict:
+        return {
+            "query": {
+                "bool": {
+                    "must": [
+                        {
+                            "match": {
+                                "content": {
+                                    "query": query,
+                                    "analyzer": ANALYZER_NAME,
                                 }
                             }
-                        ],
-                    },
+                        },
+                    ],
+                    "filter": [doc_filter],
                 },
-                "size": size,
             },
-        )
+            "size": size,
+        }
 
+    def _parse_hits(self, res) -> List[DocSchema]:
         hits = res.get("hits", {}).get("hits", [])
         return [DocSchema(**hit["_source"]) for hit in hits]
 
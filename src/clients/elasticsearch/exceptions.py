@@ -0,0 +1,9 @@
+from base.api_exception import APIException
+
+
+class FailToSearchError(APIException):
+    status_code = 502
+    code = "SEARCH_FAILED"
+    detail = "Failed to search documents"
+    description = "문서 검색에 실패했습니다."
+    example = {"code": code, "detail": detail}
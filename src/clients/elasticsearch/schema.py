@@ -1,8 +1,14 @@
+from typing import Dict, Iterable, Optional
+
 from pydantic import BaseModel, Field
 from uuid import UUID
 
 __all__ = ["DocMetadata", "DocSchema"]
 
+# Routing values go in the request line, which ES caps at 4 KB
+# (http.max_initial_line_length). Requests for more docs search every shard.
+MAX_ROUTING_DOC_IDS = 32
+
 
 class DocMetadata(BaseModel):
     ext: str = Field(..., description="File extension of the document")
@@ -12,14 +18,38 @@ class DocSchema(BaseModel):
     doc_id: UUID = Field(..., description="Unique identifier for the document")
     order: int = Field(..., description="Order of the document")
     content: str = Field(..., description="Content of the document")
+    chunk_version: str = Field(
+        default="", description="Chunking params version the chunk was built with"
+    )
     metadata: DocMetadata
 
+    @property
+    def chunk_id(self) -> str:
+        return f"{self.doc_id}_{self.chunk_version}_{self.order}"
+
+    @staticmethod
+    def routing(doc_ids: Iterable[UUID | str]) -> Optional[str]:
+        # Chunks are routed by doc_id, so a request for these docs only needs
+        # the shards they live on
+        routing = [str(doc_id) for doc_id in doc_ids]
+        if len(routing) > MAX_ROUTING_DOC_IDS:
+            return None
+        return ",".join(routing)
+
+    @staticmethod
+    def is_routed(mappings: Dict) -> bool:
+        # Only indices created with `_routing.required` hold chunks routed by
+        # doc_id. Older ones spread their chunks by `_id`, so requests to them
+        # are never routed, or they would miss chunks and leave duplicates.
+        return mappings.get("_routing", {}).get("required", False) is True
+
     @staticmethod
     def create_map(analyzer: str):
         return {
             "doc_id": {"type": "keyword"},
             "order": {"type": "integer"},
             "content": {"type": "text", "analyzer": analyzer},
+            "chunk_version": {"type": "keyword"},
             "metadata": {
                 "type": "object",
                 "properties": {
@@ -1,19 +1,86 @@
-from typing import TYPE_CHECKING
+import asyncio
+import hashlib
+import io
+import logging
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    BinaryIO,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
 from pathlib import Path
 
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
+
 from clients.s3.dto import PresignedUrlMetadata
 from clients.s3.exceptions import FailToDownloadError, FailToGeneratePresignedUrlError
 
 if TYPE_CHECKING:
+    import aiohttp
     from mypy_boto3_s3 import S3Client as S3
 
 
-__all__ = ["S3Client"]
+__all__ = ["AsyncS3Client", "DownloadedFile", "S3Client", "init_async_s3_client"]
+
+logger = logging.getLogger(__name__)
+
+_READ_CHUNK_SIZE = 1024 * 1024
+
+
+class DownloadedFile:
+    """S3 object held in memory, or spilled to a temporary file when large."""
+
+    def __init__(
+        self,
+        fileobj: BinaryIO,
+        path: Optional[Path] = None,
+        size: int = 0,
+        elapsed: float = 0.0,
+        content_hash: str = "",
+    ):
+        self.fileobj = fileobj
+        self.path = path
+        self.size = size
+        self.elapsed = elapsed
+        # sha256 hex digest of the object
+        self.content_hash = content_hash
+
+    @property
+    def in_memory(self) -> bool:
+        return self.path is None
+
+    @property
+    def throughput(self) -> float:
+        # Bytes per second of the download
+        return self.size / self.elapsed if self.elapsed > 0 else 0.0
+
+    def close(self) -> None:
+        self.fileobj.close()
+        if self.path is not None and self.path.exists():
+            self.path.unlink()
 
 
 class S3Client:
-    def __init__(self, s3_client: "S3"):
+    def __init__(
+        self,
+        s3_client: "S3",
+        part_size: int = 8 * 1024 * 1024,
+        max_concurrency: int = 8,
+    ):
+        # Objects larger than `part_size` are fetched as byte ranges by up to
+        # `max_concurrency` threads sharing the boto client's connection pool
         self._s3_client = s3_client
+        self.part_size = part_size
+        self.max_concurrency = max_concurrency
 
     def get_presigned_url(
         self,
@@ -40,8 +107,324 @@ class S3Client:
     def download_file(self, bucket_name: str, key: str, output_path: Path) -> Path:
         try:
             self._s3_client.download_file(
-                Bucket=bucket_name, Key=key, Filename=str(output_path)
+                Bucket=bucket_name,
+                Key=key,
+                Filename=str(output_path),
+                Config=TransferConfig(
+                    multipart_threshold=self.part_size,
+                    multipart_chunksize=self.part_size,
+                    max_concurrency=self.max_concurrency,
+                ),
             )
             return output_path
         except Exception:
             raise FailToDownloadError()
+
+    def download_fileobj(
+        self, bucket_name: str, key: str, max_memory_size: int, suffix: str = ""
+    ) -> DownloadedFile:
+        downloaded: Optional[DownloadedFile] = None
+        try:
+            started = time.perf_counter()
+            # The first part's response carries the object size, so a small
+            # object takes a single request and a large one fans out from there
+            first_part = self._get_first_part(bucket_name, key)
+            if first_part is None:
+                size, first_size = 0, 0
+            else:
+                size = _object_size(
+                    first_part.get("ContentRange"), first_part["ContentLength"]
+                )
+                first_size = first_part["ContentLength"]
+
+            downloaded = _new_download(size, max_memory_size, suffix)
+            downloaded.content_hash = self._download_parts(
+                bucket_name,
+                key,
+                size,
+                first_part["Body"] if first_part is not None else None,
+                first_size,
+                downloaded.fileobj,
+            )
+            downloaded.fileobj.seek(0)
+            downloaded.elapsed = time.perf_counter() - started
+
+            logger.info(
+                "Downloaded %s (%d bytes) in %.1fms, %.1f MB/s",
+                key,
+                size,
+                downloaded.elapsed * 1000,
+                downloaded.throughput / (1024 * 1024),
+            )
+            return downloaded
+        except Exception:
+            if downloaded is not None:
+                downloaded.close()
+            raise FailToDownloadError()
+
+    def _get_first_part(self, bucket_name: str, key: str) -> Optional[Dict[str, Any]]:
+        # None for an empty object, which has no byte to range over
+        try:
+            return self._s3_client.get_object(
+                Bucket=bucket_name, Key=key, Range=f"bytes=0-{self.part_size - 1}"
+            )
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") == "InvalidRange":
+                return None
+            raise
+
+    def _download_parts(
+        self,
+        bucket_name: str,
+        key: str,
+        size: int,
+        first_body: Optional[Any],
+        first_size: int,
+        fileobj: BinaryIO,
+    ) -> str:
+        # Returns the sha256 of the object
+        hasher = hashlib.sha256()
+        ranges = _remaining_ranges(size, first_size, self.part_size)
+        lock = threading.Lock()
+
+        # Small objects come whole with the first part and are hashed while
+        # streaming, large ones fan out over the pool and are hashed once
+        # assembled
+        if not ranges:
+            if first_body is not None:
+                self._write_part(first_body, 0, fileobj, lock, hasher)
+            return hasher.hexdigest()
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            futures = [pool.submit(self._write_part, first_body, 0, fileobj, lock)]
+            futures.extend(
+                pool.submit(
+                    self._download_range, bucket_name, key, byte_range, fileobj, lock
+                )
+                for byte_range in ranges
+            )
+            for future in futures:
+                future.result()
+
+        fileobj.seek(0)
+        return hashlib.file_digest(fileobj, "sha256").hexdigest()
+
+    def _download_range(
+        self,
+        bucket_name: str,
+        key: str,
+        byte_range: Tuple[int, int],
+        fileobj: BinaryIO,
+        lock: threading.Lock,
+    ) -> None:
+        start, end = byte_range
+        body = self._s3_client.get_object(
+            Bucket=bucket_name, Key=key, Range=f"bytes={start}-{end}"
+        )["Body"]
+        self._write_part(body, start, fileobj, lock)
+
+    def _write_part(
+        self,
+        body: Any,
+        start: int,
+        fileobj: BinaryIO,
+        lock: threading.Lock,
+        hasher: Optional[Any] = None,
+    ) -> None:
+        # Parts finish out of order, so each one is written at its own offset
+        offset = start
+        for chunk in body.iter_chunks(chunk_size=_READ_CHUNK_SIZE):
+            with lock:
+                fileobj.seek(offset)
+                fileobj.write(chunk)
+            offset += len(chunk)
+            if hasher is not None:
+                hasher.update(chunk)
+
+
+class AsyncS3Client:
+    """Ranged parallel S3 downloads on aiohttp, for the AsyncDocWriter.
+
+    Requests are presigned locally by the boto client, which never touches the
+    network, so a download only ever waits on the event loop.
+    """
+
+    def __init__(
+        self,
+        s3_client: "S3",
+        part_size: int = 8 * 1024 * 1024,
+        max_concurrency: int = 8,
+        url_expire_sec: int = 300,
+    ):
+        self._s3_client = s3_client
+        self.part_size = part_size
+        self.max_concurrency = max_concurrency
+        self.url_expire_sec = url_expire_sec
+        # Created on first use, so it binds to the loop the downloads run on
+        self._session: Optional["aiohttp.ClientSession"] = None
+
+    async def download_fileobj(
+        self, bucket_name: str, key: str, max_memory_size: int, suffix: str = ""
+    ) -> DownloadedFile:
+        downloaded: Optional[DownloadedFile] = None
+        try:
+            started = time.perf_counter()
+            url = self._presign("get_object", bucket_name, key)
+            # Sized from the first part's response, as in `S3Client`
+            async with self._get_session().get(
+                url,
+                headers={"Range": f"bytes=0-{self.part_size - 1}"},
+                raise_for_status=False,
+            ) as res:
+                # An empty object has no byte to range over
+                if res.status == 416:
+                    size, first_size, first_content = 0, 0, None
+                else:
+                    res.raise_for_status()
+                    first_size = int(res.headers["Content-Length"])
+                    size = _object_size(res.headers.get("Content-Range"), first_size)
+                    first_content = res.content
+
+                downloaded = _new_download(size, max_memory_size, suffix)
+                downloaded.content_hash = await self._download_parts(
+                    url, size, first_content, first_size, downloaded.fileobj
+                )
+            downloaded.fileobj.seek(0)
+            downloaded.elapsed = time.perf_counter() - started
+
+            logger.info(
+                "Downloaded %s (%d bytes) in %.1fms, %.1f MB/s",
+                key,
+                size,
+                downloaded.elapsed * 1000,
+                downloaded.throughput / (1024 * 1024),
+            )
+            return downloaded
+        except Exception:
+            if downloaded is not None:
+                downloaded.close()
+            raise FailToDownloadError()
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _get_session(self) -> "aiohttp.ClientSession":
+        # Imported here, only the async writer's workers need aiohttp
+        import aiohttp
+
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(raise_for_status=True)
+        return self._session
+
+    def _presign(self, client_method: str, bucket_name: str, key: str) -> str:
+        return self._s3_client.generate_presigned_url(
+            ClientMethod=client_method,
+            Params={"Bucket": bucket_name, "Key": key},
+            ExpiresIn=self.url_expire_sec,
+        )
+
+    async def _download_parts(
+        self,
+        url: str,
+        size: int,
+        first_content: Optional["aiohttp.StreamReader"],
+        first_size: int,
+        fileobj: BinaryIO,
+    ) -> str:
+        # Same split as `S3Client._download_parts`, with coroutines for threads
+        hasher = hashlib.sha256()
+        ranges = _remaining_ranges(size, first_size, self.part_size)
+
+        if not ranges:
+            if first_content is not None:
+                await self._write_part(first_content, 0, fileobj, hasher)
+            return hasher.hexdigest()
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def write_first() -> None:
+            async with semaphore:
+                await self._write_part(first_content, 0, fileobj)
+
+        async def download(byte_range: Tuple[int, int]) -> None:
+            async with semaphore:
+                await self._download_range(url, byte_range, fileobj)
+
+        await asyncio.gather(
+            write_first(), *(download(byte_range) for byte_range in ranges)
+        )
+
+        fileobj.seek(0)
+        digest = await asyncio.to_thread(hashlib.file_digest, fileobj, "sha256")
+        return digest.hexdigest()
+
+    async def _download_range(
+        self, url: str, byte_range: Tuple[int, int], fileobj: BinaryIO
+    ) -> None:
+        start, end = byte_range
+        async with self._get_session().get(
+            url, headers={"Range": f"bytes={start}-{end}"}
+        ) as res:
+            await self._write_part(res.content, start, fileobj)
+
+    async def _write_part(
+        self,
+        content: "aiohttp.StreamReader",
+        start: int,
+        fileobj: BinaryIO,
+        hasher: Optional[Any] = None,
+    ) -> None:
+        # Seek and write never yield, so parts cannot interleave mid-chunk
+        offset = start
+        async for chunk in content.iter_chunked(_READ_CHUNK_SIZE):
+            fileobj.seek(offset)
+            fileobj.write(chunk)
+            offset += len(chunk)
+            if hasher is not None:
+                hasher.update(chunk)
+
+
+def _object_size(content_range: Optional[str], content_length: int) -> int:
+    # A ranged response reads "bytes 0-8388607/52428800". A server ignoring the
+    # Range sends the whole object, without Content-Range.
+    if content_range:
+        return int(content_range.rsplit("/", 1)[1])
+    return content_length
+
+
+def _remaining_ranges(
+    size: int, first_size: int, part_size: int
+) -> List[Tuple[int, int]]:
+    # Inclusive byte ranges left once the first `first_size` bytes arrived
+    return [
+        (start, min(start + part_size, size) - 1)
+        for start in range(first_size, size, part_size)
+    ]
+
+
+def _new_download(size: int, max_memory_size: int, suffix: str) -> DownloadedFile:
+    # Objects up to `max_memory_size` never touch the filesystem
+    if size <= max_memory_size:
+        return DownloadedFile(fileobj=io.BytesIO(), size=size)
+    spill = tempfile.NamedTemporaryFile(suffix=suffix, delete=False)
+    return DownloadedFile(fileobj=spill, path=Path(spill.name), size=size)
+
+
+def init_async_s3_client(
+    loop: asyncio.AbstractEventLoop,
+    s3_client: "S3",
+    part_size: int,
+    max_concurrency: int,
+) -> Iterator[AsyncS3Client]:
+    # One client per worker process, so its aiohttp session and connections are
+    # reused across tasks. The session is closed on the loop it was opened on.
+    client = AsyncS3Client(
+        s3_client=s3_client, part_size=part_size, max_concurrency=max_concurrency
+    )
+
+    try:
+        yield client
+    finally:
+        asyncio.run_coroutine_threadsafe(client.close(), loop).result()
@@ -13,6 +13,11 @@ class S3Config(BaseSettings):
     REGION: str = Field(default="ap-northeast-2")
 
     DOCS_BUCKET: str = Field(default="documents")
+    # Ranged parallel downloads: part size and parts fetched at once
+    DOWNLOAD_PART_SIZE: int = Field(default=8 * 1024 * 1024)
+    DOWNLOAD_CONCURRENCY: int = Field(default=8)
+    # Connections the boto client keeps open, shared by all download threads
+    MAX_POOL_CONNECTIONS: int = Field(default=32)
 
     class Config:
         env_prefix = "AWS_"
@@ -21,6 +26,15 @@ class S3Config(BaseSettings):
 class ElasticsearchConfig(BaseSettings):
     ENDPOINT: List[str] = Field(default=["http://localhost:9200"])
     INDEX: str = Field(default="documents")
+    # "wait_for": bulk waits for the next refresh, "coordinated": periodic refresh task
+    REFRESH_MODE: str = Field(default="coordinated")
+
+    BULK_CHUNK_SIZE: int = Field(default=500, description="actions per request")
+    BULK_MAX_CHUNK_BYTES: int = Field(default=10 * 1024 * 1024)
+    BULK_THREAD_COUNT: int = Field(default=4, description="requests in flight")
+    BULK_MAX_RETRIES: int = Field(default=5, description="retries on 429")
+    BULK_INITIAL_BACKOFF: float = Field(default=1, description="seconds")
+    BULK_MAX_BACKOFF: float = Field(default=30, description="seconds")
 
     class Config:
         env_prefix = "ELASTICSEARCH_"
@@ -42,12 +56,59 @@ class DocumentConfig(BaseSettings):
         ]
     )
     DOC_SIZE_LIMIT: int = Field(default=20 * 1024 * 1024)
+    BATCH_CONCURRENCY: int = Field(
+        default=4, description="docs downloaded and parsed at once per batch task"
+    )
+    # Parser processes per worker process, 0 parses inline. Opt-in, for workers
+    # whose large docs outweigh an extra process per worker process.
+    PARSER_PROCESSES: int = Field(default=0)
+    # Larger downloads spill to a temporary file instead of staying in memory
+    IN_MEMORY_DOWNLOAD_LIMIT: int = Field(default=8 * 1024 * 1024)
+    # Split chunks kept on local disk so retries skip download and parsing
+    CHUNK_CACHE_DIR: str = Field(default="/tmp/chunk-cache")
+    CHUNK_CACHE_SIZE: int = Field(default=1024 * 1024 * 1024)
+    # Docs claimed per page by the retry sweeper
+    RETRY_BATCH_SIZE: int = Field(default=100)
+    # Retries per doc before DEAD_LETTER, and their exponential backoff in seconds
+    RETRY_MAX_ATTEMPTS: int = Field(default=5)
+    RETRY_BASE_DELAY: int = Field(default=10 * 60)
+    RETRY_MAX_DELAY: int = Field(default=24 * 60 * 60)
+    # Seconds an INDEXING or RETRYING doc stays leased to its worker before the
+    # sweeper takes it back, longer than any indexing task runs
+    RETRY_LEASE_TIMEOUT: int = Field(default=60 * 60)
+    # Doc outcomes are flushed to the DB in batches of up to this many docs, or
+    # every STATUS_FLUSH_INTERVAL seconds. 0 writes each outcome right away.
+    STATUS_BUFFER_SIZE: int = Field(default=500)
+    STATUS_FLUSH_INTERVAL: float = Field(default=1.0)
+    # Docs in flight at once per `index_docs_async` task
+    ASYNC_CONCURRENCY: int = Field(default=32)
+    # Status transitions are published to STATUS_CHANNEL_PREFIX + doc_id on the
+    # broker's Redis. Event streams send a heartbeat every STATUS_EVENTS_HEARTBEAT
+    # seconds and close after STATUS_EVENTS_TIMEOUT seconds.
+    STATUS_CHANNEL_PREFIX: str = Field(default="docs:status:")
+    STATUS_EVENTS_HEARTBEAT: float = Field(default=15)
+    STATUS_EVENTS_TIMEOUT: float = Field(default=10 * 60)
+    # `/question` results cached per API process, and in Redis for all of them
+    # when SEARCH_CACHE_SHARED is set. Re-indexed docs are invalidated.
+    SEARCH_CACHE_PREFIX: str = Field(default="docs:search:")
+    SEARCH_CACHE_SIZE: int = Field(default=10000, description="entries")
+    SEARCH_CACHE_TTL: float = Field(default=5 * 60, description="seconds")
+    SEARCH_CACHE_SHARED: bool = Field(default=True)
+    # Collection lookups cached per API process
+    COLLECTION_CACHE_SIZE: int = Field(default=1000, description="collections")
+    COLLECTION_CACHE_TTL: float = Field(default=60, description="seconds")
 
 
 class CeleryConfig(BaseSettings):
     BROKER_URL: str = Field(default="redis://localhost:6379/0")
     BACKEND_URL: str = Field(default="redis://localhost:6379/1")
 
+    # Index tasks are routed by doc size and extension, see DocQueueRouter
+    SMALL_DOC_QUEUE: str = Field(default="docs.small")
+    BULK_DOC_QUEUE: str = Field(default="docs.bulk")
+    SMALL_DOC_SIZE_LIMIT: int = Field(default=1024 * 1024)
+    SMALL_DOC_EXTENSIONS: List[str] = Field(default=["txt", "json", "py"])
+
     class Config:
         env_prefix = "CELERY_"
 
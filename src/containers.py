@@ -1,12 +1,18 @@
 import boto3
+import redis.asyncio as redis
 from elasticsearch import AsyncElasticsearch
 from dependency_injector import containers, providers
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
+from base.single_flight import SingleFlight
 from clients.elasticsearch.es import EsClient
 from clients.s3.s3 import S3Client
+from docs.repositories.collection_repository import CollectionRepository
 from docs.repositories.doc_repository import DocRepository
+from docs.services.doc_collections import DocCollections
 from docs.services.doc_reader import DocReader
+from docs.services.doc_status_hub import DocStatusHub
+from docs.services.search_cache import SearchCache
 from docs.services.doc_uploader import DocUploader
 from db.db import ReadSessionManager, WriteSessionManager
 
@@ -87,8 +93,39 @@ class Container(containers.DeclarativeContainer):
         s3_client=_s3_boto_client,
     )
 
+    # Status events and search cache invalidations on the broker's Redis
+    _redis = providers.Singleton(redis.Redis.from_url, config.CELERY.BROKER_URL)
+    doc_status_hub = providers.Singleton(
+        DocStatusHub,
+        redis_client=_redis,
+        channel_prefix=config.DOCUMENT.STATUS_CHANNEL_PREFIX,
+    )
+
+    search_cache = providers.Singleton(
+        SearchCache,
+        redis_client=_redis,
+        key_prefix=config.DOCUMENT.SEARCH_CACHE_PREFIX,
+        max_size=config.DOCUMENT.SEARCH_CACHE_SIZE,
+        ttl=config.DOCUMENT.SEARCH_CACHE_TTL,
+        shared=config.DOCUMENT.SEARCH_CACHE_SHARED,
+    )
+
+    # Per API process, coalesces concurrent identical searches
+    search_flight = providers.Singleton(SingleFlight)
+
     # docs
     doc_repository = providers.Factory(DocRepository)
+    collection_repository = providers.Factory(CollectionRepository)
+
+    # Singleton for its lookup cache, so it opens a session manager per call
+    doc_collections = providers.Singleton(
+        DocCollections,
+        read_session_manager=read_session_manager.provider,
+        write_session_manager=write_session_manager.provider,
+        repo=collection_repository,
+        cache_size=config.DOCUMENT.COLLECTION_CACHE_SIZE,
+        cache_ttl=config.DOCUMENT.COLLECTION_CACHE_TTL,
+    )
 
     doc_uploader = providers.Factory(
         DocUploader,
@@ -107,4 +144,10 @@ class Container(containers.DeclarativeContainer):
         session_manager=read_session_manager,
         repo=doc_repository,
         doc_index_name=config.ELASTICSEARCH.INDEX,
+        status_hub=doc_status_hub,
+        events_heartbeat=config.DOCUMENT.STATUS_EVENTS_HEARTBEAT,
+        events_timeout=config.DOCUMENT.STATUS_EVENTS_TIMEOUT,
+        search_cache=search_cache,
+        search_flight=search_flight,
+        collections=doc_collections,
     )
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 import uuid
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 from base.dto import SnakeToCamelBaseModel
 from docs.models.doc_model import DocStatus
 
@@ -13,8 +13,17 @@ __all__ = [
     "PresignedUrlDto",
     "IndexDocsParams",
     "SearchDocsRequest",
+    "SearchDocsBatchRequest",
+    "SearchDocsBatchResponse",
+    "SearchDocsInRequest",
+    "PutCollectionRequest",
+    "CollectionResponse",
     "GetDocRequest",
     "DocResponse",
+    "DocStatusEvent",
+    "SearchCacheStatsResponse",
+    "SearchFlightKeyStats",
+    "SearchFlightStatsResponse",
 ]
 
 
@@ -46,11 +55,23 @@ class PresignedUrlDto(BaseModel):
     doc_id: str
 
 
+# Bump when the splitting algorithm changes so re-indexed chunks get new ids
+CHUNKER_VERSION = "v1"
+
+
 class IndexDocsParams(SnakeToCamelBaseModel):
     key: str
     chunk_size: int = Field(default=1024)
     chunk_overlap_ratio: float = Field(default=0.2)
 
+    @property
+    def chunk_overlap(self) -> int:
+        return int(self.chunk_size * max(self.chunk_overlap_ratio, 0))
+
+    @property
+    def chunk_version(self) -> str:
+        return f"{CHUNKER_VERSION}-{self.chunk_size}-{self.chunk_overlap}"
+
 
 class SearchDocsRequest(SnakeToCamelBaseModel):
     doc_id: str
@@ -74,9 +95,86 @@ class SearchDocsResponse(SnakeToCamelBaseModel):
         return SearchDocsResponse(docs=docs)
 
 
+class SearchDocsInRequest(SnakeToCamelBaseModel):
+    question: str
+    doc_ids: list[str] | None = Field(default=None, min_length=1, max_length=1000)
+    collection: str | None = None
+    size: int = Field(default=10, gt=0, le=100)
+
+    @model_validator(mode="after")
+    def _validate_scope(self) -> SearchDocsInRequest:
+        if (self.doc_ids is None) == (self.collection is None):
+            raise ValueError("Exactly one of docIds and collection is required")
+        return self
+
+
+class PutCollectionRequest(SnakeToCamelBaseModel):
+    doc_ids: list[uuid.UUID] = Field(..., max_length=1000)
+
+
+class CollectionResponse(SnakeToCamelBaseModel):
+    name: str
+    doc_ids: list[uuid.UUID]
+
+
+class SearchDocsBatchItem(SnakeToCamelBaseModel):
+    doc_id: str
+    question: str
+    size: int = Field(default=10, gt=0, le=100)
+
+
+class SearchDocsBatchRequest(SnakeToCamelBaseModel):
+    questions: list[SearchDocsBatchItem] = Field(..., min_length=1, max_length=50)
+
+
+class SearchDocsBatchError(SnakeToCamelBaseModel):
+    code: str
+    detail: str
+
+
+class SearchDocsBatchResult(SnakeToCamelBaseModel):
+    # Exactly one of them is set
+    docs: list[SearchDoc] | None = None
+    error: SearchDocsBatchError | None = None
+
+
+class SearchDocsBatchResponse(SnakeToCamelBaseModel):
+    # In the order of the request's questions
+    results: list[SearchDocsBatchResult]
+
+
 class DocResponse(SnakeToCamelBaseModel):
     doc_id: uuid.UUID
     name: str
     size: int
     extension: str
     status: DocStatus
+
+
+class DocStatusEvent(SnakeToCamelBaseModel):
+    doc_id: uuid.UUID
+    status: DocStatus
+
+
+class SearchCacheStatsResponse(SnakeToCamelBaseModel):
+    # Counted per API process since it started
+    local_hits: int
+    shared_hits: int
+    misses: int
+
+
+class SearchFlightKeyStats(SnakeToCamelBaseModel):
+    doc_id: str
+    question_hash: str
+    size: int
+    calls: int
+    flights: int
+    fan_in: float
+
+
+class SearchFlightStatsResponse(SnakeToCamelBaseModel):
+    # Counted per API process since it started, keys by most calls
+    calls: int
+    flights: int
+    fan_in: float
+    keys: list[SearchFlightKeyStats]
@@ -15,3 +15,19 @@ class DocumentSizeLimitExceededError(APIException):
     detail = "Document size limit exceeded"
     description = "문서 크기가 제한을 초과했습니다."
     example = {"code": code, "detail": detail}
+
+
+class DocNotFoundError(APIException):
+    status_code = 404
+    code = "DOC_NOT_FOUND"
+    detail = "Doc not found"
+    description = "문서를 찾을 수 없습니다."
+    example = {"code": code, "detail": detail}
+
+
+class CollectionNotFoundError(APIException):
+    status_code = 404
+    code = "COLLECTION_NOT_FOUND"
+    detail = "Collection not found"
+    description = "컬렉션을 찾을 수 없습니다."
+    example = {"code": code, "detail": detail}
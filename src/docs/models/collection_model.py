@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+from datetime import datetime
+from uuid import UUID
+
+from sqlalchemy import DateTime, ForeignKey, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from db.model import Base
+from base.date import get_utc_now
+
+__all__ = ["CollectionDocs", "Collections"]
+
+
+class Collections(Base):
+    # Named set of docs searched together
+    __tablename__ = "collections"
+
+    id: Mapped[UUID] = mapped_column(primary_key=True)
+    name: Mapped[str] = mapped_column(String(64), unique=True, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=get_utc_now
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=get_utc_now, onupdate=get_utc_now
+    )
+
+
+class CollectionDocs(Base):
+    __tablename__ = "collection_docs"
+
+    # The primary key serves the lookup of a collection's docs
+    collection_id: Mapped[UUID] = mapped_column(
+        ForeignKey("collections.id", ondelete="CASCADE"), primary_key=True
+    )
+    doc_id: Mapped[UUID] = mapped_column(
+        ForeignKey("docs.id", ondelete="CASCADE"), primary_key=True
+    )
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=get_utc_now
+    )
@@ -2,22 +2,30 @@ from __future__ import annotations
 
 from datetime import datetime
 from enum import Enum
+from typing import Optional
 from uuid import UUID
 
-from sqlalchemy import DateTime, String, Enum as SAEnum
+from sqlalchemy import DateTime, Index, String, Enum as SAEnum
 from sqlalchemy.orm import Mapped, mapped_column
 
 from db.model import Base
 from base.date import get_utc_now
 
 
-__all__ = ["Docs", "DocStatus"]
+__all__ = [
+    "Docs",
+    "DocStatus",
+    "FAILED_STATUSES",
+    "IN_PROGRESS_STATUSES",
+    "IndexStage",
+]
 
 
 class DocStatus(Enum):
     UPLOAD_REQUESTED = "UPLOAD_REQUESTED"
     UPLOADED = "UPLOADED"
     INDEXING = "INDEXING"
+    REFRESH_PENDING = "REFRESH_PENDING"
     INDEXED = "INDEXED"
 
     UPLOAD_FAILED = "UPLOAD_FAILED"
@@ -27,10 +35,40 @@ class DocStatus(Enum):
     INDEXING_FAILED = "INDEXING_FAILED"
 
     RETRYING = "RETRYING"
+    # Gave up after DOCUMENT.RETRY_MAX_ATTEMPTS attempts
+    DEAD_LETTER = "DEAD_LETTER"
+
+
+FAILED_STATUSES = (
+    DocStatus.UPLOAD_FAILED,
+    DocStatus.DOWNLOAD_FAILED,
+    DocStatus.READ_FAILED,
+    DocStatus.SPLITTING_FAILED,
+    DocStatus.INDEXING_FAILED,
+)
+
+# Statuses a client waits through until the doc is indexed or has failed
+IN_PROGRESS_STATUSES = (
+    DocStatus.UPLOAD_REQUESTED,
+    DocStatus.UPLOADED,
+    DocStatus.INDEXING,
+    DocStatus.REFRESH_PENDING,
+    DocStatus.RETRYING,
+)
+
+
+class IndexStage(Enum):
+    # Last indexing stage that completed, retries resume after it
+    SPLIT = "SPLIT"  # chunks are in the chunk cache under `artifact_key`
+    WRITTEN = "WRITTEN"  # chunks are in Elasticsearch
 
 
 class Docs(Base):
     __tablename__ = "docs"
+    __table_args__ = (
+        # Status scans (retry sweep, refresh) seek on status and walk created_at
+        Index("ix_docs_status_created_at_id", "status", "created_at", "id"),
+    )
 
     id: Mapped[UUID] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column(String(64), nullable=False)
@@ -44,6 +82,27 @@ class Docs(Base):
 
     bucket: Mapped[str] = mapped_column(String(64), nullable=False)
     key: Mapped[str] = mapped_column(String(64), nullable=False)
+    content_hash: Mapped[Optional[str]] = mapped_column(
+        String(64), nullable=True, index=True, comment="sha256 of the file"
+    )
+    chunk_version: Mapped[Optional[str]] = mapped_column(
+        String(64), nullable=True, comment="chunking params of the indexed chunks"
+    )
+    attempt_count: Mapped[int] = mapped_column(
+        default=0, nullable=False, comment="retries handed out by the sweeper"
+    )
+    last_error_stage: Mapped[Optional[str]] = mapped_column(
+        String(32), nullable=True, comment="last failure status"
+    )
+    next_attempt_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True), nullable=True, comment="earliest next retry"
+    )
+    completed_stage: Mapped[Optional[IndexStage]] = mapped_column(
+        SAEnum(IndexStage, native_enum=False, length=16), nullable=True
+    )
+    artifact_key: Mapped[Optional[str]] = mapped_column(
+        String(255), nullable=True, comment="chunk cache key of the split chunks"
+    )
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), default=get_utc_now
     )
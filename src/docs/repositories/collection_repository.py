@@ -0,0 +1,56 @@
+import uuid
+from typing import List, Optional
+from uuid import UUID
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from docs.models.collection_model import CollectionDocs, Collections
+from docs.models.doc_model import Docs
+
+
+class CollectionRepository:
+
+    async def get_doc_ids(
+        self, session: AsyncSession, name: str
+    ) -> Optional[List[UUID]]:
+        # None for an unknown collection, one query either way
+        stmt = (
+            select(Collections.id, CollectionDocs.doc_id)
+            .outerjoin(CollectionDocs, CollectionDocs.collection_id == Collections.id)
+            .where(Collections.name == name)
+        )
+        rows = (await session.execute(stmt)).all()
+        if not rows:
+            return None
+        return [row.doc_id for row in rows if row.doc_id is not None]
+
+    async def fetch_existing_doc_ids(
+        self, session: AsyncSession, doc_ids: List[UUID]
+    ) -> List[UUID]:
+        if not doc_ids:
+            return []
+        stmt = select(Docs.id).where(Docs.id.in_(doc_ids))
+        return list((await session.execute(stmt)).scalars().all())
+
+    async def put_collection(
+        self, session: AsyncSession, name: str, doc_ids: List[UUID]
+    ) -> None:
+        # Creates the collection or replaces its docs
+        stmt = select(Collections.id).where(Collections.name == name)
+        collection_id = (await session.execute(stmt)).scalar_one_or_none()
+        if collection_id is None:
+            collection_id = uuid.uuid4()
+            session.add(Collections(id=collection_id, name=name))
+            await session.flush()
+        else:
+            await session.execute(
+                delete(CollectionDocs).where(
+                    CollectionDocs.collection_id == collection_id
+                )
+            )
+
+        session.add_all(
+            CollectionDocs(collection_id=collection_id, doc_id=doc_id)
+            for doc_id in doc_ids
+        )
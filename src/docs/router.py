@@ -1,23 +1,43 @@
-from typing import Annotated
+from typing import Annotated, AsyncGenerator, AsyncIterator, Optional
 from uuid import UUID
 from dependency_injector.wiring import Provide, inject
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Path
+from fastapi.responses import StreamingResponse
 
 from base.openapi import generate_responses
+from base.single_flight import SingleFlight
+from clients.elasticsearch.dto import SearchQuery
+from clients.elasticsearch.exceptions import FailToSearchError
 from clients.s3.exceptions import FailToGeneratePresignedUrlError
 from containers import Container
 from docs.exceptions import (
+    CollectionNotFoundError,
+    DocNotFoundError,
     NotAllowedExtensionError,
 )
+from docs.models.doc_model import DocStatus
+from docs.services.doc_collections import DocCollections
 from docs.services.doc_reader import DocReader
+from docs.services.search_cache import SearchCache
 from .dtos.docs_dto import (
+    CollectionResponse,
     DocResponse,
+    DocStatusEvent,
     GetUploadUrlMetadata,
     GetUploadUrlRequest,
     GetUploadUrlResponse,
+    PutCollectionRequest,
     SearchDoc,
+    SearchDocsBatchError,
+    SearchDocsBatchRequest,
+    SearchDocsBatchResponse,
+    SearchDocsBatchResult,
+    SearchDocsInRequest,
     SearchDocsRequest,
     SearchDocsResponse,
+    SearchCacheStatsResponse,
+    SearchFlightKeyStats,
+    SearchFlightStatsResponse,
 )
 from .services.doc_uploader import DocUploader
 
@@ -60,6 +80,107 @@ async def search_docs(
     )
 
 
+@router.post(
+    "/search",
+    response_model=SearchDocsResponse,
+    responses=generate_responses(CollectionNotFoundError),
+)
+@inject
+async def search_docs_in(
+    request: SearchDocsInRequest,
+    doc_reader: Annotated[DocReader, Depends(Provide[Container.doc_reader])],
+) -> SearchDocsResponse:
+    docs = await doc_reader.search_docs_in(
+        question=request.question,
+        size=request.size,
+        doc_ids=request.doc_ids,
+        collection=request.collection,
+    )
+    return SearchDocsResponse.of(
+        docs=[SearchDoc.of(doc_id=doc.doc_id, content=doc.content) for doc in docs]
+    )
+
+
+@router.put(
+    "/collections/{name}",
+    response_model=CollectionResponse,
+    responses=generate_responses(DocNotFoundError),
+)
+@inject
+async def put_collection(
+    name: Annotated[str, Path(max_length=64)],
+    request: PutCollectionRequest,
+    doc_collections: Annotated[
+        DocCollections, Depends(Provide[Container.doc_collections])
+    ],
+) -> CollectionResponse:
+    doc_ids = await doc_collections.put(name, request.doc_ids)
+    return CollectionResponse(name=name, doc_ids=doc_ids)
+
+
+@router.post("/questions:batch", response_model=SearchDocsBatchResponse)
+@inject
+async def search_docs_batch(
+    request: SearchDocsBatchRequest,
+    doc_reader: Annotated[DocReader, Depends(Provide[Container.doc_reader])],
+) -> SearchDocsBatchResponse:
+    results = await doc_reader.search_docs_batch(
+        [
+            SearchQuery(doc_id=item.doc_id, query=item.question, size=item.size)
+            for item in request.questions
+        ]
+    )
+
+    batch_results = []
+    for result in results:
+        if isinstance(result, FailToSearchError):
+            error = SearchDocsBatchError(code=result.code, detail=result.detail)
+            batch_results.append(SearchDocsBatchResult(error=error))
+        else:
+            docs = [
+                SearchDoc.of(doc_id=doc.doc_id, content=doc.content) for doc in result
+            ]
+            batch_results.append(SearchDocsBatchResult(docs=docs))
+    return SearchDocsBatchResponse(results=batch_results)
+
+
+@router.get("/search-cache/stats", response_model=SearchCacheStatsResponse)
+@inject
+async def get_search_cache_stats(
+    search_cache: Annotated[SearchCache, Depends(Provide[Container.search_cache])],
+) -> SearchCacheStatsResponse:
+    stats = search_cache.stats
+    return SearchCacheStatsResponse(
+        local_hits=stats.local_hits,
+        shared_hits=stats.shared_hits,
+        misses=stats.misses,
+    )
+
+
+@router.get("/search-flight/stats", response_model=SearchFlightStatsResponse)
+@inject
+async def get_search_flight_stats(
+    search_flight: Annotated[SingleFlight, Depends(Provide[Container.search_flight])],
+    limit: int = 20,
+) -> SearchFlightStatsResponse:
+    return SearchFlightStatsResponse(
+        calls=search_flight.total.calls,
+        flights=search_flight.total.flights,
+        fan_in=search_flight.total.fan_in,
+        keys=[
+            SearchFlightKeyStats(
+                doc_id=doc_id,
+                question_hash=question_hash,
+                size=size,
+                calls=stats.calls,
+                flights=stats.flights,
+                fan_in=stats.fan_in,
+            )
+            for (doc_id, question_hash, size), stats in search_flight.top_keys(limit)
+        ],
+    )
+
+
 @router.get("/{doc_id}", response_model=DocResponse)
 @inject
 async def get_doc(
@@ -77,3 +198,49 @@ async def get_doc(
         extension=doc.extension,
         status=doc.status,
     )
+
+
+@router.get(
+    "/{doc_id}/events",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"text/event-stream": {}}}},
+)
+@inject
+async def watch_doc_status(
+    doc_id: str,
+    doc_reader: Annotated[DocReader, Depends(Provide[Container.doc_reader])],
+) -> StreamingResponse:
+    # Server-sent `status` events, from the current status until the doc is no
+    # longer in progress. Waiting costs no DB queries, workers push the changes.
+    statuses = doc_reader.watch_status(UUID(doc_id))
+    current = await anext(statuses, None)
+    if current is None:
+        await statuses.aclose()
+        raise HTTPException(status_code=404, detail="Doc not found")
+
+    return StreamingResponse(
+        _status_events(UUID(doc_id), current, statuses),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _status_events(
+    doc_id: UUID,
+    current: DocStatus,
+    statuses: AsyncGenerator[Optional[DocStatus], None],
+) -> AsyncIterator[str]:
+    def format_event(status: DocStatus) -> str:
+        event = DocStatusEvent(doc_id=doc_id, status=status)
+        return f"event: status\ndata: {event.model_dump_json(by_alias=True)}\n\n"
+
+    try:
+        yield format_event(current)
+        async for status in statuses:
+            if status is None:
+                # Keeps proxies from closing a quiet stream
+                yield ": heartbeat\n\n"
+            else:
+                yield format_event(status)
+    finally:
+        await statuses.aclose()
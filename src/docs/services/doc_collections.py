@@ -0,0 +1,69 @@
+import time
+from collections import OrderedDict
+from typing import Callable, List, Tuple
+from uuid import UUID
+
+from db.db import ReadSessionManager, WriteSessionManager
+from docs.exceptions import CollectionNotFoundError, DocNotFoundError
+from docs.repositories.collection_repository import CollectionRepository
+
+__all__ = ["DocCollections"]
+
+
+class DocCollections:
+    """Named sets of docs searched together.
+
+    Lookups are cached per API process for `cache_ttl` seconds. A change is
+    seen right away by the process that made it, and by the others once their
+    entry expires.
+    """
+
+    def __init__(
+        self,
+        read_session_manager: Callable[[], ReadSessionManager],
+        write_session_manager: Callable[[], WriteSessionManager],
+        repo: CollectionRepository,
+        cache_size: int,
+        cache_ttl: float,
+    ):
+        self.read_session_manager = read_session_manager
+        self.write_session_manager = write_session_manager
+        self.repo = repo
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        # name -> (expires_at, doc_ids), least recently used first
+        self._cache: OrderedDict[str, Tuple[float, List[UUID]]] = OrderedDict()
+
+    async def get_doc_ids(self, name: str) -> List[UUID]:
+        entry = self._cache.get(name)
+        if entry is not None and entry[0] > time.monotonic():
+            self._cache.move_to_end(name)
+            return list(entry[1])
+
+        async with self.read_session_manager() as session:
+            doc_ids = await self.repo.get_doc_ids(session, name)
+        if doc_ids is None:
+            raise CollectionNotFoundError()
+
+        self._store(name, doc_ids)
+        return doc_ids
+
+    async def put(self, name: str, doc_ids: List[UUID]) -> List[UUID]:
+        doc_ids = list(dict.fromkeys(doc_ids))
+        async with self.write_session_manager() as session:
+            existing = set(await self.repo.fetch_existing_doc_ids(session, doc_ids))
+            missing = [doc_id for doc_id in doc_ids if doc_id not in existing]
+            if missing:
+                raise DocNotFoundError(
+                    f"Docs not found: {', '.join(map(str, missing))}"
+                )
+            await self.repo.put_collection(session, name, doc_ids)
+
+        self._store(name, doc_ids)
+        return doc_ids
+
+    def _store(self, name: str, doc_ids: List[UUID]) -> None:
+        self._cache[name] = (time.monotonic() + self.cache_ttl, list(doc_ids))
+        self._cache.move_to_end(name)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
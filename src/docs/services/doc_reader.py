@@ -1,9 +1,17 @@
+import asyncio
+from typing import AsyncGenerator, List, Optional
 from uuid import UUID
+from base.single_flight import SingleFlight
+from clients.elasticsearch.dto import SearchQuery
 from clients.elasticsearch.es import EsClient
+from clients.elasticsearch.exceptions import FailToSearchError
 from clients.elasticsearch.schema import DocSchema
 from db.db import ReadSessionManager
-from docs.models.doc_model import Docs
+from docs.models.doc_model import IN_PROGRESS_STATUSES, Docs, DocStatus
 from docs.repositories.doc_repository import DocRepository
+from docs.services.doc_collections import DocCollections
+from docs.services.doc_status_hub import DocStatusHub
+from docs.services.search_cache import SearchCache, search_key
 
 __all__ = ["DocReader"]
 
@@ -15,11 +23,23 @@ class DocReader:
         doc_index_name: str,
         session_manager: ReadSessionManager,
         repo: DocRepository,
+        status_hub: DocStatusHub,
+        events_heartbeat: float,
+        events_timeout: float,
+        search_cache: Optional[SearchCache] = None,
+        search_flight: Optional[SingleFlight[list[DocSchema]]] = None,
+        collections: Optional[DocCollections] = None,
     ):
         self.es_client = es_client
         self.doc_index_name = doc_index_name
         self.session_manager = session_manager
         self.repo = repo
+        self.status_hub = status_hub
+        self.events_heartbeat = events_heartbeat
+        self.events_timeout = events_timeout
+        self.search_cache = search_cache
+        self.search_flight = search_flight
+        self.collections = collections
 
     async def get_doc(self, doc_id: UUID) -> Docs | None:
         async with self.session_manager as session:
@@ -29,14 +49,106 @@ class DocReader:
             )
             return doc
 
+    async def watch_status(
+        self, doc_id: UUID
+    ) -> AsyncGenerator[Optional[DocStatus], None]:
+        # Yields the current status, then every pushed transition until the doc
+        # leaves IN_PROGRESS_STATUSES or `events_timeout` passes. None is a
+        # heartbeat after `events_heartbeat` quiet seconds. An unknown doc
+        # yields nothing.
+        loop = asyncio.get_running_loop()
+        async with self.status_hub.watch(doc_id) as statuses:
+            # Subscribed before the read, so no transition falls in between.
+            # This is the only DB query of the watch.
+            doc = await self.get_doc(doc_id)
+            if doc is None:
+                return
+
+            status = doc.status
+            yield status
+
+            deadline = loop.time() + self.events_timeout
+            while status in IN_PROGRESS_STATUSES:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return
+                try:
+                    pushed = await asyncio.wait_for(
+                        statuses.get(), min(self.events_heartbeat, remaining)
+                    )
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+
+                # Events published before the read repeat it
+                if pushed != status:
+                    status = pushed
+                    yield status
+
     async def search_docs(
         self, question: str, doc_id: str, size: int = 10
     ) -> list[DocSchema]:
-        docs = await self.es_client.search_docs(
+        async def search_es() -> list[DocSchema]:
+            return await self.es_client.search_docs(
+                index_name=self.doc_index_name,
+                doc_id=doc_id,
+                query=question,
+                size=size,
+            )
+
+        async def search() -> list[DocSchema]:
+            # Concurrent identical questions share one ES call
+            if self.search_flight is None:
+                return await search_es()
+            return await self.search_flight.do(
+                search_key(doc_id, question, size), search_es
+            )
+
+        if self.search_cache is None:
+            return await search()
+        return await self.search_cache.get_or_search(doc_id, question, size, search)
+
+    async def search_docs_batch(
+        self, queries: List[SearchQuery]
+    ) -> List[list[DocSchema] | FailToSearchError]:
+        # Cached queries are answered from the cache, the rest share a single
+        # _msearch round trip. Results keep the order of `queries`.
+        if self.search_cache is None:
+            return await self.es_client.msearch_docs(self.doc_index_name, queries)
+
+        keys = [search_key(query.doc_id, query.query, query.size) for query in queries]
+        lookups = await asyncio.gather(*(self.search_cache.get(key) for key in keys))
+        results: List[list[DocSchema] | FailToSearchError] = [
+            docs for docs, _ in lookups
+        ]
+
+        misses = [i for i, (docs, _) in enumerate(lookups) if docs is None]
+        searched = await self.es_client.msearch_docs(
+            self.doc_index_name, [queries[i] for i in misses]
+        )
+        for i, result in zip(misses, searched):
+            results[i] = result
+            if not isinstance(result, FailToSearchError):
+                await self.search_cache.put(keys[i], result, lookups[i][1])
+        return results
+
+    async def search_docs_in(
+        self,
+        question: str,
+        size: int = 10,
+        doc_ids: Optional[List[str]] = None,
+        collection: Optional[str] = None,
+    ) -> list[DocSchema]:
+        # Top `size` chunks over a list of docs or a collection's docs. Not
+        # cached, a re-index of any of the docs would have to drop the entry.
+        if collection is not None:
+            doc_ids = [
+                str(doc_id) for doc_id in await self.collections.get_doc_ids(collection)
+            ]
+
+        return await self.es_client.search_docs_in(
             index_name=self.doc_index_name,
-            doc_id=doc_id,
+            doc_ids=doc_ids or [],
             query=question,
             size=size,
         )
-
-        return docs
@@ -0,0 +1,99 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager, suppress
+from typing import AsyncIterator, Dict, Optional, Set
+from uuid import UUID
+
+import redis.asyncio as redis
+from pydantic import ValidationError
+
+from docs.dtos.docs_dto import DocStatusEvent
+from docs.models.doc_model import DocStatus
+
+__all__ = ["DocStatusHub"]
+
+logger = logging.getLogger(__name__)
+
+
+class DocStatusHub:
+    """Fans the status events workers publish out to the requests watching a doc.
+
+    All watchers of an API process share one Redis pub/sub connection. A doc's
+    channel is subscribed while at least one request watches it, and a single
+    reader task hands each event to the queues of that doc's watchers.
+    """
+
+    def __init__(self, redis_client: redis.Redis, channel_prefix: str):
+        self.redis_client = redis_client
+        self.channel_prefix = channel_prefix
+        self._pubsub = redis_client.pubsub()
+        self._watchers: Dict[UUID, Set[asyncio.Queue[DocStatus]]] = {}
+        self._subscribed: Set[UUID] = set()
+        self._lock = asyncio.Lock()
+        self._reader: Optional[asyncio.Task] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    @asynccontextmanager
+    async def watch(self, doc_id: UUID) -> AsyncIterator[asyncio.Queue[DocStatus]]:
+        queue: asyncio.Queue[DocStatus] = asyncio.Queue()
+        watchers = self._watchers.setdefault(doc_id, set())
+        watchers.add(queue)
+        try:
+            # Subscribed on return, events published from here on are queued
+            await self._sync_subscription(doc_id)
+            yield queue
+        finally:
+            # No awaits here, the request may already be cancelled. The last
+            # watcher leaves the unsubscribe to a task of its own.
+            watchers.discard(queue)
+            if not watchers and self._watchers.get(doc_id) is watchers:
+                del self._watchers[doc_id]
+                task = asyncio.create_task(self._sync_subscription(doc_id))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+    async def close(self) -> None:
+        if self._reader is not None:
+            self._reader.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._reader
+        await self._pubsub.aclose()
+        await self.redis_client.aclose()
+
+    async def _sync_subscription(self, doc_id: UUID) -> None:
+        # Brings the channel in line with the current watchers, so a watch and
+        # an unsubscribe racing on the same doc settle on the latest state
+        channel = f"{self.channel_prefix}{doc_id}"
+        async with self._lock:
+            if doc_id in self._watchers and doc_id not in self._subscribed:
+                await self._pubsub.subscribe(channel)
+                self._subscribed.add(doc_id)
+                if self._reader is None:
+                    self._reader = asyncio.create_task(self._read())
+            elif doc_id not in self._watchers and doc_id in self._subscribed:
+                await self._pubsub.unsubscribe(channel)
+                self._subscribed.discard(doc_id)
+
+    async def _read(self) -> None:
+        while True:
+            try:
+                message = await self._pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=1.0
+                )
+            except redis.RedisError:
+                # The pub/sub connection resubscribes its channels on reconnect
+                logger.exception("Failed to read status events")
+                await asyncio.sleep(1)
+                continue
+
+            if message is None:
+                continue
+
+            try:
+                event = DocStatusEvent.model_validate_json(message["data"])
+            except ValidationError:
+                logger.warning("Dropped malformed status event: %s", message)
+                continue
+
+            for queue in self._watchers.get(event.doc_id, ()):
+                queue.put_nowait(event.status)
@@ -0,0 +1,249 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import unicodedata
+from collections import OrderedDict
+from contextlib import suppress
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from uuid import UUID
+
+import redis.asyncio as redis
+from pydantic import TypeAdapter, ValidationError
+
+from clients.elasticsearch.schema import DocSchema
+
+__all__ = ["SearchCache", "SearchCacheStats", "normalize_question", "search_key"]
+
+logger = logging.getLogger(__name__)
+
+_DOCS = TypeAdapter(List[DocSchema])
+
+# (doc_id, question hash, size)
+CacheKey = Tuple[str, str, int]
+
+
+def normalize_question(question: str) -> str:
+    # Questions differing only in width, case or spacing share an entry. The
+    # analyzer lowercases too, so they would hit the same chunks anyway.
+    return " ".join(unicodedata.normalize("NFKC", question).casefold().split())
+
+
+def _normalize_doc_id(doc_id: str) -> str:
+    try:
+        return str(UUID(doc_id))
+    except ValueError:
+        return doc_id.strip().lower()
+
+
+def search_key(doc_id: str, question: str, size: int) -> CacheKey:
+    question_hash = hashlib.sha1(
+        normalize_question(question).encode("utf-8")
+    ).hexdigest()
+    return _normalize_doc_id(doc_id), question_hash, size
+
+
+@dataclass
+class SearchCacheStats:
+    local_hits: int = 0
+    shared_hits: int = 0
+    misses: int = 0
+
+
+class SearchCache:
+    """Two-tier cache of `/question` search results.
+
+    An in-process LRU with a TTL sits in front of an optional Redis tier shared
+    by all API processes. The Redis tier keeps one hash per doc, so dropping a
+    doc's entries is a single DEL. Workers do that and publish the doc id once
+    its re-indexed chunks are searchable (see `SearchCacheInvalidator`), and
+    every API process drops its local entries of the doc on the message.
+    """
+
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        key_prefix: str,
+        max_size: int,
+        ttl: float,
+        shared: bool,
+    ):
+        self.redis_client = redis_client
+        self.key_prefix = key_prefix
+        self.max_size = max_size
+        self.ttl = ttl
+        self.shared = shared
+        self.stats = SearchCacheStats()
+        # key -> (expires_at, docs), least recently used first
+        self._entries: OrderedDict[CacheKey, Tuple[float, List[DocSchema]]] = (
+            OrderedDict()
+        )
+        self._keys_by_doc: Dict[str, Set[CacheKey]] = {}
+        # Bumped on every invalidation, a search that overlapped one is not cached
+        self._epoch = 0
+        self._listener: Optional[asyncio.Task] = None
+
+    @property
+    def invalidation_channel(self) -> str:
+        return f"{self.key_prefix}invalidate"
+
+    async def get_or_search(
+        self,
+        doc_id: str,
+        question: str,
+        size: int,
+        search: Callable[[], Awaitable[List[DocSchema]]],
+    ) -> List[DocSchema]:
+        key = search_key(doc_id, question, size)
+        docs, epoch = await self.get(key)
+        if docs is None:
+            docs = await search()
+            await self.put(key, docs, epoch)
+        return docs
+
+    async def get(self, key: CacheKey) -> Tuple[Optional[List[DocSchema]], int]:
+        # Also returns the epoch to hand to `put` with the searched results
+        self._start_listener()
+
+        docs = self._get_local(key)
+        if docs is not None:
+            self.stats.local_hits += 1
+            return docs, self._epoch
+
+        epoch = self._epoch
+        docs = await self._get_shared(key)
+        if docs is None:
+            self.stats.misses += 1
+            return None, epoch
+
+        self.stats.shared_hits += 1
+        if epoch == self._epoch:
+            self._set_local(key, docs)
+        return docs, epoch
+
+    async def put(self, key: CacheKey, docs: List[DocSchema], epoch: int) -> None:
+        # Results of a search that overlapped an invalidation are not cached
+        if epoch != self._epoch:
+            return
+        await self._set_shared(key, docs)
+        if epoch == self._epoch:
+            self._set_local(key, docs)
+
+    def invalidate_local(self, doc_id: str) -> None:
+        self._epoch += 1
+        for key in self._keys_by_doc.pop(_normalize_doc_id(doc_id), ()):
+            self._entries.pop(key, None)
+
+    async def close(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._listener
+
+    def _get_local(self, key: CacheKey) -> Optional[List[DocSchema]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, docs = entry
+        if expires_at <= time.monotonic():
+            self._pop_local(key)
+            return None
+
+        self._entries.move_to_end(key)
+        return list(docs)
+
+    def _set_local(self, key: CacheKey, docs: List[DocSchema]) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, list(docs))
+        self._entries.move_to_end(key)
+        self._keys_by_doc.setdefault(key[0], set()).add(key)
+        while len(self._entries) > self.max_size:
+            self._pop_local(next(iter(self._entries)))
+
+    def _pop_local(self, key: CacheKey) -> None:
+        self._entries.pop(key, None)
+        keys = self._keys_by_doc.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_doc[key[0]]
+
+    async def _get_shared(self, key: CacheKey) -> Optional[List[DocSchema]]:
+        if not self.shared:
+            return None
+
+        doc_id, question_hash, size = key
+        name, field = f"{self.key_prefix}{doc_id}", f"{size}:{question_hash}"
+        try:
+            value = await self.redis_client.hget(name, field)
+        except redis.RedisError:
+            logger.exception("Failed to read the shared search cache")
+            return None
+        if value is None:
+            return None
+
+        # Fields have no TTL of their own, the hash expires as a whole
+        try:
+            entry = json.loads(value)
+            if entry["expiresAt"] <= time.time():
+                return None
+            return _DOCS.validate_python(entry["docs"])
+        except (json.JSONDecodeError, KeyError, TypeError, ValidationError):
+            # Corrupt, or written by a version with another schema. A miss
+            # searches again and the fresh result replaces it.
+            logger.warning("Dropping unreadable shared search cache entry %s", name)
+            await self._delete_shared(name, field)
+            return None
+
+    async def _delete_shared(self, name: str, field: str) -> None:
+        try:
+            await self.redis_client.hdel(name, field)
+        except redis.RedisError:
+            logger.exception("Failed to delete from the shared search cache")
+
+    async def _set_shared(self, key: CacheKey, docs: List[DocSchema]) -> None:
+        if not self.shared:
+            return
+
+        doc_id, question_hash, size = key
+        name = f"{self.key_prefix}{doc_id}"
+        value = json.dumps(
+            {
+                "expiresAt": time.time() + self.ttl,
+                "docs": _DOCS.dump_python(docs, mode="json"),
+            }
+        )
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.hset(name, f"{size}:{question_hash}", value)
+                pipe.expire(name, int(self.ttl) + 1)
+                await pipe.execute()
+        except redis.RedisError:
+            logger.exception("Failed to write the shared search cache")
+
+    def _start_listener(self) -> None:
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def _listen(self) -> None:
+        pubsub = self.redis_client.pubsub()
+        try:
+            while True:
+                try:
+                    if not pubsub.subscribed:
+                        await pubsub.subscribe(self.invalidation_channel)
+                    message = await pubsub.get_message(
+                        ignore_subscribe_messages=True, timeout=1.0
+                    )
+                except redis.RedisError:
+                    # Entries may be stale until resubscribed, the TTL bounds it
+                    logger.exception("Failed to read search cache invalidations")
+                    await asyncio.sleep(1)
+                    continue
+
+                if message is not None:
+                    self.invalidate_local(message["data"].decode("utf-8"))
+        finally:
+            await pubsub.aclose()
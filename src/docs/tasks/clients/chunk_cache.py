@@ -0,0 +1,192 @@
+import gzip
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+import msgpack
+
+__all__ = ["ChunkCache"]
+
+logger = logging.getLogger(__name__)
+
+_SUFFIX = ".msgpack.gz"
+
+
+class ChunkCache:
+    """Split chunk texts on local disk, keyed by content hash and chunking params.
+
+    Entries are gzipped msgpack streams, written and read one chunk at a time so a
+    cached document is never fully held in memory. The least recently used
+    entries are evicted once the cache grows past `max_bytes`.
+
+    The cache is best effort: any I/O error leaves the doc uncached instead of
+    failing it. Sizes are tracked per process from one scan of `cache_dir`, so
+    entries other processes write are only counted after a restart.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        # key -> size, least recently used first. Loaded on first use.
+        self._entries: Optional[OrderedDict[str, int]] = None
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def key(self, content_hash: str, chunk_version: str) -> str:
+        return f"{content_hash}_{chunk_version}"
+
+    def get(self, content_hash: str, chunk_version: str) -> Optional[Iterator[str]]:
+        return self.open(self.key(content_hash, chunk_version))
+
+    def open(self, key: str) -> Optional[Iterator[str]]:
+        path = self._path(key)
+        try:
+            file = gzip.open(path, "rb")
+            # mtime is the LRU clock across restarts
+            os.utime(path)
+        except OSError:
+            return None
+
+        with self._lock:
+            entries = self._load_entries()
+            if key in entries:
+                entries.move_to_end(key)
+
+        return self._iter_file(key, file)
+
+    def contains(self, key: str) -> bool:
+        return self._path(key).exists()
+
+    def put(
+        self, content_hash: str, chunk_version: str, contents: Iterable[str]
+    ) -> bool:
+        # Writes chunks already in memory, returns whether the entry was stored
+        for _ in self.tee(content_hash, chunk_version, contents):
+            pass
+        return self.contains(self.key(content_hash, chunk_version))
+
+    def tee(
+        self, content_hash: str, chunk_version: str, contents: Iterable[str]
+    ) -> Iterator[str]:
+        # Passes `contents` through while writing them to a new entry, which only
+        # becomes visible once `contents` is exhausted. A cache write error stops
+        # caching, never the stream.
+        writer = self._writer(self.key(content_hash, chunk_version))
+        try:
+            for content in contents:
+                if writer is not None and not writer.write(content):
+                    writer = None
+                yield content
+
+            if writer is not None:
+                writer.commit()
+                writer = None
+        finally:
+            if writer is not None:
+                writer.discard()
+
+    def _writer(self, key: str) -> Optional["_EntryWriter"]:
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            fd, tmp_name = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        except OSError:
+            logger.warning("Chunk cache unavailable at %s", self.cache_dir)
+            return None
+        return _EntryWriter(self, key, fd, Path(tmp_name))
+
+    def _added(self, key: str, size: int) -> None:
+        with self._lock:
+            entries = self._load_entries()
+            self._total_bytes += size - entries.pop(key, 0)
+            entries[key] = size
+
+            while self._total_bytes > self.max_bytes and len(entries) > 1:
+                evicted, evicted_size = entries.popitem(last=False)
+                self._total_bytes -= evicted_size
+                self._path(evicted).unlink(missing_ok=True)
+                logger.info("Evicted chunk cache entry %s", evicted)
+
+    def _dropped(self, key: str) -> None:
+        with self._lock:
+            self._total_bytes -= self._load_entries().pop(key, 0)
+        self._path(key).unlink(missing_ok=True)
+
+    def _load_entries(self) -> OrderedDict[str, int]:
+        # Called with the lock held
+        if self._entries is not None:
+            return self._entries
+
+        found = []
+        try:
+            for path in self.cache_dir.glob(f"*{_SUFFIX}"):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                found.append((stat.st_mtime, path.name[: -len(_SUFFIX)], stat.st_size))
+        except OSError:
+            pass
+
+        self._entries = OrderedDict((key, size) for _, key, size in sorted(found))
+        self._total_bytes = sum(self._entries.values())
+        return self._entries
+
+    def _iter_file(self, key: str, file: gzip.GzipFile) -> Iterator[str]:
+        try:
+            with file:
+                yield from msgpack.Unpacker(file, raw=False)
+        except (OSError, EOFError, ValueError):
+            # A corrupt entry is dropped, so the retry of this doc parses again
+            logger.warning("Dropped corrupt chunk cache entry %s", key)
+            self._dropped(key)
+            raise
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}{_SUFFIX}"
+
+
+class _EntryWriter:
+    # A cache entry being written to a temporary file in the cache dir
+
+    def __init__(self, cache: ChunkCache, key: str, fd: int, tmp_path: Path):
+        self.cache = cache
+        self.key = key
+        self.tmp_path = tmp_path
+        self.packer = msgpack.Packer()
+        self.raw = os.fdopen(fd, "wb")
+        self.file = gzip.GzipFile(fileobj=self.raw, mode="wb", compresslevel=1)
+
+    def write(self, content: str) -> bool:
+        try:
+            self.file.write(self.packer.pack(content))
+            return True
+        except OSError:
+            logger.warning("Failed to write chunk cache entry %s", self.key)
+            self.discard()
+            return False
+
+    def commit(self) -> bool:
+        try:
+            self.file.close()
+            self.raw.close()
+            size = self.tmp_path.stat().st_size
+            os.replace(self.tmp_path, self.cache._path(self.key))
+        except OSError:
+            logger.warning("Failed to write chunk cache entry %s", self.key)
+            self.discard()
+            return False
+
+        self.cache._added(self.key, size)
+        return True
+
+    def discard(self) -> None:
+        for file in (self.file, self.raw):
+            try:
+                file.close()
+            except OSError:
+                pass
+        self.tmp_path.unlink(missing_ok=True)
@@ -1,25 +1,407 @@
-from typing import List
-from elasticsearch import Elasticsearch
-from elasticsearch.helpers import bulk
+import asyncio
+import logging
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterable, Iterator, List, Literal, Optional, Set
+
+from elasticsearch import AsyncElasticsearch, Elasticsearch
+from elasticsearch.helpers import async_bulk, bulk
+from pydantic import BaseModel
 
 from clients.elasticsearch.schema import DocSchema
 
-__all__ = ["EsTaskClient"]
+__all__ = ["AsyncEsTaskClient", "BulkStats", "EsTaskClient", "RefreshMode"]
+
+logger = logging.getLogger(__name__)
+
+# "wait_for": the bulk request returns once its chunks are searchable.
+# "coordinated": no refresh per request, a periodic refresh makes them searchable.
+RefreshMode = Literal["wait_for", "coordinated"]
+
+# Rough size of the action line and JSON envelope around a chunk's content
+_ACTION_OVERHEAD_BYTES = 256
+
+# Index name -> whether its chunks are routed by doc_id, read once per process
+_routed_indices: Dict[str, bool] = {}
+
+
+class BulkStats(BaseModel):
+    indexed: int = 0
+    batch_latencies: List[float] = []
 
 
 class EsTaskClient:
-    def __init__(self, es_client: Elasticsearch):
+    def __init__(
+        self,
+        es_client: Elasticsearch,
+        chunk_size: int = 500,
+        max_chunk_bytes: int = 10 * 1024 * 1024,
+        thread_count: int = 4,
+        max_retries: int = 5,
+        initial_backoff: float = 1,
+        max_backoff: float = 30,
+    ):
         self.es_client = es_client
+        self.chunk_size = chunk_size
+        self.max_chunk_bytes = max_chunk_bytes
+        self.thread_count = thread_count
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+
+    def index_docs(
+        self,
+        docs: Iterable[DocSchema],
+        index_name: str,
+        refresh: bool | Literal["wait_for"] = False,
+    ) -> BulkStats:
+        # Batches are cut from `docs` lazily and at most `thread_count` of them are
+        # in flight, so a slow cluster pushes back on the producer instead of
+        # buffering the whole document. Chunk ids are deterministic, so
+        # re-indexing overwrites instead of appending.
+        stats = BulkStats()
+        in_flight: Set[Future] = set()
+
+        routed = self._is_routed(index_name)
+        with ThreadPoolExecutor(max_workers=self.thread_count) as pool:
+            for batch in _iter_batches(
+                docs, self.chunk_size, self.max_chunk_bytes, routed
+            ):
+                if len(in_flight) >= self.thread_count:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    self._collect(done, stats)
+
+                in_flight.add(pool.submit(self._send_batch, batch, index_name, refresh))
+
+            self._collect(in_flight, stats)
+
+        return stats
+
+    def delete_stale_chunks(
+        self, index_name: str, chunk_version: str, chunk_counts: Dict[uuid.UUID, int]
+    ) -> None:
+        # Removes chunks left over from a previous run that produced more chunks
+        # or used different chunking params, for every doc in one request.
+        if not chunk_counts:
+            return
+
+        self.es_client.delete_by_query(
+            index=index_name,
+            query=_stale_chunks_query(chunk_version, chunk_counts),
+            routing=self._routing(index_name, chunk_counts),
+            conflicts="proceed",
+        )
+
+    def delete_chunks(self, index_name: str, doc_ids: List[uuid.UUID]) -> None:
+        # Every chunk of the docs, whatever their chunking params
+        if not doc_ids:
+            return
 
-    def index_docs(self, docs: List[DocSchema], index_name: str):
-        bulk(
+        self.es_client.delete_by_query(
+            index=index_name,
+            query={"terms": {"doc_id": [str(doc_id) for doc_id in doc_ids]}},
+            routing=self._routing(index_name, doc_ids),
+            conflicts="proceed",
+        )
+
+    def copy_chunks(
+        self,
+        index_name: str,
+        source_doc_id: uuid.UUID,
+        doc_id: uuid.UUID,
+        chunk_version: str,
+        refresh: bool = False,
+    ) -> int:
+        # Server-side copy of another doc's chunks under `doc_id`, so identical
+        # files are never parsed twice. Returns the number of chunks copied.
+        res = self.es_client.reindex(
+            **_copy_chunks_request(
+                index_name,
+                source_doc_id,
+                doc_id,
+                chunk_version,
+                self._is_routed(index_name),
+            ),
+            refresh=refresh,
+            wait_for_completion=True,
+        )
+        return res["created"] + res["updated"]
+
+    def refresh(self, index_name: str) -> None:
+        self.es_client.indices.refresh(index=index_name)
+
+    def _routing(self, index_name: str, doc_ids: Iterable[uuid.UUID]) -> Optional[str]:
+        if not self._is_routed(index_name):
+            return None
+        return DocSchema.routing(doc_ids)
+
+    def _is_routed(self, index_name: str) -> bool:
+        if index_name not in _routed_indices:
+            res = self.es_client.indices.get_mapping(index=index_name)
+            _routed_indices[index_name] = DocSchema.is_routed(
+                res[index_name]["mappings"]
+            )
+        return _routed_indices[index_name]
+
+    def _send_batch(
+        self, batch: List[Dict], index_name: str, refresh: Any
+    ) -> tuple[int, float]:
+        started = time.perf_counter()
+        # One request per batch; items rejected with 429 are retried with backoff
+        success, _ = bulk(
             client=self.es_client,
-            actions=[
+            actions=batch,
+            index=index_name,
+            refresh=refresh,
+            chunk_size=len(batch),
+            max_chunk_bytes=self.max_chunk_bytes,
+            max_retries=self.max_retries,
+            initial_backoff=self.initial_backoff,
+            max_backoff=self.max_backoff,
+        )
+        latency = time.perf_counter() - started
+
+        logger.info(
+            "Bulk batch of %d actions to %s took %.1fms",
+            len(batch),
+            index_name,
+            latency * 1000,
+        )
+        return success, latency
+
+    def _collect(self, futures: Set[Future], stats: BulkStats) -> None:
+        for future in futures:
+            success, latency = future.result()
+            stats.indexed += success
+            stats.batch_latencies.append(latency)
+
+
+class AsyncEsTaskClient:
+    """`EsTaskClient` on the async Elasticsearch client, for the AsyncDocWriter.
+
+    Up to `concurrency` bulk requests are in flight per `index_docs` call, and
+    any number of calls share the event loop and the client's connection pool.
+    """
+
+    def __init__(
+        self,
+        es_client: AsyncElasticsearch,
+        chunk_size: int = 500,
+        max_chunk_bytes: int = 10 * 1024 * 1024,
+        concurrency: int = 4,
+        max_retries: int = 5,
+        initial_backoff: float = 1,
+        max_backoff: float = 30,
+    ):
+        self.es_client = es_client
+        self.chunk_size = chunk_size
+        self.max_chunk_bytes = max_chunk_bytes
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+
+    async def index_docs(
+        self,
+        docs: Iterable[DocSchema],
+        index_name: str,
+        refresh: bool | Literal["wait_for"] = False,
+    ) -> BulkStats:
+        stats = BulkStats()
+        in_flight: Set[asyncio.Task] = set()
+
+        routed = await self._is_routed(index_name)
+        try:
+            for batch in _iter_batches(
+                docs, self.chunk_size, self.max_chunk_bytes, routed
+            ):
+                if len(in_flight) >= self.concurrency:
+                    done, in_flight = await asyncio.wait(
+                        in_flight, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    self._collect(done, stats)
+
+                in_flight.add(
+                    asyncio.create_task(self._send_batch(batch, index_name, refresh))
+                )
+
+            if in_flight:
+                done, in_flight = await asyncio.wait(in_flight)
+                self._collect(done, stats)
+        finally:
+            for task in in_flight:
+                task.cancel()
+
+        return stats
+
+    async def delete_stale_chunks(
+        self, index_name: str, chunk_version: str, chunk_counts: Dict[uuid.UUID, int]
+    ) -> None:
+        if not chunk_counts:
+            return
+
+        await self.es_client.delete_by_query(
+            index=index_name,
+            query=_stale_chunks_query(chunk_version, chunk_counts),
+            routing=await self._routing(index_name, chunk_counts),
+            conflicts="proceed",
+        )
+
+    async def copy_chunks(
+        self,
+        index_name: str,
+        source_doc_id: uuid.UUID,
+        doc_id: uuid.UUID,
+        chunk_version: str,
+        refresh: bool = False,
+    ) -> int:
+        res = await self.es_client.reindex(
+            **_copy_chunks_request(
+                index_name,
+                source_doc_id,
+                doc_id,
+                chunk_version,
+                await self._is_routed(index_name),
+            ),
+            refresh=refresh,
+            wait_for_completion=True,
+        )
+        return res["created"] + res["updated"]
+
+    async def _send_batch(
+        self, batch: List[Dict], index_name: str, refresh: Any
+    ) -> tuple[int, float]:
+        started = time.perf_counter()
+        success, _ = await async_bulk(
+            client=self.es_client,
+            actions=batch,
+            index=index_name,
+            refresh=refresh,
+            chunk_size=len(batch),
+            max_chunk_bytes=self.max_chunk_bytes,
+            max_retries=self.max_retries,
+            initial_backoff=self.initial_backoff,
+            max_backoff=self.max_backoff,
+        )
+        latency = time.perf_counter() - started
+
+        logger.info(
+            "Bulk batch of %d actions to %s took %.1fms",
+            len(batch),
+            index_name,
+            latency * 1000,
+        )
+        return success, latency
+
+    async def _routing(
+        self, index_name: str, doc_ids: Iterable[uuid.UUID]
+    ) -> Optional[str]:
+        if not await self._is_routed(index_name):
+            return None
+        return DocSchema.routing(doc_ids)
+
+    async def _is_routed(self, index_name: str) -> bool:
+        if index_name not in _routed_indices:
+            res = await self.es_client.indices.get_mapping(index=index_name)
+            _routed_indices[index_name] = DocSchema.is_routed(
+                res[index_name]["mappings"]
+            )
+        return _routed_indices[index_name]
+
+    def _collect(self, tasks: Set[asyncio.Task], stats: BulkStats) -> None:
+        for task in tasks:
+            success, latency = task.result()
+            stats.indexed += success
+            stats.batch_latencies.append(latency)
+
+
+def _iter_batches(
+    docs: Iterable[DocSchema], chunk_size: int, max_chunk_bytes: int, routed: bool
+) -> Iterator[List[Dict]]:
+    batch: List[Dict] = []
+    batch_bytes = 0
+
+    for doc in docs:
+        action_bytes = len(doc.content.encode()) + _ACTION_OVERHEAD_BYTES
+        if batch and (
+            len(batch) >= chunk_size or batch_bytes + action_bytes > max_chunk_bytes
+        ):
+            yield batch
+            batch, batch_bytes = [], 0
+
+        # Routed by doc, so a doc's chunks share a shard and its searches hit
+        # only that one
+        action = {"_id": doc.chunk_id, "_source": doc.model_dump()}
+        if routed:
+            action["_routing"] = str(doc.doc_id)
+        batch.append(action)
+        batch_bytes += action_bytes
+
+    if batch:
+        yield batch
+
+
+def _stale_chunks_query(chunk_version: str, chunk_counts: Dict[uuid.UUID, int]) -> Dict:
+    # Chunks left over from a previous run that produced more chunks or used
+    # different chunking params, for every doc in `chunk_counts`
+    return {
+        "bool": {
+            "should": [
                 {
-                    "_source": doc.model_dump(),
+                    "bool": {
+                        "filter": [{"term": {"doc_id": str(doc_id)}}],
+                        "should": [
+                            {"range": {"order": {"gt": chunk_count}}},
+                            {
+                                "bool": {
+                                    "must_not": [
+                                        {"term": {"chunk_version": chunk_version}}
+                                    ]
+                                }
+                            },
+                        ],
+                        "minimum_should_match": 1,
+                    }
                 }
-                for doc in docs
+                for doc_id, chunk_count in chunk_counts.items()
             ],
-            index=index_name,
-            refresh=True,
-        )
+            "minimum_should_match": 1,
+        }
+    }
+
+
+def _copy_chunks_request(
+    index_name: str,
+    source_doc_id: uuid.UUID,
+    doc_id: uuid.UUID,
+    chunk_version: str,
+    routed: bool,
+) -> Dict:
+    # Server-side copy of another doc's chunks under `doc_id`. Reindex can't
+    # route the source query, the copies are routed by the script.
+    routing = "ctx._routing = params.doc_id; " if routed else ""
+    return {
+        "source": {
+            "index": index_name,
+            "query": {
+                "bool": {
+                    "filter": [
+                        {"term": {"doc_id": str(source_doc_id)}},
+                        {"term": {"chunk_version": chunk_version}},
+                    ]
+                }
+            },
+        },
+        "dest": {"index": index_name},
+        "script": {
+            "lang": "painless",
+            "source": (
+                "ctx._source.doc_id = params.doc_id; "
+                + routing
+                + "ctx._id = params.doc_id + '_' + ctx._source.chunk_version"
+                " + '_' + ctx._source.order;"
+            ),
+            "params": {"doc_id": str(doc_id)},
+        },
+    }
@@ -0,0 +1,37 @@
+import logging
+import uuid
+from typing import Iterable
+
+import redis
+
+__all__ = ["SearchCacheInvalidator"]
+
+logger = logging.getLogger(__name__)
+
+
+class SearchCacheInvalidator:
+    """Drops the cached search results of re-indexed docs.
+
+    Deletes a doc's hash in the shared tier and publishes its id, so every API
+    process drops its local entries too. See `SearchCache` for the layout.
+    """
+
+    def __init__(self, redis_client: redis.Redis, key_prefix: str):
+        self.redis_client = redis_client
+        self.key_prefix = key_prefix
+
+    def invalidate(self, doc_ids: Iterable[uuid.UUID]) -> None:
+        doc_ids = list(doc_ids)
+        if not doc_ids:
+            return
+
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.delete(*(f"{self.key_prefix}{doc_id}" for doc_id in doc_ids))
+        for doc_id in doc_ids:
+            pipe.publish(f"{self.key_prefix}invalidate", str(doc_id))
+
+        try:
+            pipe.execute()
+        except redis.RedisError:
+            # Stale entries then live out their TTL
+            logger.exception("Failed to invalidate %d docs", len(doc_ids))
@@ -0,0 +1,46 @@
+import logging
+import uuid
+from typing import Dict, Iterable
+
+import redis
+
+from docs.dtos.docs_dto import DocStatusEvent
+from docs.models.doc_model import DocStatus
+
+__all__ = ["StatusPublisher"]
+
+logger = logging.getLogger(__name__)
+
+
+class StatusPublisher:
+    """Publishes committed status transitions on a per-doc Redis channel.
+
+    The API streams them to clients waiting on a doc instead of having them poll
+    the DB. Events are best effort: a failed publish is logged and dropped, the
+    DB stays the source of truth.
+    """
+
+    def __init__(self, redis_client: redis.Redis, channel_prefix: str):
+        self.redis_client = redis_client
+        self.channel_prefix = channel_prefix
+
+    def publish(self, outcomes: Dict[DocStatus, Iterable[uuid.UUID]]) -> None:
+        # One round trip for every doc of the outcomes
+        pipe = self.redis_client.pipeline(transaction=False)
+        count = 0
+        for status, doc_ids in outcomes.items():
+            for doc_id in doc_ids:
+                event = DocStatusEvent(doc_id=doc_id, status=status)
+                pipe.publish(
+                    f"{self.channel_prefix}{doc_id}",
+                    event.model_dump_json(by_alias=True),
+                )
+                count += 1
+
+        if not count:
+            return
+
+        try:
+            pipe.execute()
+        except redis.RedisError:
+            logger.exception("Failed to publish %d status events", count)
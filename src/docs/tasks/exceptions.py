@@ -0,0 +1,12 @@
+from docs.models.doc_model import DocStatus
+
+__all__ = ["StageError"]
+
+
+class StageError(Exception):
+    """Failure of one indexing stage, carrying the status to record for the doc."""
+
+    def __init__(self, status: DocStatus, error: Exception):
+        super().__init__(status, error)
+        self.status = status
+        self.error = error
@@ -1,3 +1,5 @@
+import asyncio
+import logging
 from typing import Dict, List, cast
 from celery import Task, shared_task
 from dependency_injector.wiring import Provide, inject
@@ -5,8 +7,11 @@ from pydantic import BaseModel
 
 from celery_containers import CeleryContainer
 from docs.dtos.docs_dto import IndexDocsParams
+from docs.tasks.services.async_doc_writer import AsyncDocWriter
 from docs.tasks.services.doc_writer import DocWriter
 
+logger = logging.getLogger(__name__)
+
 
 class _IndexDocsRequest(BaseModel):
     bucket: str
@@ -25,6 +30,36 @@ def index_docs(
     doc_writer.index_docs(params)
 
 
+@shared_task(name="docs.tasks.index_docs_batch")
+@inject
+def index_docs_batch(
+    req: List[Dict[str, str]],
+    doc_writer: DocWriter = Provide[CeleryContainer.doc_writer],
+) -> None:
+    requests = [_IndexDocsRequest(**row) for row in req]
+
+    doc_writer.index_docs_batch(
+        [IndexDocsParams(key=request.key) for request in requests]
+    )
+
+
+@shared_task(name="docs.tasks.index_docs_async")
+@inject
+def index_docs_async(
+    req: List[Dict[str, str]],
+    doc_writer: AsyncDocWriter = Provide[CeleryContainer.async_doc_writer],
+    loop: asyncio.AbstractEventLoop = Provide[CeleryContainer.event_loop],
+) -> None:
+    # The docs are indexed concurrently on the worker's event loop, this
+    # thread only waits for the whole batch
+    requests = [_IndexDocsRequest(**row) for row in req]
+    params_list = [IndexDocsParams(key=request.key) for request in requests]
+
+    asyncio.run_coroutine_threadsafe(
+        doc_writer.index_docs_many(params_list), loop
+    ).result()
+
+
 @shared_task(name="docs.tasks.retry_indexing_docs")
 @inject
 def retry_indexing_docs(
@@ -32,12 +67,14 @@ def retry_indexing_docs(
     doc_writer: DocWriter = Provide[CeleryContainer.doc_writer],
 ) -> None:
 
+    # A failing doc must not stop the rest of the page. Its failure status is
+    # already recorded and the sweeper reschedules it with backoff.
     for row in req:
         try:
             request = _IndexDocsRequest(**row)
             doc_writer.index_docs(IndexDocsParams(key=request.key))
         except Exception:
-            continue
+            logger.exception("Retry of %s failed", row.get("key"))
 
 
 @shared_task(name="docs.tasks.handle_fail_indexing")
@@ -46,5 +83,15 @@ def handle_fail_indexing(
     doc_writer: DocWriter = Provide[CeleryContainer.doc_writer],
 ) -> None:
     doc_writer.retry_unhandled_docs(
-        lambda req: cast(Task, retry_indexing_docs).delay(req)
+        lambda req, queue: cast(Task, retry_indexing_docs).apply_async(
+            args=[req], queue=queue
+        )
     )
+
+
+@shared_task(name="docs.tasks.refresh_indexed_docs")
+@inject
+def refresh_indexed_docs(
+    doc_writer: DocWriter = Provide[CeleryContainer.doc_writer],
+) -> None:
+    doc_writer.refresh_pending_docs()
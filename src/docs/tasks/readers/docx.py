@@ -0,0 +1,12 @@
+from pathlib import Path
+from typing import BinaryIO, Iterator
+
+import docx2txt
+from llama_index.core.readers.base import BaseReader
+from llama_index.core.schema import Document
+
+
+class DocxReader(BaseReader):
+    def lazy_load_data(self, file: Path | BinaryIO) -> Iterator[Document]:
+        # docx2txt opens the zip container from a path or a file object alike
+        yield Document(text=docx2txt.process(file))
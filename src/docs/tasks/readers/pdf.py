@@ -0,0 +1,25 @@
+from pathlib import Path
+from typing import BinaryIO, Iterator
+
+import pypdf
+from llama_index.core.readers.base import BaseReader
+from llama_index.core.schema import Document
+
+
+class PdfReader(BaseReader):
+    def lazy_load_data(self, file: Path | BinaryIO) -> Iterator[Document]:
+        if isinstance(file, Path):
+            with open(file, "rb") as fp:
+                yield from self._iter_pages(fp)
+        else:
+            yield from self._iter_pages(file)
+
+    def _iter_pages(self, stream: BinaryIO) -> Iterator[Document]:
+        pdf = pypdf.PdfReader(stream)
+
+        # Yield page by page so only one page of text is alive at a time
+        for page_idx, page in enumerate(pdf.pages):
+            yield Document(
+                text=page.extract_text(),
+                metadata={"page_label": pdf.page_labels[page_idx]},
+            )
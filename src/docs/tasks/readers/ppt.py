@@ -1,4 +1,5 @@
-from typing import List, cast
+from pathlib import Path
+from typing import BinaryIO, Iterator, List, cast
 
 from llama_index.core.schema import Document
 from pptx import Presentation
@@ -6,9 +7,11 @@ from pptx.shapes.autoshape import Shape
 
 
 class PptReader:
-    def load_data(self, file_path: str):
-        prs = Presentation(file_path)
-        documents: List[Document] = []
+    def load_data(self, file: str | Path | BinaryIO) -> List[Document]:
+        return list(self.lazy_load_data(file))
+
+    def lazy_load_data(self, file: str | Path | BinaryIO) -> Iterator[Document]:
+        prs = Presentation(file)
 
         for idx, slide in enumerate(prs.slides):
             lines = []
@@ -24,6 +27,4 @@ class PptReader:
 
             if lines:
                 full_text = '\n'.join(lines)
-                documents.append(Document(text=full_text, metadata={"slide_index": idx}))
-
-        return documents
+                yield Document(text=full_text, metadata={"slide_index": idx})
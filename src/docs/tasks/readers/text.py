@@ -0,0 +1,15 @@
+from pathlib import Path
+from typing import BinaryIO, Iterator
+
+from llama_index.core.readers.base import BaseReader
+from llama_index.core.schema import Document
+
+
+class TextReader(BaseReader):
+    def lazy_load_data(self, file: Path | BinaryIO) -> Iterator[Document]:
+        if isinstance(file, Path):
+            text = file.read_text(encoding="utf-8")
+        else:
+            text = file.read().decode("utf-8")
+
+        yield Document(text=text)
@@ -1,49 +1,255 @@
-from typing import List
+from typing import Dict, List, Optional, Tuple
 import uuid
 
 from datetime import datetime
 from collections.abc import Sequence
 
-from sqlalchemy import and_, func, select, update
+from sqlalchemy import Row, and_, or_, select, update
 from sqlalchemy.orm import Session
-from docs.models.doc_model import DocStatus, Docs
+from docs.models.doc_model import FAILED_STATUSES, DocStatus, Docs, IndexStage
 
 
 class DocTaskRepository:
     def update_status(
         self, session: Session, doc_ids: List[uuid.UUID], status: DocStatus
     ) -> None:
-        stmt = update(Docs).where(Docs.id.in_(doc_ids)).values(status=status)
+        stmt = update(Docs).where(Docs.id.in_(doc_ids)).values(**_status_values(status))
         session.execute(stmt)
 
-    def fetch_docs_by_status(
+    def finish_indexing(
         self,
-        statuses: List[DocStatus],
         session: Session,
-        cutoff_time: datetime,
-        offset: int = 0,
-        limit: int = 100,
-    ) -> Sequence[Docs]:
+        outcomes: Dict[DocStatus, List[uuid.UUID]],
+        written: Dict[uuid.UUID, Tuple[str, str]],
+    ) -> Dict[DocStatus, List[uuid.UUID]]:
+        # Outcomes of indexing attempts land only on docs still INDEXING. One
+        # the sweeper or a newer attempt has moved on keeps its status, the
+        # stale outcome is dropped. Returns the outcomes that landed.
+        doc_ids = [doc_id for ids in outcomes.values() for doc_id in ids]
+        if not doc_ids:
+            return {}
+
         stmt = (
-            select(Docs)
-            .where(and_(Docs.created_at <= cutoff_time, Docs.status.in_(statuses)))
-            .order_by(Docs.created_at.desc())
-            .limit(limit)
-            .offset(offset)
+            select(Docs.id)
+            .where(Docs.id.in_(doc_ids), Docs.status == DocStatus.INDEXING)
+            .with_for_update()
+        )
+        indexing = set(session.execute(stmt).scalars().all())
+
+        self.mark_written(
+            session,
+            {doc_id: row for doc_id, row in written.items() if doc_id in indexing},
+        )
+
+        landed: Dict[DocStatus, List[uuid.UUID]] = {}
+        for status, ids in outcomes.items():
+            ids = [doc_id for doc_id in ids if doc_id in indexing]
+            if not ids:
+                continue
+            session.execute(
+                update(Docs)
+                .where(Docs.id.in_(ids), Docs.status == DocStatus.INDEXING)
+                .values(**_status_values(status))
+            )
+            landed[status] = ids
+        return landed
+
+    def mark_refreshed(
+        self, session: Session, doc_ids: List[uuid.UUID]
+    ) -> Sequence[uuid.UUID]:
+        # Only docs still REFRESH_PENDING become INDEXED, one that a newer
+        # attempt has moved on keeps its status. Returns the docs flipped.
+        stmt = (
+            select(Docs.id)
+            .where(Docs.id.in_(doc_ids), Docs.status == DocStatus.REFRESH_PENDING)
+            .with_for_update()
+        )
+        refreshed = session.execute(stmt).scalars().all()
+        if not refreshed:
+            return refreshed
+
+        session.execute(
+            update(Docs)
+            .where(Docs.id.in_(refreshed), Docs.status == DocStatus.REFRESH_PENDING)
+            .values(status=DocStatus.INDEXED)
+        )
+        return refreshed
+
+    def schedule_retry(
+        self,
+        session: Session,
+        doc_ids: List[uuid.UUID],
+        attempt_count: int,
+        next_attempt_at: datetime,
+    ) -> None:
+        stmt = (
+            update(Docs)
+            .where(Docs.id.in_(doc_ids))
+            .values(
+                status=DocStatus.RETRYING,
+                attempt_count=attempt_count,
+                next_attempt_at=next_attempt_at,
+            )
+        )
+        session.execute(stmt)
+
+    def start_indexing(self, session: Session, doc_ids: List[uuid.UUID]) -> Sequence[
+        Row[
+            Tuple[
+                uuid.UUID,
+                Optional[IndexStage],
+                Optional[str],
+                Optional[str],
+                Optional[str],
+            ]
+        ]
+    ]:
+        # Flips the docs to INDEXING and returns where previous attempts stopped
+        session.execute(
+            update(Docs).where(Docs.id.in_(doc_ids)).values(status=DocStatus.INDEXING)
+        )
+
+        stmt = select(
+            Docs.id,
+            Docs.completed_stage,
+            Docs.artifact_key,
+            Docs.content_hash,
+            Docs.chunk_version,
+        ).where(Docs.id.in_(doc_ids))
+
+        return session.execute(stmt).all()
+
+    def save_checkpoint(
+        self,
+        session: Session,
+        doc_id: uuid.UUID,
+        stage: IndexStage,
+        content_hash: str,
+        artifact_key: Optional[str],
+    ) -> None:
+        stmt = (
+            update(Docs)
+            .where(Docs.id == doc_id)
+            .values(
+                completed_stage=stage,
+                content_hash=content_hash,
+                artifact_key=artifact_key,
+            )
         )
+        session.execute(stmt)
+
+    def mark_written(
+        self, session: Session, contents: Dict[uuid.UUID, Tuple[str, str]]
+    ) -> None:
+        # doc_id -> (content_hash, chunk_version), one executemany for all docs.
+        # Runs before the status moves on, docs no longer INDEXING are skipped.
+        # The chunks are in Elasticsearch, so the split checkpoint is dropped
+        # and the retry bookkeeping starts over.
+        if not contents:
+            return
+
+        session.execute(
+            update(Docs)
+            .where(Docs.status == DocStatus.INDEXING)
+            .execution_options(synchronize_session=None),
+            [
+                {
+                    "id": doc_id,
+                    "content_hash": content_hash,
+                    "chunk_version": chunk_version,
+                    "completed_stage": IndexStage.WRITTEN,
+                    "artifact_key": None,
+                    "attempt_count": 0,
+                    "next_attempt_at": None,
+                    "last_error_stage": None,
+                }
+                for doc_id, (content_hash, chunk_version) in contents.items()
+            ],
+        )
+
+    def fetch_indexed_doc_id_by_hash(
+        self,
+        session: Session,
+        content_hash: str,
+        chunk_version: str,
+        exclude_doc_id: uuid.UUID,
+    ) -> Optional[uuid.UUID]:
+        stmt = (
+            select(Docs.id)
+            .where(
+                and_(
+                    Docs.content_hash == content_hash,
+                    Docs.chunk_version == chunk_version,
+                    Docs.status == DocStatus.INDEXED,
+                    Docs.id != exclude_doc_id,
+                )
+            )
+            .limit(1)
+        )
+
+        return session.execute(stmt).scalar()
+
+    def fetch_doc_ids_by_status(
+        self, statuses: List[DocStatus], session: Session, limit: int = 1000
+    ) -> Sequence[uuid.UUID]:
+        stmt = select(Docs.id).where(Docs.status.in_(statuses)).limit(limit)
 
         return session.execute(stmt).scalars().all()
 
-    def fetch_count_by_status(
+    def claim_docs_by_status(
         self,
-        statuses: List[DocStatus],
         session: Session,
+        status: DocStatus,
         cutoff_time: datetime,
-    ) -> int:
+        due_time: datetime,
+        lease_time: Optional[datetime] = None,
+        after: Optional[Tuple[datetime, uuid.UUID]] = None,
+        limit: int = 100,
+    ) -> Sequence[Row[Tuple[uuid.UUID, str, str, int, str, datetime, int]]]:
+        # Keyset page on (created_at, id). Rows locked by another sweeper are
+        # skipped, so concurrent sweepers claim disjoint docs. One status per
+        # query keeps the page an ordered range of the (status, created_at, id)
+        # index with no filesort, and only the columns the sweep hands out are
+        # read, never the full entity. Docs backing off until after `due_time`
+        # are left alone, and so are docs updated after `lease_time`, still
+        # held by the worker indexing them.
+        conditions = [
+            Docs.status == status,
+            Docs.created_at <= cutoff_time,
+            or_(Docs.next_attempt_at.is_(None), Docs.next_attempt_at <= due_time),
+        ]
+        if lease_time is not None:
+            conditions.append(Docs.updated_at <= lease_time)
+        if after is not None:
+            after_created_at, after_id = after
+            conditions.append(
+                or_(
+                    Docs.created_at > after_created_at,
+                    and_(Docs.created_at == after_created_at, Docs.id > after_id),
+                )
+            )
+
         stmt = (
-            select(func.count(1))
-            .select_from(Docs)
-            .where(and_(Docs.created_at <= cutoff_time, Docs.status.in_(statuses)))
+            select(
+                Docs.id,
+                Docs.bucket,
+                Docs.key,
+                Docs.size,
+                Docs.extension,
+                Docs.created_at,
+                Docs.attempt_count,
+            )
+            .where(and_(*conditions))
+            .order_by(Docs.created_at, Docs.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
         )
 
-        return session.execute(stmt).scalar() or 0
+        return session.execute(stmt).all()
+
+
+def _status_values(status: DocStatus) -> Dict:
+    values: Dict = {"status": status}
+    if status in FAILED_STATUSES:
+        values["last_error_stage"] = status.value
+    return values
@@ -0,0 +1,267 @@
+import asyncio
+import logging
+import uuid
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import Row
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from clients.s3.exceptions import FailToDownloadError
+from clients.s3.s3 import AsyncS3Client, DownloadedFile
+from db.db import WriteSessionManager
+from docs.dtos.docs_dto import IndexDocsParams
+from docs.models.doc_model import DocStatus, IndexStage
+from docs.tasks.clients.chunk_cache import ChunkCache
+from docs.tasks.clients.es_task import AsyncEsTaskClient, RefreshMode
+from docs.tasks.clients.search_cache_invalidator import SearchCacheInvalidator
+from docs.tasks.clients.status_publisher import StatusPublisher
+from docs.tasks.exceptions import StageError
+from docs.tasks.repositories.doc_task_repository import DocTaskRepository
+from docs.tasks.services.doc_indexing import (
+    bulk_refresh,
+    cached_key,
+    generate_chunks,
+    is_written,
+    parse_key,
+    parse_source,
+    resume_key,
+    validate_extension,
+    written_status,
+)
+from docs.tasks.services.doc_parser import parse_chunks
+
+__all__ = ["AsyncDocWriter"]
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncDocWriter:
+    """Cooperative `DocWriter.index_docs` for many docs on one event loop.
+
+    Downloads, bulk requests and DB round trips of up to `concurrency` docs are
+    in flight at once in a single worker process. Parsing is CPU-bound, so it
+    runs in the parser pool, or the loop's default thread pool without one.
+    The DB calls reuse `DocTaskRepository` through `AsyncSession.run_sync`.
+    """
+
+    def __init__(
+        self,
+        s3_client: AsyncS3Client,
+        es_client: AsyncEsTaskClient,
+        session_maker: async_sessionmaker[AsyncSession],
+        repo: DocTaskRepository,
+        bucket_name: str,
+        allowed_extensions: List[str],
+        doc_index_name: str,
+        refresh_mode: RefreshMode,
+        in_memory_limit: int,
+        concurrency: int,
+        parser_pool: Optional[Executor] = None,
+        chunk_cache: Optional[ChunkCache] = None,
+        status_publisher: Optional[StatusPublisher] = None,
+        search_cache_invalidator: Optional[SearchCacheInvalidator] = None,
+    ):
+        self.s3_client = s3_client
+        self.es_client = es_client
+        self.session_maker = session_maker
+        self.repo = repo
+        self.bucket_name = bucket_name
+        self.allowed_extensions = allowed_extensions
+        self.doc_index_name = doc_index_name
+        self.refresh_mode = refresh_mode
+        self.in_memory_limit = in_memory_limit
+        self.concurrency = concurrency
+        self.parser_pool = parser_pool
+        self.chunk_cache = chunk_cache
+        self.status_publisher = status_publisher
+        self.search_cache_invalidator = search_cache_invalidator
+
+    async def index_docs_many(self, params_list: List[IndexDocsParams]) -> None:
+        # A failing doc never stops the others, its status is already recorded
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def index(params: IndexDocsParams) -> None:
+            async with semaphore:
+                try:
+                    await self.index_docs(params)
+                except Exception:
+                    logger.exception("Failed to index %s", params.key)
+
+        await asyncio.gather(*(index(params) for params in params_list))
+
+    async def index_docs(self, params: IndexDocsParams) -> None:
+        doc_id, ext = parse_key(params.key)
+        validate_extension(ext, self.allowed_extensions)
+
+        checkpoint = await self._start_indexing(doc_id)
+        if is_written(checkpoint, params.chunk_version):
+            await self._finish_written(doc_id, checkpoint.content_hash, params)
+            return
+        content_hash, contents = await self._resume_contents(checkpoint, params)
+
+        downloaded: Optional[DownloadedFile] = None
+        if contents is None:
+            try:
+                downloaded = await self.s3_client.download_fileobj(
+                    bucket_name=self.bucket_name,
+                    key=params.key,
+                    max_memory_size=self.in_memory_limit,
+                    suffix=f".{ext}",
+                )
+            except FailToDownloadError:
+                await self._update_status(doc_id, DocStatus.DOWNLOAD_FAILED)
+                return
+            content_hash = downloaded.content_hash
+
+        split: Optional[List[str]] = None
+        try:
+            if not await self._reuse_chunks(doc_id, content_hash, params):
+                # A previous run may have split the same content already
+                if contents is None:
+                    contents = await self._cached_contents(content_hash, params)
+                if contents is None:
+                    contents = split = await self._split_contents(
+                        params, downloaded, ext
+                    )
+                chunks = generate_chunks(contents, doc_id, ext, params.chunk_version)
+                stats = await self.es_client.index_docs(
+                    chunks, self.doc_index_name, refresh=bulk_refresh(self.refresh_mode)
+                )
+                await self.es_client.delete_stale_chunks(
+                    self.doc_index_name, params.chunk_version, {doc_id: stats.indexed}
+                )
+        except StageError as e:
+            await self._update_status(doc_id, e.status)
+            raise e.error
+        except Exception as e:
+            if split is not None:
+                await self._keep_split(doc_id, content_hash, params, split)
+            await self._update_status(doc_id, DocStatus.INDEXING_FAILED)
+            raise e
+        finally:
+            if downloaded is not None:
+                downloaded.close()
+
+        await self._finish_written(doc_id, content_hash, params)
+
+    async def _finish_written(
+        self, doc_id: uuid.UUID, content_hash: str, params: IndexDocsParams
+    ) -> None:
+        status = written_status(self.refresh_mode)
+        if self.search_cache_invalidator is not None and status == DocStatus.INDEXED:
+            await asyncio.to_thread(self.search_cache_invalidator.invalidate, [doc_id])
+        await self._finish_indexing(
+            {status: [doc_id]}, {doc_id: (content_hash, params.chunk_version)}
+        )
+
+    async def _run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        # One short transaction per call, so concurrent docs never share a session
+        async with WriteSessionManager(self.session_maker) as session:
+            return await session.run_sync(fn, *args)
+
+    async def _update_status(self, doc_id: uuid.UUID, status: DocStatus) -> None:
+        await self._finish_indexing({status: [doc_id]}, {})
+
+    async def _finish_indexing(
+        self,
+        outcomes: Dict[DocStatus, List[uuid.UUID]],
+        written: Dict[uuid.UUID, Tuple[str, str]],
+    ) -> None:
+        landed = await self._run(self.repo.finish_indexing, outcomes, written)
+        await self._publish(landed)
+
+    async def _publish(self, outcomes: Dict[DocStatus, List[uuid.UUID]]) -> None:
+        if self.status_publisher is not None:
+            await asyncio.to_thread(self.status_publisher.publish, outcomes)
+
+    async def _start_indexing(self, doc_id: uuid.UUID) -> Optional[Row]:
+        rows = await self._run(self.repo.start_indexing, [doc_id])
+        await self._publish({DocStatus.INDEXING: [doc_id]})
+        return rows[0] if rows else None
+
+    async def _resume_contents(
+        self, checkpoint: Optional[Row], params: IndexDocsParams
+    ) -> Tuple[Optional[str], Optional[List[str]]]:
+        artifact_key = resume_key(self.chunk_cache, checkpoint, params.chunk_version)
+        if artifact_key is None:
+            return None, None
+
+        contents = await asyncio.to_thread(self._read_cache, artifact_key)
+        if contents is None:
+            return None, None
+        return checkpoint.content_hash, contents
+
+    async def _cached_contents(
+        self, content_hash: str, params: IndexDocsParams
+    ) -> Optional[List[str]]:
+        key = cached_key(self.chunk_cache, content_hash, params.chunk_version)
+        if key is None:
+            return None
+        return await asyncio.to_thread(self._read_cache, key)
+
+    async def _reuse_chunks(
+        self, doc_id: uuid.UUID, content_hash: str, params: IndexDocsParams
+    ) -> bool:
+        source_doc_id = await self._run(
+            self.repo.fetch_indexed_doc_id_by_hash,
+            content_hash,
+            params.chunk_version,
+            doc_id,
+        )
+        if source_doc_id is None:
+            return False
+
+        copied = await self.es_client.copy_chunks(
+            self.doc_index_name,
+            source_doc_id,
+            doc_id,
+            params.chunk_version,
+            refresh=self.refresh_mode == "wait_for",
+        )
+        await self.es_client.delete_stale_chunks(
+            self.doc_index_name, params.chunk_version, {doc_id: copied}
+        )
+        logger.info("Reused %d chunks of %s for %s", copied, source_doc_id, doc_id)
+        return True
+
+    async def _split_contents(
+        self, params: IndexDocsParams, downloaded: DownloadedFile, ext: str
+    ) -> List[str]:
+        return await asyncio.get_running_loop().run_in_executor(
+            self.parser_pool,
+            parse_chunks,
+            parse_source(downloaded),
+            ext,
+            params.chunk_size,
+            params.chunk_overlap,
+        )
+
+    async def _keep_split(
+        self,
+        doc_id: uuid.UUID,
+        content_hash: str,
+        params: IndexDocsParams,
+        contents: List[str],
+    ) -> None:
+        # Chunks of a doc whose write failed are cached, and the SPLIT
+        # checkpoint points its retry at them
+        if self.chunk_cache is None:
+            return
+
+        stored = await asyncio.to_thread(
+            self.chunk_cache.put, content_hash, params.chunk_version, contents
+        )
+        if not stored:
+            return
+        await self._run(
+            self.repo.save_checkpoint,
+            doc_id,
+            IndexStage.SPLIT,
+            content_hash,
+            self.chunk_cache.key(content_hash, params.chunk_version),
+        )
+
+    def _read_cache(self, key: str) -> Optional[List[str]]:
+        contents = self.chunk_cache.open(key)
+        return list(contents) if contents is not None else None
@@ -0,0 +1,107 @@
+import uuid
+from typing import Iterable, Iterator, List, Literal, Optional, Tuple
+
+from sqlalchemy import Row
+
+from clients.elasticsearch.schema import DocMetadata, DocSchema
+from clients.s3.s3 import DownloadedFile
+from docs.exceptions import NotAllowedExtensionError
+from docs.models.doc_model import DocStatus, IndexStage
+from docs.tasks.clients.chunk_cache import ChunkCache
+from docs.tasks.clients.es_task import RefreshMode
+
+__all__ = [
+    "bulk_refresh",
+    "cached_key",
+    "generate_chunks",
+    "is_written",
+    "parse_key",
+    "parse_source",
+    "resume_key",
+    "validate_extension",
+    "written_status",
+]
+
+# Steps `DocWriter` and `AsyncDocWriter` share, free of I/O so both the sync and
+# the async writer call them as they are.
+
+
+def parse_key(key: str) -> Tuple[uuid.UUID, str]:
+    doc_id_str, ext = key.split("/")[-1].split(".")
+    return uuid.UUID(doc_id_str), ext
+
+
+def validate_extension(ext: str, allowed_extensions: List[str]) -> None:
+    if ext not in allowed_extensions:
+        raise NotAllowedExtensionError()
+
+
+def is_written(checkpoint: Optional[Row], chunk_version: str) -> bool:
+    # A previous attempt wrote the chunks with the same chunking params, only
+    # its status write is left
+    return (
+        checkpoint is not None
+        and checkpoint.completed_stage == IndexStage.WRITTEN
+        and checkpoint.content_hash is not None
+        and checkpoint.chunk_version == chunk_version
+    )
+
+
+def resume_key(
+    chunk_cache: Optional[ChunkCache], checkpoint: Optional[Row], chunk_version: str
+) -> Optional[str]:
+    # Cache entry of the chunks a previous attempt split with the same chunking
+    # params, None when the doc has to start over
+    if (
+        chunk_cache is None
+        or checkpoint is None
+        or checkpoint.completed_stage != IndexStage.SPLIT
+        or checkpoint.content_hash is None
+    ):
+        return None
+
+    artifact_key = chunk_cache.key(checkpoint.content_hash, chunk_version)
+    if checkpoint.artifact_key != artifact_key:
+        return None
+    return artifact_key
+
+
+def cached_key(
+    chunk_cache: Optional[ChunkCache], content_hash: str, chunk_version: str
+) -> Optional[str]:
+    # Cache entry a previous run may have split the same content into, e.g.
+    # under another doc id or before its checkpoint was cleared
+    if chunk_cache is None:
+        return None
+    return chunk_cache.key(content_hash, chunk_version)
+
+
+def parse_source(downloaded: DownloadedFile) -> str | bytes:
+    # What a parser process gets: the spooled file's path, or the bytes of a
+    # small file so the parser never touches the filesystem
+    return str(downloaded.path) if downloaded.path else downloaded.fileobj.read()
+
+
+def generate_chunks(
+    contents: Iterable[str], doc_id: uuid.UUID, ext: str, chunk_version: str
+) -> Iterator[DocSchema]:
+    for order, content in enumerate(contents, start=1):
+        yield DocSchema(
+            doc_id=doc_id,
+            order=order,
+            content=content,
+            chunk_version=chunk_version,
+            metadata=DocMetadata(ext=ext),
+        )
+
+
+def bulk_refresh(refresh_mode: RefreshMode) -> bool | Literal["wait_for"]:
+    return "wait_for" if refresh_mode == "wait_for" else False
+
+
+def written_status(refresh_mode: RefreshMode) -> DocStatus:
+    # Without wait_for the chunks are not searchable yet, so the doc is
+    # flipped to INDEXED by `DocWriter.refresh_pending_docs`.
+    if refresh_mode == "wait_for":
+        return DocStatus.INDEXED
+    return DocStatus.REFRESH_PENDING
@@ -0,0 +1,218 @@
+import io
+import tempfile
+from concurrent.futures import Executor, Future
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Iterable, Iterator, List, Optional
+
+import billiard
+from billiard.einfo import ExceptionInfo
+from llama_index.core.node_parser import SentenceSplitter
+from llama_index.core.readers.base import BaseReader
+from llama_index.core.readers.json import JSONReader
+from llama_index.core.schema import BaseNode, Document as LlamaDocument
+from llama_index.readers.file import HWPReader
+
+from docs.models.doc_model import DocStatus
+from docs.tasks.exceptions import StageError
+from docs.tasks.readers.docx import DocxReader
+from docs.tasks.readers.pdf import PdfReader
+from docs.tasks.readers.ppt import PptReader
+from docs.tasks.readers.text import TextReader
+
+__all__ = [
+    "ParserPool",
+    "READER_MAP",
+    "get_reader",
+    "get_splitter",
+    "init_parser_pool",
+    "iter_nodes",
+    "open_source",
+    "parse_chunks",
+    "warm_up",
+]
+
+READER_MAP = {
+    "pptx": PptReader,
+    "docx": DocxReader,
+    "pdf": PdfReader,
+    "txt": TextReader,
+    "ppt": PptReader,
+    "doc": DocxReader,
+    "hwp": HWPReader,
+    "hwpx": HWPReader,
+    "json": JSONReader,
+    "py": TextReader,
+}
+
+# Readers that parse straight from an in-memory file object
+STREAM_READERS = (DocxReader, PdfReader, PptReader, TextReader)
+
+# Readers keeping no per-file state, one instance serves every doc and thread.
+# HWPReader accumulates the text it reads on itself, so it is built per doc.
+SHARED_READERS = (DocxReader, JSONReader, PdfReader, PptReader, TextReader)
+
+DEFAULT_CHUNK_SIZE = 1024
+DEFAULT_CHUNK_OVERLAP = 204
+
+
+def get_reader(ext: str) -> BaseReader:
+    reader_cls = READER_MAP.get(f"{ext.lower()}", TextReader)
+    if reader_cls in SHARED_READERS:
+        return _shared_reader(reader_cls)
+    return reader_cls()
+
+
+@lru_cache(maxsize=32)
+def get_splitter(chunk_size: int, chunk_overlap: int) -> SentenceSplitter:
+    # Building a splitter loads the tokenizer and sentence tokenizers, so one
+    # is kept per chunking params instead of one per doc
+    return SentenceSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+
+@contextmanager
+def open_source(
+    reader: BaseReader, source: Path | io.BytesIO
+) -> Iterator[Path | BinaryIO]:
+    if isinstance(source, Path) or isinstance(reader, STREAM_READERS):
+        yield source
+        return
+
+    # Path-only readers get a short-lived copy of the in-memory file
+    with tempfile.NamedTemporaryFile(delete=False) as tmp:
+        tmp.write(source.getvalue())
+
+    tmp_path = Path(tmp.name)
+    try:
+        yield tmp_path
+    finally:
+        tmp_path.unlink()
+
+
+def iter_nodes(
+    reader: BaseReader,
+    source: Path | BinaryIO,
+    chunk_size: int,
+    chunk_overlap: int,
+) -> Iterator[BaseNode]:
+    documents = _read_documents(reader, source)
+    return _split_documents(documents, chunk_size, chunk_overlap)
+
+
+def parse_chunks(
+    source: str | bytes, ext: str, chunk_size: int, chunk_overlap: int
+) -> List[str]:
+    # Entry point of the parser processes. `source` is a file path, or the bytes
+    # of a file small enough to be kept in memory. Only chunk texts travel back
+    # to the worker, and the cause is flattened since arbitrary reader errors
+    # may not survive pickling.
+    reader = get_reader(ext)
+    file = io.BytesIO(source) if isinstance(source, bytes) else Path(source)
+
+    try:
+        with open_source(reader, file) as opened:
+            nodes = iter_nodes(reader, opened, chunk_size, chunk_overlap)
+            return [node.get_content() for node in nodes]
+    except StageError as e:
+        raise StageError(e.status, RuntimeError(str(e.error))) from None
+
+
+def warm_up() -> None:
+    # Pays reader construction and tokenizer loading before the first doc arrives
+    for ext in READER_MAP:
+        get_reader(ext)
+
+    get_splitter(DEFAULT_CHUNK_SIZE, DEFAULT_CHUNK_OVERLAP).split_text("warm up")
+
+
+class ParserPool(Executor):
+    """Persistent, warmed-up parser processes behind the `Executor` interface.
+
+    Built on billiard rather than `ProcessPoolExecutor`: a prefork worker child
+    is a daemonic process, and only billiard lets it start children of its own.
+    """
+
+    def __init__(self, processes: int):
+        # spawn: children must not inherit the worker's gevent hub, sockets or
+        # threads
+        self._pool = billiard.get_context("spawn").Pool(
+            processes=processes, initializer=warm_up
+        )
+
+    def submit(self, fn: Callable[..., Any], /, *args: Any, **kwargs: Any) -> Future:
+        future: Future = Future()
+        future.set_running_or_notify_cancel()
+        self._pool.apply_async(
+            fn,
+            args,
+            kwargs,
+            callback=future.set_result,
+            error_callback=lambda error: future.set_exception(
+                error.exception if isinstance(error, ExceptionInfo) else error
+            ),
+        )
+        return future
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False) -> None:
+        if cancel_futures:
+            self._pool.terminate()
+        else:
+            self._pool.close()
+        if wait:
+            self._pool.join()
+
+
+def init_parser_pool(processes: int) -> Iterator[Optional[ParserPool]]:
+    if processes <= 0:
+        yield None
+        return
+
+    pool = ParserPool(processes)
+
+    # Start every process now so none is cold when the first doc arrives
+    for future in [pool.submit(_noop) for _ in range(processes)]:
+        future.result()
+
+    try:
+        yield pool
+    finally:
+        pool.shutdown()
+
+
+def _noop() -> None:
+    pass
+
+
+@lru_cache(maxsize=None)
+def _shared_reader(reader_cls: type) -> BaseReader:
+    return reader_cls()
+
+
+def _read_documents(
+    reader: BaseReader, source: Path | BinaryIO
+) -> Iterator[LlamaDocument]:
+    try:
+        # Readers that cannot stream fall back to loading the whole file
+        try:
+            documents = reader.lazy_load_data(source)
+        except NotImplementedError:
+            documents = reader.load_data(source)
+
+        yield from documents
+    except Exception as e:
+        raise StageError(DocStatus.READ_FAILED, e)
+
+
+def _split_documents(
+    documents: Iterable[LlamaDocument], chunk_size: int, chunk_overlap: int
+) -> Iterator[BaseNode]:
+    sentence_splitter = get_splitter(chunk_size, chunk_overlap)
+
+    for document in documents:
+        try:
+            nodes = sentence_splitter.get_nodes_from_documents([document])
+        except Exception as e:
+            raise StageError(DocStatus.SPLITTING_FAILED, e)
+
+        yield from nodes
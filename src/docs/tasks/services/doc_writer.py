@@ -1,32 +1,51 @@
-from collections.abc import Sequence
-from datetime import timedelta
+import logging
+import threading
+from collections import defaultdict
+from concurrent.futures import Executor, ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
 import uuid
-from typing import List
-from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
-from llama_index.core.node_parser import SentenceSplitter
 from llama_index.core.readers.base import BaseReader
-from llama_index.readers.file import (
-    PDFReader,
-    DocxReader,
-    FlatReader,
-    HWPReader,
-)
-from llama_index.core.readers.json import JSONReader
+from sqlalchemy import Row
 
 from base.date import get_utc_now
 from clients.s3.exceptions import FailToDownloadError
-from clients.s3.s3 import S3Client
+from clients.s3.s3 import DownloadedFile, S3Client
 from db.db import WriteSessionSyncManager
 from docs.dtos.docs_dto import IndexDocsParams
 from docs.exceptions import NotAllowedExtensionError
-from clients.elasticsearch.schema import DocMetadata, DocSchema
-from docs.models.doc_model import DocStatus, Docs
-from docs.tasks.clients.es_task import EsTaskClient
-from docs.tasks.readers.ppt import PptReader
+from clients.elasticsearch.schema import DocSchema
+from docs.models.doc_model import DocStatus, IndexStage
+from docs.tasks.clients.chunk_cache import ChunkCache
+from docs.tasks.clients.es_task import EsTaskClient, RefreshMode
+from docs.tasks.clients.search_cache_invalidator import SearchCacheInvalidator
+from docs.tasks.clients.status_publisher import StatusPublisher
+from docs.tasks.exceptions import StageError
 from docs.tasks.repositories.doc_task_repository import DocTaskRepository
+from docs.tasks.services.doc_parser import (
+    get_reader,
+    iter_nodes,
+    open_source,
+    parse_chunks,
+)
+from docs.tasks.services.doc_indexing import (
+    bulk_refresh,
+    cached_key,
+    generate_chunks,
+    is_written,
+    parse_key,
+    parse_source,
+    resume_key,
+    validate_extension,
+    written_status,
+)
+from docs.tasks.services.queue_router import DocQueueRouter
+from docs.tasks.services.status_buffer import StatusBuffer
 from docs.tasks.types import IndexDocTaskType
 
+logger = logging.getLogger(__name__)
+
 
 class DocWriter:
     def __init__(
@@ -39,6 +58,20 @@ class DocWriter:
         allowed_extensions: List[str],
         doc_size_limit: int,
         doc_index_name: str,
+        refresh_mode: RefreshMode,
+        batch_concurrency: int,
+        in_memory_limit: int,
+        retry_batch_size: int,
+        parser_pool: Optional[Executor] = None,
+        chunk_cache: Optional[ChunkCache] = None,
+        retry_max_attempts: int = 5,
+        retry_base_delay: int = 600,
+        retry_max_delay: int = 24 * 60 * 60,
+        retry_lease_timeout: int = 60 * 60,
+        queue_router: Optional[DocQueueRouter] = None,
+        status_buffer: Optional[StatusBuffer] = None,
+        status_publisher: Optional[StatusPublisher] = None,
+        search_cache_invalidator: Optional[SearchCacheInvalidator] = None,
     ):
         self.s3_client = s3_client
         self.es_client = es_client
@@ -48,84 +81,236 @@ class DocWriter:
         self.allowed_extensions = allowed_extensions
         self.doc_size_limit = doc_size_limit
         self.doc_index_name = doc_index_name
+        self.refresh_mode = refresh_mode
+        self.batch_concurrency = batch_concurrency
+        self.in_memory_limit = in_memory_limit
+        self.retry_batch_size = retry_batch_size
+        self.parser_pool = parser_pool
+        self.chunk_cache = chunk_cache
+        self.retry_max_attempts = retry_max_attempts
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.retry_lease_timeout = retry_lease_timeout
+        self.queue_router = queue_router
+        self.status_buffer = status_buffer
+        self.status_publisher = status_publisher
+        self.search_cache_invalidator = search_cache_invalidator
+        # The session manager holds a single session, batch threads take turns
+        self._session_lock = threading.Lock()
 
     def index_docs(self, params: IndexDocsParams) -> None:
-        doc_id_str, ext = params.key.split("/")[-1].split(".")
-        doc_id = uuid.UUID(doc_id_str)
-
-        tmp_path = Path(f"/tmp/{doc_id_str}.{ext}")
+        doc_id, ext = parse_key(params.key)
+        reader = self._get_reader(ext)
 
-        # Download the file from S3 to a temporary path
-        try:
-            self.s3_client.download_file(
-                bucket_name=self.bucket_name,
-                key=params.key,
-                output_path=tmp_path,
+        # Retries resume after the last stage the previous attempt completed,
+        # a SPLIT checkpoint skips the download and parsing altogether and a
+        # WRITTEN one leaves only the status write
+        checkpoint = self._start_indexing([doc_id]).get(doc_id)
+        if is_written(checkpoint, params.chunk_version):
+            self._write_outcomes(
+                {written_status(self.refresh_mode): [doc_id]},
+                {doc_id: (checkpoint.content_hash, params.chunk_version)},
             )
-        except FailToDownloadError:
-            with self.write_session_manager as write_session:
-                self.repo.update_status(
-                    write_session, [doc_id], DocStatus.DOWNLOAD_FAILED
-                )
             return
+        content_hash, contents = self._resume_contents(checkpoint, params)
 
-        reader = self._get_reader(ext)
+        # Download the file from S3 into memory, or a spill file if it is large
+        downloaded: Optional[DownloadedFile] = None
+        if contents is None:
+            try:
+                downloaded = self._download(params.key, ext)
+            except FailToDownloadError:
+                self._update_status(doc_id, DocStatus.DOWNLOAD_FAILED)
+                return
+            content_hash = downloaded.content_hash
 
-        # Read docs
+        # Write to Elasticsearch
+        split: Optional[Iterator[str]] = None
         try:
-            document = reader.load_data(tmp_path)
+            if not self._reuse_chunks(doc_id, content_hash, params):
+                # A previous run may have split the same content already
+                if contents is None:
+                    contents = self._cached_contents(content_hash, params)
+                # Read -> split -> chunk is a lazy pipeline pulled by the bulk
+                # writer, so only a bounded window of the document is in memory.
+                if contents is None:
+                    contents = split = self._split_contents(
+                        content_hash,
+                        params,
+                        self._iter_contents(reader, downloaded, params, ext),
+                    )
+                chunks = generate_chunks(contents, doc_id, ext, params.chunk_version)
+                stats = self.es_client.index_docs(
+                    chunks, self.doc_index_name, refresh=bulk_refresh(self.refresh_mode)
+                )
+                self.es_client.delete_stale_chunks(
+                    self.doc_index_name, params.chunk_version, {doc_id: stats.indexed}
+                )
+        except StageError as e:
+            # Reading and splitting errors surface while the chunks stream
+            if split is not None:
+                self._delete_chunks([doc_id])
+            self._update_status(doc_id, e.status)
+            raise e.error
         except Exception as e:
-            with self.write_session_manager as write_session:
-                self.repo.update_status(write_session, [doc_id], DocStatus.READ_FAILED)
-
+            if split is not None:
+                self._finish_split(doc_id, content_hash, params, split)
+            self._update_status(doc_id, DocStatus.INDEXING_FAILED)
             raise e
         finally:
+            if downloaded is not None:
+                downloaded.close()
+
+        # Update document status
+        self._write_outcomes(
+            {written_status(self.refresh_mode): [doc_id]},
+            {doc_id: (content_hash, params.chunk_version)},
+        )
+
+    def index_docs_batch(self, params_list: List[IndexDocsParams]) -> None:
+        # Docs are downloaded concurrently and their chunks share one bulk
+        # stream, each doc read and split lazily as the stream reaches it.
+        # Failures are recorded per doc instead of aborting the batch.
+        doc_ids = [parse_key(params.key)[0] for params in params_list]
+        outcomes: Dict[DocStatus, List[uuid.UUID]] = defaultdict(list)
+        chunk_counts: Dict[str, Dict[uuid.UUID, int]] = defaultdict(dict)
+        # doc_id -> (content_hash, chunk_version), of docs a previous attempt
+        # wrote or copied from an identical doc, and of docs whose chunks all
+        # went into the bulk stream
+        copied: Dict[uuid.UUID, Tuple[str, str]] = {}
+        streamed: Dict[uuid.UUID, Tuple[str, str]] = {}
+        # doc_id -> (content_hash, contents, download) of docs yet to stream,
+        # or whose stream the failed bulk write cut off
+        pending: Dict[
+            uuid.UUID, Tuple[str, Iterator[str], Optional[DownloadedFile]]
+        ] = {}
+        # Docs that failed to read or split after their stream started
+        cut_short: List[uuid.UUID] = []
+        lock = threading.Lock()
+        checkpoints = self._start_indexing(doc_ids)
+
+        def prepare(doc_id: uuid.UUID, params: IndexDocsParams) -> None:
+            # Each doc's outcome is recorded as soon as it is known, so a failed
+            # bulk stream never hides the stage a doc actually reached
+            try:
+                content_hash, contents, downloaded = self._prepare_contents(
+                    params, checkpoints.get(doc_id)
+                )
+            except StageError as e:
+                with lock:
+                    outcomes[e.status].append(doc_id)
+                return
+
+            # No contents when the chunks were copied from an identical doc
+            with lock:
+                if contents is None:
+                    copied[doc_id] = (content_hash, params.chunk_version)
+                else:
+                    pending[doc_id] = (content_hash, contents, downloaded)
 
-            if tmp_path.exists():
-                tmp_path.unlink()
+        def doc_chunks(
+            doc_id: uuid.UUID, params: IndexDocsParams
+        ) -> Iterator[DocSchema]:
+            content_hash, contents, downloaded = pending[doc_id]
+            ext = parse_key(params.key)[1]
+            count = 0
+            try:
+                for chunk in generate_chunks(
+                    contents, doc_id, ext, params.chunk_version
+                ):
+                    count += 1
+                    yield chunk
+            except StageError as e:
+                with lock:
+                    outcomes[e.status].append(doc_id)
+                cut_short.append(doc_id)
+            else:
+                chunk_counts[params.chunk_version][doc_id] = count
+                streamed[doc_id] = (content_hash, params.chunk_version)
+
+            with lock:
+                del pending[doc_id]
+            if downloaded is not None:
+                downloaded.close()
 
-        # Split document into chunks
         try:
-            sentence_splitter = SentenceSplitter(
-                chunk_size=params.chunk_size,
-                chunk_overlap=int(
-                    params.chunk_size * max(params.chunk_overlap_ratio, 0)
-                ),
+            # Every doc is prepared before the pool shuts down, even once the
+            # shared write has failed
+            with ThreadPoolExecutor(max_workers=self.batch_concurrency) as pool:
+                futures = {
+                    pool.submit(prepare, doc_id, params): (doc_id, params)
+                    for doc_id, params in zip(doc_ids, params_list)
+                }
+
+                def shared_chunks() -> Iterator[DocSchema]:
+                    for future in as_completed(futures):
+                        doc_id, params = futures[future]
+                        if doc_id in pending:
+                            yield from doc_chunks(doc_id, params)
+
+                try:
+                    self.es_client.index_docs(
+                        shared_chunks(),
+                        self.doc_index_name,
+                        refresh=bulk_refresh(self.refresh_mode),
+                    )
+                    for chunk_version, counts in chunk_counts.items():
+                        self.es_client.delete_stale_chunks(
+                            self.doc_index_name, chunk_version, counts
+                        )
+                    write_failed = False
+                except Exception:
+                    logger.exception("Failed to index a batch of %d docs", len(doc_ids))
+                    write_failed = True
+
+            written = dict(copied)
+            if write_failed:
+                # Docs the stream reached, or would have, failed the write and
+                # keep their split chunks for the retry
+                for doc_id, params in zip(doc_ids, params_list):
+                    if doc_id in pending:
+                        content_hash, contents, _ = pending[doc_id]
+                        self._finish_split(doc_id, content_hash, params, contents)
+                    elif doc_id in streamed:
+                        content_hash = streamed[doc_id][0]
+                        self._checkpoint_split(doc_id, content_hash, params)
+                    else:
+                        continue
+                    outcomes[DocStatus.INDEXING_FAILED].append(doc_id)
+            else:
+                written.update(streamed)
+            self._delete_chunks(cut_short)
+        finally:
+            for _, _, downloaded in pending.values():
+                if downloaded is not None:
+                    downloaded.close()
+
+        if written:
+            outcomes[written_status(self.refresh_mode)].extend(
+                doc_id for doc_id in doc_ids if doc_id in written
             )
-            nodes = sentence_splitter.get_nodes_from_documents(document)
-        except Exception as e:
-            with self.write_session_manager as write_session:
-                self.repo.update_status(
-                    write_session, [doc_id], DocStatus.SPLITTING_FAILED
-                )
 
-            raise e
+        # One UPDATE per outcome
+        self._write_outcomes(outcomes, written)
 
-        # Generate chunk
-        splitted_nodes = [
-            DocSchema(
-                doc_id=doc_id,
-                order=order,
-                content=node.get_content(),
-                metadata=DocMetadata(ext=ext),
+    def refresh_pending_docs(self, limit: int = 1000) -> None:
+        with self.write_session_manager as write_session:
+            doc_ids = self.repo.fetch_doc_ids_by_status(
+                statuses=[DocStatus.REFRESH_PENDING],
+                session=write_session,
+                limit=limit,
             )
-            for order, node in enumerate(nodes, start=1)
-        ]
 
-        # Write to Elasticsearch
-        try:
-            self.es_client.index_docs(splitted_nodes, self.doc_index_name)
-        except Exception as e:
-            with self.write_session_manager as write_session:
-                self.repo.update_status(
-                    write_session, [doc_id], DocStatus.INDEXING_FAILED
-                )
+        if not doc_ids:
+            return
 
-            raise e
+        # One refresh covers every doc written before it started
+        self.es_client.refresh(self.doc_index_name)
+        self._invalidate_search(doc_ids)
 
-        # Update document status
         with self.write_session_manager as write_session:
-            self.repo.update_status(write_session, [doc_id], DocStatus.INDEXED)
+            refreshed = self.repo.mark_refreshed(write_session, list(doc_ids))
+        self._publish({DocStatus.INDEXED: refreshed})
 
     def retry_unhandled_docs(self, index_handler: IndexDocTaskType) -> None:
         now = get_utc_now()
@@ -134,60 +319,350 @@ class DocWriter:
             DocStatus.UPLOAD_REQUESTED,
             DocStatus.UPLOADED,
             DocStatus.INDEXING,
+            # A retry that never reported back
+            DocStatus.RETRYING,
+            DocStatus.DOWNLOAD_FAILED,
+            # Resumes at the write stage from the chunk cache
+            DocStatus.INDEXING_FAILED,
         ]
 
-        docs: Sequence[Docs] = []
-        total_cnt = 0
-        size = 10
-        with self.write_session_manager as write_session:
-            total_cnt = self.repo.fetch_count_by_status(
-                statuses=target_statuses,
+        for status in target_statuses:
+            self._retry_docs_with_status(status, cutoff_time, now, index_handler)
+
+    def _retry_docs_with_status(
+        self,
+        status: DocStatus,
+        cutoff_time: datetime,
+        now: datetime,
+        index_handler: IndexDocTaskType,
+    ) -> None:
+        # Each page is claimed with FOR UPDATE SKIP LOCKED and rescheduled
+        # before its locks are released, so sweepers running on several nodes
+        # never hand out the same doc twice. A doc INDEXING or RETRYING is
+        # leased to the worker running it, and taken back only once the lease
+        # has expired, so it never runs twice at once.
+        lease_time: Optional[datetime] = None
+        if status in (DocStatus.INDEXING, DocStatus.RETRYING):
+            lease_time = now - timedelta(seconds=self.retry_lease_timeout)
+        after: Optional[Tuple[datetime, uuid.UUID]] = None
+        while True:
+            with self.write_session_manager as write_session:
+                docs = self.repo.claim_docs_by_status(
+                    session=write_session,
+                    status=status,
+                    cutoff_time=cutoff_time,
+                    due_time=now,
+                    lease_time=lease_time,
+                    after=after,
+                    limit=self.retry_batch_size,
+                )
+                if not docs:
+                    return
+
+                # Docs out of attempts are parked, the rest back off
+                # exponentially, one UPDATE per attempt number
+                dead_doc_ids: List[uuid.UUID] = []
+                by_attempt: Dict[int, List[uuid.UUID]] = defaultdict(list)
+                for doc in docs:
+                    attempt = doc.attempt_count + 1
+                    if attempt > self.retry_max_attempts:
+                        dead_doc_ids.append(doc.id)
+                    else:
+                        by_attempt[attempt].append(doc.id)
+
+                if dead_doc_ids:
+                    self.repo.update_status(
+                        write_session, dead_doc_ids, DocStatus.DEAD_LETTER
+                    )
+                    logger.warning("Dead-lettered %d docs", len(dead_doc_ids))
+                for attempt, doc_ids in by_attempt.items():
+                    self.repo.schedule_retry(
+                        session=write_session,
+                        doc_ids=doc_ids,
+                        attempt_count=attempt,
+                        next_attempt_at=now + self._retry_delay(attempt),
+                    )
+
+                # The size and extension pick the queue, as the Lambda does
+                payloads: Dict[Optional[str], List[Dict[str, str]]] = defaultdict(list)
+                for doc in docs:
+                    if doc.id in dead_doc_ids:
+                        continue
+                    payloads[self._route(doc.size, doc.extension)].append(
+                        {"bucket": doc.bucket, "key": doc.key}
+                    )
+                after = (docs[-1].created_at, docs[-1].id)
+
+                write_session.commit()
+
+            self._publish(
+                {
+                    DocStatus.DEAD_LETTER: dead_doc_ids,
+                    DocStatus.RETRYING: [
+                        doc_id for doc_ids in by_attempt.values() for doc_id in doc_ids
+                    ],
+                }
+            )
+
+            for queue, payload in payloads.items():
+                index_handler(payload, queue)
+
+            if len(docs) < self.retry_batch_size:
+                return
+
+    def _route(self, size: int, extension: str) -> Optional[str]:
+        # None leaves the task on the default queue
+        if self.queue_router is None:
+            return None
+        return self.queue_router.route(size, extension)
+
+    def _retry_delay(self, attempt: int) -> timedelta:
+        # How long the sweeper waits before handing the doc out again
+        delay = self.retry_base_delay * 2 ** (attempt - 1)
+        return timedelta(seconds=min(delay, self.retry_max_delay))
+
+    def _download(self, key: str, ext: str) -> DownloadedFile:
+        return self.s3_client.download_fileobj(
+            bucket_name=self.bucket_name,
+            key=key,
+            max_memory_size=self.in_memory_limit,
+            suffix=f".{ext}",
+        )
+
+    def _prepare_contents(
+        self, params: IndexDocsParams, checkpoint: Optional[Row]
+    ) -> Tuple[str, Optional[Iterator[str]], Optional[DownloadedFile]]:
+        # Returns the content hash, the lazy contents or None for chunks already
+        # written or copied from an indexed doc with the same content, and the
+        # download the contents are read from, which the caller closes.
+        doc_id, ext = parse_key(params.key)
+        if is_written(checkpoint, params.chunk_version):
+            return checkpoint.content_hash, None, None
+
+        try:
+            reader = self._get_reader(ext)
+        except NotAllowedExtensionError as e:
+            raise StageError(DocStatus.READ_FAILED, e)
+
+        content_hash, contents = self._resume_contents(checkpoint, params)
+
+        downloaded: Optional[DownloadedFile] = None
+        if contents is None:
+            try:
+                downloaded = self._download(params.key, ext)
+            except FailToDownloadError as e:
+                raise StageError(DocStatus.DOWNLOAD_FAILED, e)
+            content_hash = downloaded.content_hash
+
+        try:
+            reused = self._reuse_chunks(doc_id, content_hash, params)
+        except Exception as e:
+            if downloaded is not None:
+                downloaded.close()
+            raise StageError(DocStatus.INDEXING_FAILED, e)
+        if reused:
+            if downloaded is not None:
+                downloaded.close()
+            return content_hash, None, None
+
+        if contents is None:
+            contents = self._cached_contents(content_hash, params)
+        if contents is None:
+            contents = self._split_contents(
+                content_hash,
+                params,
+                self._iter_contents(reader, downloaded, params, ext),
+            )
+        return content_hash, contents, downloaded
+
+    def _reuse_chunks(
+        self, doc_id: uuid.UUID, content_hash: str, params: IndexDocsParams
+    ) -> bool:
+        # Users re-upload the same files, so chunks of an indexed doc with the
+        # same content and chunking params are copied instead of re-parsed.
+        with self._session_lock, self.write_session_manager as write_session:
+            source_doc_id = self.repo.fetch_indexed_doc_id_by_hash(
                 session=write_session,
-                cutoff_time=cutoff_time,
+                content_hash=content_hash,
+                chunk_version=params.chunk_version,
+                exclude_doc_id=doc_id,
             )
 
-        if total_cnt == 0:
+        if source_doc_id is None:
+            return False
+
+        copied = self.es_client.copy_chunks(
+            self.doc_index_name,
+            source_doc_id,
+            doc_id,
+            params.chunk_version,
+            refresh=self.refresh_mode == "wait_for",
+        )
+        self.es_client.delete_stale_chunks(
+            self.doc_index_name, params.chunk_version, {doc_id: copied}
+        )
+        logger.info("Reused %d chunks of %s for %s", copied, source_doc_id, doc_id)
+        return True
+
+    def _start_indexing(self, doc_ids: List[uuid.UUID]) -> Dict[uuid.UUID, Row]:
+        # INDEXING is committed before any work starts, so a worker dying
+        # mid-doc leaves a trace the sweeper picks up
+        if self.status_buffer is not None:
+            self.status_buffer.discard(doc_ids)
+        with self.write_session_manager as write_session:
+            rows = self.repo.start_indexing(write_session, doc_ids)
+        self._publish({DocStatus.INDEXING: doc_ids})
+        return {row.id: row for row in rows}
+
+    def _resume_contents(
+        self, checkpoint: Optional[Row], params: IndexDocsParams
+    ) -> Tuple[Optional[str], Optional[Iterator[str]]]:
+        # Chunks a previous attempt split with the same chunking params
+        artifact_key = resume_key(self.chunk_cache, checkpoint, params.chunk_version)
+        if artifact_key is None:
+            return None, None
+
+        # None once the entry was evicted, the doc then starts over
+        contents = self.chunk_cache.open(artifact_key)
+        if contents is None:
+            return None, None
+        return checkpoint.content_hash, contents
+
+    def _cached_contents(
+        self, content_hash: str, params: IndexDocsParams
+    ) -> Optional[Iterator[str]]:
+        key = cached_key(self.chunk_cache, content_hash, params.chunk_version)
+        if key is None:
+            return None
+        return self.chunk_cache.open(key)
+
+    def _split_contents(
+        self, content_hash: str, params: IndexDocsParams, contents: Iterable[str]
+    ) -> Iterable[str]:
+        # Chunks are written to the cache as they stream to Elasticsearch, so
+        # neither waits on the other
+        if self.chunk_cache is None:
+            return contents
+        return self.chunk_cache.tee(content_hash, params.chunk_version, contents)
+
+    def _finish_split(
+        self,
+        doc_id: uuid.UUID,
+        content_hash: str,
+        params: IndexDocsParams,
+        split: Iterator[str],
+    ) -> None:
+        # The write failed midway: the rest of the doc is split into the cache
+        # entry, and the SPLIT checkpoint points the retry at it
+        if self.chunk_cache is None:
             return
+        key = self.chunk_cache.key(content_hash, params.chunk_version)
+        if not self.chunk_cache.contains(key):
+            try:
+                for _ in split:
+                    pass
+            except Exception:
+                logger.exception("Failed to finish splitting %s", doc_id)
+                return
+        self._checkpoint_split(doc_id, content_hash, params)
 
-        for chunk in range(0, total_cnt, size):
-            with self.write_session_manager as write_session:
-                docs = self.repo.fetch_docs_by_status(
-                    statuses=target_statuses,
-                    session=write_session,
-                    cutoff_time=now,
-                    offset=chunk,
-                    limit=size,
+    def _delete_chunks(self, doc_ids: List[uuid.UUID]) -> None:
+        # Chunks stream to Elasticsearch as the doc is read, so one that fails
+        # to read or split on a later page has its first pages indexed. Those
+        # failures are final, so none of its chunks are left searchable.
+        if not doc_ids:
+            return
+        try:
+            self.es_client.delete_chunks(self.doc_index_name, doc_ids)
+        except Exception:
+            logger.exception("Failed to delete chunks of %d failed docs", len(doc_ids))
+
+    def _checkpoint_split(
+        self, doc_id: uuid.UUID, content_hash: str, params: IndexDocsParams
+    ) -> None:
+        if self.chunk_cache is None:
+            return
+        key = self.chunk_cache.key(content_hash, params.chunk_version)
+        if not self.chunk_cache.contains(key):
+            return
+
+        with self._session_lock, self.write_session_manager as write_session:
+            self.repo.save_checkpoint(
+                session=write_session,
+                doc_id=doc_id,
+                stage=IndexStage.SPLIT,
+                content_hash=content_hash,
+                artifact_key=key,
+            )
+
+    def _iter_contents(
+        self,
+        reader: BaseReader,
+        downloaded: DownloadedFile,
+        params: IndexDocsParams,
+        ext: str,
+    ) -> Iterator[str]:
+        if self.parser_pool is None:
+            source = downloaded.path or downloaded.fileobj
+            with open_source(reader, source) as opened:
+                nodes = iter_nodes(
+                    reader, opened, params.chunk_size, params.chunk_overlap
                 )
+                yield from (node.get_content() for node in nodes)
+            return
 
-                # Update status to RETRYING
-                self.repo.update_status(
-                    session=write_session,
-                    doc_ids=[doc.id for doc in docs],
-                    status=DocStatus.RETRYING,
+        # Parsing holds the GIL, so it runs in a parser process while this
+        # worker keeps downloading and writing other docs.
+        yield from self.parser_pool.submit(
+            parse_chunks,
+            parse_source(downloaded),
+            ext,
+            params.chunk_size,
+            params.chunk_overlap,
+        ).result()
+
+    def _update_status(self, doc_id: uuid.UUID, status: DocStatus) -> None:
+        self._write_outcomes({status: [doc_id]}, {})
+
+    def _write_outcomes(
+        self,
+        outcomes: Dict[DocStatus, List[uuid.UUID]],
+        written: Dict[uuid.UUID, Tuple[str, str]],
+    ) -> None:
+        # With wait_for the new chunks are searchable by now
+        self._invalidate_search(outcomes.get(DocStatus.INDEXED, []))
+
+        # Outcomes coalesce in the status buffer when there is one, otherwise
+        # they are committed right away
+        if self.status_buffer is not None:
+            for status, doc_ids in outcomes.items():
+                self.status_buffer.add(
+                    doc_ids,
+                    status,
+                    {
+                        doc_id: written[doc_id]
+                        for doc_id in doc_ids
+                        if doc_id in written
+                    },
                 )
+            return
 
-                write_session.commit()
+        with self.write_session_manager as write_session:
+            landed = self.repo.finish_indexing(write_session, outcomes, written)
+        self._publish(landed)
+
+    def _invalidate_search(self, doc_ids: Iterable[uuid.UUID]) -> None:
+        # Cached results of the previous chunks are dropped once the new ones
+        # are searchable
+        if self.search_cache_invalidator is not None:
+            self.search_cache_invalidator.invalidate(doc_ids)
 
-                index_handler([{"bucket": doc.bucket, "key": doc.key} for doc in docs])
+    def _publish(self, outcomes: Dict[DocStatus, Iterable[uuid.UUID]]) -> None:
+        # Only after the commit, so a client never sees a status the DB lacks
+        if self.status_publisher is not None:
+            self.status_publisher.publish(outcomes)
 
     def _get_reader(self, ext: str) -> BaseReader:
-        self._validate_extension(ext)
-
-        READER_MAP = {
-            "pptx": PptReader,
-            "docx": DocxReader,
-            "pdf": PDFReader,
-            "txt": FlatReader,
-            "ppt": PptReader,
-            "doc": DocxReader,
-            "hwp": HWPReader,
-            "hwpx": HWPReader,
-            "json": JSONReader,
-            "py": FlatReader,
-        }
-
-        return READER_MAP.get(f"{ext.lower()}", FlatReader)()
-
-    def _validate_extension(self, ext: str):
-        if ext not in self.allowed_extensions:
-            raise NotAllowedExtensionError()
+        validate_extension(ext, self.allowed_extensions)
+
+        return get_reader(ext)
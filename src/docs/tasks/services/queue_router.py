@@ -0,0 +1,29 @@
+from typing import List
+
+__all__ = ["DocQueueRouter"]
+
+
+class DocQueueRouter:
+    """Picks the Celery queue of an index task from the doc's size and extension.
+
+    Small plain-text docs go to a low-latency queue, everything else to a bulk
+    queue served by its own workers, so a burst of large PDFs never holds up
+    the tiny files queued behind it. The Lambda mirrors this rule.
+    """
+
+    def __init__(
+        self,
+        small_queue: str,
+        bulk_queue: str,
+        small_size_limit: int,
+        small_extensions: List[str],
+    ):
+        self.small_queue = small_queue
+        self.bulk_queue = bulk_queue
+        self.small_size_limit = small_size_limit
+        self.small_extensions = small_extensions
+
+    def route(self, size: int, extension: str) -> str:
+        if size <= self.small_size_limit and extension in self.small_extensions:
+            return self.small_queue
+        return self.bulk_queue
@@ -0,0 +1,157 @@
+import logging
+import threading
+import uuid
+from collections import defaultdict
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from db.db import WriteSessionSyncManager
+from docs.models.doc_model import DocStatus
+from docs.tasks.clients.status_publisher import StatusPublisher
+from docs.tasks.repositories.doc_task_repository import DocTaskRepository
+
+__all__ = ["StatusBuffer", "init_status_buffer"]
+
+logger = logging.getLogger(__name__)
+
+
+class StatusBuffer:
+    """Write-behind buffer for doc outcomes.
+
+    Docs finishing within `flush_interval` seconds share one transaction with
+    one `UPDATE ... WHERE id IN (...)` per status, instead of a commit each. A
+    doc keeps only its latest transition. Flushes happen on `max_size` pending
+    docs, on the interval, and on `close`.
+    """
+
+    def __init__(
+        self,
+        write_session_manager: Callable[[], WriteSessionSyncManager],
+        repo: DocTaskRepository,
+        max_size: int,
+        flush_interval: float,
+        status_publisher: Optional[StatusPublisher] = None,
+    ):
+        self.write_session_manager = write_session_manager
+        self.repo = repo
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self.status_publisher = status_publisher
+        self._statuses: Dict[uuid.UUID, DocStatus] = {}
+        # doc_id -> (content_hash, chunk_version) of docs whose chunks are written
+        self._written: Dict[uuid.UUID, Tuple[str, str]] = {}
+        self._lock = threading.Lock()
+        # Flushes are serialized, so an older batch never lands after a newer one
+        self._flush_lock = threading.Lock()
+        self._closed = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._flusher = threading.Thread(
+            target=self._flush_periodically, name="status-buffer", daemon=True
+        )
+        self._flusher.start()
+
+    def add(
+        self,
+        doc_ids: List[uuid.UUID],
+        status: DocStatus,
+        written: Optional[Dict[uuid.UUID, Tuple[str, str]]] = None,
+    ) -> None:
+        with self._lock:
+            for doc_id in doc_ids:
+                self._statuses[doc_id] = status
+                self._written.pop(doc_id, None)
+            self._written.update(written or {})
+            full = len(self._statuses) >= self.max_size
+
+        if full:
+            self.flush()
+
+    def discard(self, doc_ids: List[uuid.UUID]) -> None:
+        # Pending outcomes of docs a new attempt is starting on are stale
+        with self._lock:
+            for doc_id in doc_ids:
+                self._statuses.pop(doc_id, None)
+                self._written.pop(doc_id, None)
+
+    def flush(self) -> None:
+        with self._flush_lock:
+            with self._lock:
+                statuses, self._statuses = self._statuses, {}
+                written, self._written = self._written, {}
+
+            if not statuses:
+                return
+
+            by_status: Dict[DocStatus, List[uuid.UUID]] = defaultdict(list)
+            for doc_id, status in statuses.items():
+                by_status[status].append(doc_id)
+
+            # The buffer is per process, so a doc may have moved on since its
+            # outcome was buffered. Such stale outcomes are dropped.
+            try:
+                with self.write_session_manager() as write_session:
+                    landed = self.repo.finish_indexing(
+                        write_session, by_status, written
+                    )
+            except Exception:
+                logger.exception("Failed to flush %d doc statuses", len(statuses))
+                self._restore(statuses, written)
+                return
+
+            if self.status_publisher is not None:
+                self.status_publisher.publish(landed)
+
+            logger.info(
+                "Flushed %d doc statuses in %d updates, dropped %d stale",
+                len(statuses),
+                len(landed),
+                len(statuses) - sum(len(doc_ids) for doc_ids in landed.values()),
+            )
+
+    def close(self) -> None:
+        self._closed.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        self.flush()
+
+    def _flush_periodically(self) -> None:
+        while not self._closed.wait(self.flush_interval):
+            self.flush()
+
+    def _restore(
+        self,
+        statuses: Dict[uuid.UUID, DocStatus],
+        written: Dict[uuid.UUID, Tuple[str, str]],
+    ) -> None:
+        # Back into the buffer for the next flush, behind anything newer
+        with self._lock:
+            for doc_id, status in statuses.items():
+                if doc_id in self._statuses:
+                    continue
+                self._statuses[doc_id] = status
+                if doc_id in written:
+                    self._written[doc_id] = written[doc_id]
+
+
+def init_status_buffer(
+    write_session_manager: Callable[[], WriteSessionSyncManager],
+    repo: DocTaskRepository,
+    max_size: int,
+    flush_interval: float,
+    status_publisher: Optional[StatusPublisher] = None,
+) -> Iterator[Optional[StatusBuffer]]:
+    if max_size <= 0:
+        yield None
+        return
+
+    buffer = StatusBuffer(
+        write_session_manager, repo, max_size, flush_interval, status_publisher
+    )
+    buffer.start()
+
+    try:
+        yield buffer
+    finally:
+        # Runs on worker (process) shutdown, nothing buffered is lost
+        buffer.close()
@@ -1,4 +1,4 @@
-from typing import Any, Dict, List, Protocol
+from typing import Any, Dict, List, Optional, Protocol
 
 from celery.result import AsyncResult
 
@@ -6,4 +6,4 @@ __all__ = ["IndexDocTaskType"]
 
 
 class IndexDocTaskType(Protocol):
-    def __call__(self, req: List[Dict[str, str]]) -> Any: ...
+    def __call__(self, req: List[Dict[str, str]], queue: Optional[str]) -> Any: ...
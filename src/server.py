@@ -51,6 +51,8 @@ def create_app() -> FastAPI:
         print("FastAPI app Initialized")
         yield
 
+        await container.search_cache().close()
+        await container.doc_status_hub().close()
         await write_engine.dispose()
         await read_engine.dispose()
         await es.close()
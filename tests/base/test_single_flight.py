@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+from base.single_flight import SingleFlight
+
+
+class TestSingleFlight:
+
+    def test_concurrent_calls_share_one_flight(self):
+        # Arrange
+        flight = SingleFlight()
+        calls = []
+
+        async def search():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return ["result"]
+
+        async def run():
+            return await asyncio.gather(
+                *(flight.do("key", search) for _ in range(10)),
+                flight.do("other", search),
+            )
+
+        # Act
+        results = asyncio.run(run())
+
+        # Assert
+        assert len(calls) == 2
+        assert results == [["result"]] * 11
+        assert (flight.total.calls, flight.total.flights) == (11, 2)
+        assert flight.top_keys(1)[0][0] == "key"
+        assert flight.top_keys(1)[0][1].fan_in == 10
+
+    def test_failure_reaches_every_caller_and_next_call_flies_again(self):
+        # Arrange
+        flight = SingleFlight()
+        attempts = []
+
+        async def search():
+            attempts.append(1)
+            await asyncio.sleep(0.01)
+            if len(attempts) == 1:
+                raise RuntimeError("es down")
+            return ["result"]
+
+        async def run():
+            failed = await asyncio.gather(
+                *(flight.do("key", search) for _ in range(3)),
+                return_exceptions=True,
+            )
+            return failed, await flight.do("key", search)
+
+        # Act
+        failed, result = asyncio.run(run())
+
+        # Assert
+        assert all(isinstance(error, RuntimeError) for error in failed)
+        assert result == ["result"]
+        assert len(attempts) == 2
+
+    def test_cancelled_caller_does_not_cancel_the_flight(self):
+        # Arrange
+        flight = SingleFlight()
+
+        async def search():
+            await asyncio.sleep(0.01)
+            return ["result"]
+
+        async def run():
+            first = asyncio.create_task(flight.do("key", search))
+            second = asyncio.create_task(flight.do("key", search))
+            await asyncio.sleep(0)
+            first.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await first
+            return await second
+
+        # Act
+        result = asyncio.run(run())
+
+        # Assert
+        assert result == ["result"]
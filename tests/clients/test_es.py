@@ -0,0 +1,135 @@
+import asyncio
+import uuid
+
+from clients.elasticsearch.dto import SearchQuery
+from clients.elasticsearch.es import EsClient
+from clients.elasticsearch.exceptions import FailToSearchError
+from clients.elasticsearch.schema import DocMetadata, DocSchema
+from tests.fakes import FakeAsyncElasticsearch
+
+
+def _chunks(doc_id: str, count: int) -> list[DocSchema]:
+    return [
+        DocSchema(
+            doc_id=doc_id,
+            order=order,
+            content=f"chunk {order}",
+            metadata=DocMetadata(ext="txt"),
+        )
+        for order in range(1, count + 1)
+    ]
+
+
+class TestEsClientMsearchDocs:
+
+    def test_queries_share_one_round_trip_in_order(self):
+        # Arrange
+        doc_ids = [str(uuid.uuid4()) for _ in range(3)]
+        es = FakeAsyncElasticsearch({doc_id: _chunks(doc_id, 5) for doc_id in doc_ids})
+        queries = [
+            SearchQuery(doc_id=doc_id, query="question", size=size)
+            for doc_id, size in zip(doc_ids, [1, 2, 3])
+        ]
+
+        # Act
+        results = asyncio.run(EsClient(es).msearch_docs("test-index", queries))
+
+        # Assert
+        assert len(es.msearch_calls) == 1
+        assert es.msearch_calls[0][::2] == [{"routing": doc_id} for doc_id in doc_ids]
+        assert [{str(doc.doc_id) for doc in result} for result in results] == [
+            {doc_id} for doc_id in doc_ids
+        ]
+        assert [len(result) for result in results] == [1, 2, 3]
+
+    def test_failed_query_does_not_fail_the_others(self):
+        # Arrange
+        doc_ids = [str(uuid.uuid4()) for _ in range(2)]
+        es = FakeAsyncElasticsearch({doc_id: _chunks(doc_id, 1) for doc_id in doc_ids})
+        es.fail_doc_ids = {doc_ids[0]}
+        queries = [SearchQuery(doc_id=doc_id, query="question") for doc_id in doc_ids]
+
+        # Act
+        results = asyncio.run(EsClient(es).msearch_docs("test-index", queries))
+
+        # Assert
+        assert isinstance(results[0], FailToSearchError)
+        assert results[0].detail == "shard failure"
+        assert [doc.content for doc in results[1]] == ["chunk 1"]
+
+    def test_index_created_before_routing_is_searched_unrouted(self):
+        # Arrange
+        doc_id = str(uuid.uuid4())
+        es = FakeAsyncElasticsearch({doc_id: _chunks(doc_id, 2)}, routed=False)
+        queries = [SearchQuery(doc_id=doc_id, query="question")]
+
+        # Act
+        results = asyncio.run(EsClient(es).msearch_docs("legacy-index", queries))
+
+        # Assert
+        assert es.msearch_calls[0][::2] == [{}]
+        assert len(results[0]) == 2
+
+
+class TestEsClientSearchDocsIn:
+
+    def test_docs_share_one_query_and_one_top_k(self):
+        # Arrange
+        doc_ids = [str(uuid.uuid4()) for _ in range(3)]
+        es = FakeAsyncElasticsearch({doc_id: _chunks(doc_id, 2) for doc_id in doc_ids})
+
+        # Act
+        docs = asyncio.run(
+            EsClient(es).search_docs_in("test-index", doc_ids, "question", size=4)
+        )
+
+        # Assert
+        assert len(es.search_calls) == 1
+        assert es.search_calls[0]["query"]["bool"]["filter"] == [
+            {"terms": {"doc_id": doc_ids}}
+        ]
+        assert es.search_routings == [",".join(doc_ids)]
+        assert len(docs) == 4
+        assert [doc.order for doc in docs] == [1, 1, 1, 2]
+
+    def test_many_docs_search_every_shard(self):
+        # Arrange: 1000 ids would overflow the 4 KB request line as routing
+        doc_ids = [str(uuid.uuid4()) for _ in range(1000)]
+        es = FakeAsyncElasticsearch({doc_ids[0]: _chunks(doc_ids[0], 2)})
+
+        # Act
+        docs = asyncio.run(
+            EsClient(es).search_docs_in("test-index", doc_ids, "question", size=4)
+        )
+
+        # Assert
+        assert es.search_routings == [None]
+        assert len(docs) == 2
+
+
+class TestEsClientSearchDocs:
+
+    def test_searches_only_the_docs_shard(self):
+        # Arrange
+        doc_id = str(uuid.uuid4())
+        es = FakeAsyncElasticsearch({doc_id: _chunks(doc_id, 3)})
+
+        # Act
+        docs = asyncio.run(
+            EsClient(es).search_docs("test-index", doc_id, "question", size=2)
+        )
+
+        # Assert
+        assert es.search_routings == [doc_id]
+        assert [doc.order for doc in docs] == [1, 2]
+
+    def test_index_created_before_routing_searches_every_shard(self):
+        # Arrange
+        doc_id = str(uuid.uuid4())
+        es = FakeAsyncElasticsearch({doc_id: _chunks(doc_id, 3)}, routed=False)
+
+        # Act
+        asyncio.run(EsClient(es).search_docs("legacy-index", doc_id, "question"))
+
+        # Assert
+        assert es.search_routings == [None]
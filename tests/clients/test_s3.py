@@ -0,0 +1,95 @@
+import asyncio
+import hashlib
+
+import pytest
+
+from base.event_loop import init_event_loop
+from clients.s3.exceptions import FailToDownloadError
+from clients.s3.s3 import S3Client, init_async_s3_client
+from tests.fakes import FakeBotoS3Client
+
+DATA = bytes(range(256)) * 100
+
+
+class TestS3ClientDownloadFileobj:
+
+    def test_small_object_takes_one_request(self):
+        # Arrange: sized from the ranged GET's Content-Range, with no HEAD
+        boto_client = FakeBotoS3Client({"docs/a.pdf": DATA})
+        s3_client = S3Client(boto_client, part_size=1024 * 1024)
+
+        # Act
+        downloaded = s3_client.download_fileobj("bucket", "docs/a.pdf", len(DATA))
+
+        # Assert
+        assert downloaded.in_memory
+        assert downloaded.fileobj.read() == DATA
+        assert boto_client.ranges == [f"bytes=0-{1024 * 1024 - 1}"]
+        assert downloaded.size == len(DATA)
+        assert downloaded.content_hash == hashlib.sha256(DATA).hexdigest()
+        assert downloaded.throughput > 0
+
+    def test_large_object_is_fetched_as_parallel_ranges(self):
+        # Arrange
+        boto_client = FakeBotoS3Client({"docs/a.pdf": DATA})
+        s3_client = S3Client(boto_client, part_size=1000, max_concurrency=4)
+
+        # Act
+        downloaded = s3_client.download_fileobj("bucket", "docs/a.pdf", 0, ".pdf")
+
+        # Assert
+        try:
+            assert not downloaded.in_memory
+            assert downloaded.path.read_bytes() == DATA
+            assert downloaded.content_hash == hashlib.sha256(DATA).hexdigest()
+            assert len(boto_client.ranges) == 26
+            assert boto_client.ranges[0] == "bytes=0-999"
+        finally:
+            downloaded.close()
+        assert not downloaded.path.exists()
+
+    def test_empty_object_has_no_range_to_fetch(self):
+        # Arrange
+        s3_client = S3Client(FakeBotoS3Client({"docs/a.txt": b""}))
+
+        # Act
+        downloaded = s3_client.download_fileobj("bucket", "docs/a.txt", 1024)
+
+        # Assert
+        assert downloaded.size == 0
+        assert downloaded.fileobj.read() == b""
+        assert downloaded.content_hash == hashlib.sha256(b"").hexdigest()
+
+    def test_missing_object_raises(self):
+        # Arrange
+        s3_client = S3Client(FakeBotoS3Client({}))
+
+        # Act & Assert
+        with pytest.raises(FailToDownloadError):
+            s3_client.download_fileobj("bucket", "docs/missing.pdf", 1024)
+
+
+class TestInitAsyncS3Client:
+
+    def test_shutdown_closes_the_session(self):
+        # Arrange
+        loop_resource = init_event_loop()
+        loop = next(loop_resource)
+        resource = init_async_s3_client(
+            loop, FakeBotoS3Client({}), part_size=1000, max_concurrency=4
+        )
+        client = next(resource)
+
+        async def open_session():
+            return client._get_session()
+
+        session = asyncio.run_coroutine_threadsafe(open_session(), loop).result()
+
+        # Act
+        try:
+            resource.close()
+        finally:
+            loop_resource.close()
+
+        # Assert
+        assert session.closed
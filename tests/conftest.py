@@ -2,9 +2,15 @@ import pytest
 import uuid
 from typing import Dict, Any
 
+from clients.elasticsearch import es
+from docs.tasks.clients import es_task
+from docs.tasks.services.async_doc_writer import AsyncDocWriter
 from docs.tasks.services.doc_writer import DocWriter
 
 from .fakes import (
+    FakeAsyncEsTaskClient,
+    FakeAsyncS3Client,
+    FakeAsyncSession,
     FakeS3Client,
     FakeEsTaskClient,
     FakeDocTaskRepository,
@@ -16,6 +22,14 @@ from .fakes import (
 from docs.dtos.docs_dto import IndexDocsParams
 
 
+@pytest.fixture(autouse=True)
+def routed_indices():
+    # Each test decides through its fake mapping whether an index is routed
+    yield
+    es._routed_indices.clear()
+    es_task._routed_indices.clear()
+
+
 @pytest.fixture
 def fake_s3_client() -> FakeS3Client:
     return FakeS3Client()
@@ -73,6 +87,28 @@ def doc_writer(
         ],
         doc_size_limit=1000000,
         doc_index_name="test-index",
+        refresh_mode="coordinated",
+        batch_concurrency=2,
+        in_memory_limit=1024,
+        retry_batch_size=10,
+    )
+
+
+@pytest.fixture
+def async_doc_writer(
+    fake_session: FakeSession, fake_repo: FakeDocTaskRepository
+) -> AsyncDocWriter:
+    return AsyncDocWriter(
+        s3_client=FakeAsyncS3Client(),
+        es_client=FakeAsyncEsTaskClient(),
+        session_maker=lambda: FakeAsyncSession(fake_session),
+        repo=fake_repo,
+        bucket_name="test-bucket",
+        allowed_extensions=["txt", "pdf"],
+        doc_index_name="test-index",
+        refresh_mode="coordinated",
+        in_memory_limit=1024,
+        concurrency=4,
     )
 
 
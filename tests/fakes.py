@@ -1,16 +1,38 @@
+import asyncio
+import hashlib
+import io
 import uuid
-from typing import List, Dict, Any, Sequence
+from contextlib import asynccontextmanager
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
 from pathlib import Path
 from datetime import datetime
+from types import SimpleNamespace
 
+from botocore.exceptions import ClientError
+from botocore.response import StreamingBody
 from llama_index.core.readers.base import BaseReader
 from llama_index.core.schema import Document as LlamaDocument
 
 from clients.s3.exceptions import FailToDownloadError
-from clients.s3.s3 import S3Client
+from clients.s3.s3 import AsyncS3Client, DownloadedFile, S3Client
 from db.db import WriteSessionSyncManager
-from docs.models.doc_model import DocStatus, Docs
-from docs.tasks.clients.es_task import EsTaskClient
+from docs.models.doc_model import FAILED_STATUSES, DocStatus, Docs, IndexStage
+from docs.repositories.collection_repository import CollectionRepository
+from docs.services.doc_status_hub import DocStatusHub
+from docs.tasks.clients.es_task import AsyncEsTaskClient, BulkStats, EsTaskClient
+from docs.tasks.clients.search_cache_invalidator import SearchCacheInvalidator
+from docs.tasks.clients.status_publisher import StatusPublisher
 from docs.tasks.repositories.doc_task_repository import DocTaskRepository
 from clients.elasticsearch.schema import DocSchema
 
@@ -18,15 +40,30 @@ from clients.elasticsearch.schema import DocSchema
 class FakeS3Client(S3Client):
     def __init__(self):
         self.should_fail = False
+        self.fail_keys: Set[str] = set()
         self.downloaded_files = {}
 
     def download_file(self, bucket_name: str, key: str, output_path: Path):
-        if self.should_fail:
+        if self.should_fail or key in self.fail_keys:
             raise FailToDownloadError("Fake S3 download failed")
         with open(output_path, "w") as f:
             f.write("fake file content")
         self.downloaded_files[key] = output_path
 
+    def download_fileobj(
+        self, bucket_name: str, key: str, max_memory_size: int, suffix: str = ""
+    ) -> DownloadedFile:
+        if self.should_fail or key in self.fail_keys:
+            raise FailToDownloadError("Fake S3 download failed")
+        content = b"fake file content"
+        downloaded = DownloadedFile(
+            fileobj=io.BytesIO(content),
+            size=len(content),
+            content_hash=hashlib.sha256(content).hexdigest(),
+        )
+        self.downloaded_files[key] = downloaded
+        return downloaded
+
     def upload_file(self, *args, **kwargs):
         pass
 
@@ -41,14 +78,120 @@ class FakeEsTaskClient(EsTaskClient):
 
     def __init__(self):
         self.should_fail = False
+        self.keep_docs = True
         self.indexed_docs: List[DocSchema] = []
+        self.indexed_count = 0
         self.call_count = 0
-
-    def index_docs(self, docs: List[DocSchema], index_name: str):
+        self.stale_deletes: List[Dict[str, Any]] = []
+        self.chunk_deletes: List[List[uuid.UUID]] = []
+        self.refresh_args: List[Any] = []
+        self.refreshed_indexes: List[str] = []
+        self.copies: List[Dict[str, Any]] = []
+
+    def index_docs(
+        self, docs: Iterable[DocSchema], index_name: str, refresh: Any = False
+    ) -> BulkStats:
         self.call_count += 1
+        self.refresh_args.append(refresh)
         if self.should_fail:
             raise Exception("Fake Elasticsearch indexing failed")
+        count = 0
+        for doc in docs:
+            count += 1
+            if self.keep_docs:
+                self.indexed_docs.append(doc)
+        self.indexed_count += count
+        return BulkStats(indexed=count, batch_latencies=[0.0])
+
+    def delete_stale_chunks(
+        self, index_name: str, chunk_version: str, chunk_counts: Dict[uuid.UUID, int]
+    ) -> None:
+        self.stale_deletes.append(
+            {"chunk_version": chunk_version, "chunk_counts": chunk_counts}
+        )
+
+    def delete_chunks(self, index_name: str, doc_ids: List[uuid.UUID]) -> None:
+        self.chunk_deletes.append(list(doc_ids))
+
+    def copy_chunks(
+        self,
+        index_name: str,
+        source_doc_id: uuid.UUID,
+        doc_id: uuid.UUID,
+        chunk_version: str,
+        refresh: bool = False,
+    ) -> int:
+        self.copies.append({"source_doc_id": source_doc_id, "doc_id": doc_id})
+        return 1
+
+    def refresh(self, index_name: str) -> None:
+        self.refreshed_indexes.append(index_name)
+
+
+class FakeAsyncS3Client(AsyncS3Client):
+    def __init__(self):
+        self.fail_keys: Set[str] = set()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def download_fileobj(
+        self, bucket_name: str, key: str, max_memory_size: int, suffix: str = ""
+    ) -> DownloadedFile:
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            # Yields to the loop like a network round trip
+            await asyncio.sleep(0.01)
+        finally:
+            self.in_flight -= 1
+
+        if key in self.fail_keys:
+            raise FailToDownloadError("Fake S3 download failed")
+        content = b"fake file content"
+        return DownloadedFile(
+            fileobj=io.BytesIO(content),
+            size=len(content),
+            content_hash=hashlib.sha256(content).hexdigest(),
+        )
+
+
+class FakeAsyncEsTaskClient(AsyncEsTaskClient):
+    def __init__(self):
+        self.indexed_docs: List[DocSchema] = []
+        self.stale_deletes: List[Dict[str, Any]] = []
+
+    async def index_docs(
+        self, docs: Iterable[DocSchema], index_name: str, refresh: Any = False
+    ) -> BulkStats:
+        docs = list(docs)
         self.indexed_docs.extend(docs)
+        return BulkStats(indexed=len(docs), batch_latencies=[0.0])
+
+    async def delete_stale_chunks(
+        self, index_name: str, chunk_version: str, chunk_counts: Dict[uuid.UUID, int]
+    ) -> None:
+        self.stale_deletes.append(
+            {"chunk_version": chunk_version, "chunk_counts": chunk_counts}
+        )
+
+
+class FakeAsyncSession:
+    # What `async_sessionmaker` hands out, running repository calls on the
+    # sync fake session like `AsyncSession.run_sync`
+    def __init__(self, session: "FakeSession"):
+        self._session = session
+
+    async def run_sync(self, fn, *args):
+        return fn(self._session, *args)
+
+    async def commit(self):
+        self._session.commit()
+
+    async def rollback(self):
+        pass
+
+    async def close(self):
+        pass
 
 
 class FakeSession:
@@ -79,35 +222,167 @@ class FakeDocTaskRepository(DocTaskRepository):
     def __init__(self):
         self.docs_db: Dict[uuid.UUID, Docs] = {}
         self.status_update_history = []
+        self.claim_calls: List[Tuple[DocStatus, Any]] = []
 
     def update_status(self, session: Any, doc_ids: List[uuid.UUID], status: DocStatus):
         self.status_update_history.append({"doc_ids": doc_ids, "status": status})
         for doc_id in doc_ids:
             if doc_id in self.docs_db:
                 self.docs_db[doc_id].status = status
-
-    def fetch_count_by_status(
-        self, statuses: List[DocStatus], session: Any, cutoff_time: datetime
-    ) -> int:
-        count = 0
+                if status in FAILED_STATUSES:
+                    self.docs_db[doc_id].last_error_stage = status.value
+
+    def start_indexing(self, session: Any, doc_ids: List[uuid.UUID]) -> Sequence[Any]:
+        self.update_status(session, doc_ids, DocStatus.INDEXING)
+        return [
+            SimpleNamespace(
+                id=doc.id,
+                completed_stage=doc.completed_stage,
+                artifact_key=doc.artifact_key,
+                content_hash=doc.content_hash,
+                chunk_version=doc.chunk_version,
+            )
+            for doc_id, doc in self.docs_db.items()
+            if doc_id in doc_ids
+        ]
+
+    def save_checkpoint(
+        self,
+        session: Any,
+        doc_id: uuid.UUID,
+        stage: IndexStage,
+        content_hash: str,
+        artifact_key: Optional[str],
+    ) -> None:
+        if doc_id in self.docs_db:
+            self.docs_db[doc_id].completed_stage = stage
+            self.docs_db[doc_id].content_hash = content_hash
+            self.docs_db[doc_id].artifact_key = artifact_key
+
+    def finish_indexing(
+        self,
+        session: Any,
+        outcomes: Dict[DocStatus, List[uuid.UUID]],
+        written: Dict[uuid.UUID, Tuple[str, str]],
+    ) -> Dict[DocStatus, List[uuid.UUID]]:
+        # Docs the test never stored count as still INDEXING
+        def indexing(doc_id: uuid.UUID) -> bool:
+            doc = self.docs_db.get(doc_id)
+            return doc is None or doc.status == DocStatus.INDEXING
+
+        self.mark_written(session, written)
+        landed = {}
+        for status, doc_ids in outcomes.items():
+            doc_ids = [doc_id for doc_id in doc_ids if indexing(doc_id)]
+            if doc_ids:
+                self.update_status(session, doc_ids, status)
+                landed[status] = doc_ids
+        return landed
+
+    def mark_written(
+        self, session: Any, contents: Dict[uuid.UUID, Tuple[str, str]]
+    ) -> None:
+        for doc_id, (content_hash, chunk_version) in contents.items():
+            doc = self.docs_db.get(doc_id)
+            if doc is not None and doc.status == DocStatus.INDEXING:
+                doc.content_hash = content_hash
+                doc.chunk_version = chunk_version
+                doc.completed_stage = IndexStage.WRITTEN
+                doc.artifact_key = None
+                doc.attempt_count = 0
+                doc.next_attempt_at = None
+                doc.last_error_stage = None
+
+    def fetch_indexed_doc_id_by_hash(
+        self,
+        session: Any,
+        content_hash: str,
+        chunk_version: str,
+        exclude_doc_id: uuid.UUID,
+    ) -> Optional[uuid.UUID]:
         for doc in self.docs_db.values():
-            if doc.status in statuses and doc.updated_at < cutoff_time:
-                count += 1
-        return count
-
-    def fetch_docs_by_status(
+            if (
+                doc.content_hash == content_hash
+                and doc.chunk_version == chunk_version
+                and doc.status == DocStatus.INDEXED
+                and doc.id != exclude_doc_id
+            ):
+                return doc.id
+        return None
+
+    def fetch_doc_ids_by_status(
+        self, statuses: List[DocStatus], session: Any, limit: int = 1000
+    ) -> Sequence[uuid.UUID]:
+        return [doc.id for doc in self.docs_db.values() if doc.status in statuses][
+            :limit
+        ]
+
+    def claim_docs_by_status(
         self,
-        statuses: List[DocStatus],
         session: Any,
+        status: DocStatus,
         cutoff_time: datetime,
-        offset: int,
-        limit: int,
-    ) -> Sequence[Docs]:
-        filtered_docs = []
-        for doc in self.docs_db.values():
-            if doc.status in statuses and doc.updated_at < cutoff_time:
-                filtered_docs.append(doc)
-        return filtered_docs[offset : offset + limit]
+        due_time: datetime,
+        lease_time: Optional[datetime] = None,
+        after: Optional[Tuple[datetime, uuid.UUID]] = None,
+        limit: int = 100,
+    ) -> Sequence[Any]:
+        self.claim_calls.append((status, after))
+        claimable = sorted(
+            (
+                doc
+                for doc in self.docs_db.values()
+                if doc.status == status
+                and doc.created_at <= cutoff_time
+                and (doc.next_attempt_at is None or doc.next_attempt_at <= due_time)
+                # Docs the test stored without updated_at were last touched
+                # when created
+                and (
+                    lease_time is None
+                    or (doc.updated_at or doc.created_at) <= lease_time
+                )
+                and (after is None or (doc.created_at, doc.id) > after)
+            ),
+            key=lambda doc: (doc.created_at, doc.id),
+        )
+        # Rows as selected by the real query, with the column defaults applied
+        return [
+            SimpleNamespace(
+                id=doc.id,
+                bucket=doc.bucket,
+                key=doc.key,
+                size=doc.size,
+                extension=doc.extension,
+                created_at=doc.created_at,
+                attempt_count=doc.attempt_count or 0,
+            )
+            for doc in claimable[:limit]
+        ]
+
+    def mark_refreshed(
+        self, session: Any, doc_ids: List[uuid.UUID]
+    ) -> Sequence[uuid.UUID]:
+        refreshed = [
+            doc_id
+            for doc_id in doc_ids
+            if doc_id in self.docs_db
+            and self.docs_db[doc_id].status == DocStatus.REFRESH_PENDING
+        ]
+        if refreshed:
+            self.update_status(session, refreshed, DocStatus.INDEXED)
+        return refreshed
+
+    def schedule_retry(
+        self,
+        session: Any,
+        doc_ids: List[uuid.UUID],
+        attempt_count: int,
+        next_attempt_at: datetime,
+    ) -> None:
+        self.update_status(session, doc_ids, DocStatus.RETRYING)
+        for doc_id in doc_ids:
+            self.docs_db[doc_id].attempt_count = attempt_count
+            self.docs_db[doc_id].next_attempt_at = next_attempt_at
 
 
 class FakeReader(BaseReader):
@@ -120,11 +395,240 @@ class FakeReader(BaseReader):
         return [LlamaDocument(text="This is a sentence from a fake document.")]
 
 
+class FakeLargeReader(BaseReader):
+    def __init__(self, pages: int, page_size: int, fail_at: Optional[int] = None):
+        self.pages = pages
+        self.page_size = page_size
+        # Page the reader fails on, after the pages before it were read
+        self.fail_at = fail_at
+
+    def lazy_load_data(self, file: Path, **kwargs) -> Iterator[LlamaDocument]:
+        # Short paragraphs keep the splitter off the nltk sentence tokenizer
+        paragraph = "This is a paragraph from a large fake document.\n\n\n"
+        for page in range(self.pages):
+            if page == self.fail_at:
+                raise Exception(f"Fake reader failed on page {page}")
+            text = f"Page {page}.\n\n\n" + paragraph * (
+                self.page_size // len(paragraph)
+            )
+            yield LlamaDocument(text=text)
+
+
 class FakeIndexHandler:
     def __init__(self):
         self.called = False
         self.payload = None
+        self.queues: Dict[Optional[str], List[Dict[str, str]]] = {}
 
-    def __call__(self, payload: List[Dict[str, str]]):
+    def __call__(self, payload: List[Dict[str, str]], queue: Optional[str]):
         self.called = True
-        self.payload = payload
+        # Accumulates every page handed out by one sweep
+        self.payload = (self.payload or []) + payload
+        self.queues[queue] = self.queues.get(queue, []) + payload
+
+
+class FakeStatusPublisher(StatusPublisher):
+    def __init__(self):
+        # (doc_id, status) in publish order
+        self.events: List[Tuple[uuid.UUID, DocStatus]] = []
+
+    def publish(self, outcomes: Dict[DocStatus, Iterable[uuid.UUID]]) -> None:
+        for status, doc_ids in outcomes.items():
+            self.events.extend((doc_id, status) for doc_id in doc_ids)
+
+
+class FakeDocStatusHub(DocStatusHub):
+    def __init__(self):
+        self.queues: Dict[uuid.UUID, asyncio.Queue[DocStatus]] = {}
+
+    @asynccontextmanager
+    async def watch(self, doc_id: uuid.UUID) -> AsyncIterator[asyncio.Queue[DocStatus]]:
+        self.queues[doc_id] = asyncio.Queue()
+        try:
+            yield self.queues[doc_id]
+        finally:
+            del self.queues[doc_id]
+
+
+class FakeSearchCacheInvalidator(SearchCacheInvalidator):
+    def __init__(self):
+        self.invalidated: List[uuid.UUID] = []
+
+    def invalidate(self, doc_ids: Iterable[uuid.UUID]) -> None:
+        self.invalidated.extend(doc_ids)
+
+
+class FakeAsyncRedis:
+    # Just the hash, pipeline and pub/sub calls SearchCache makes
+    def __init__(self):
+        self.hashes: Dict[str, Dict[str, str]] = {}
+
+    async def hget(self, name: str, key: str) -> Optional[str]:
+        return self.hashes.get(name, {}).get(key)
+
+    async def hdel(self, name: str, key: str) -> None:
+        self.hashes.get(name, {}).pop(key, None)
+
+    def pipeline(self, transaction: bool = True) -> "FakeAsyncPipeline":
+        return FakeAsyncPipeline(self)
+
+    def pubsub(self) -> "FakeAsyncPubSub":
+        return FakeAsyncPubSub()
+
+
+class FakeAsyncPipeline:
+    def __init__(self, redis: FakeAsyncRedis):
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self) -> "FakeAsyncPipeline":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        pass
+
+    def hset(self, name: str, key: str, value: str) -> None:
+        self.commands.append((name, key, value))
+
+    def expire(self, name: str, seconds: int) -> None:
+        pass
+
+    async def execute(self) -> None:
+        for name, key, value in self.commands:
+            self.redis.hashes.setdefault(name, {})[key] = value
+
+
+class FakeAsyncPubSub:
+    def __init__(self):
+        self.subscribed = False
+
+    async def subscribe(self, *channels: str) -> None:
+        self.subscribed = True
+
+    async def get_message(self, ignore_subscribe_messages: bool, timeout: float):
+        await asyncio.sleep(timeout)
+        return None
+
+    async def aclose(self) -> None:
+        pass
+
+
+class FakeAsyncElasticsearch:
+    # Answers searches from canned per-doc hits, failing the `fail_doc_ids`.
+    # Lower chunk orders stand in for higher scores. `routed=False` stands in
+    # for an index created before chunks were routed by doc_id.
+    def __init__(self, chunks: Dict[str, List[DocSchema]], routed: bool = True):
+        self.chunks = chunks
+        self.routed = routed
+        self.fail_doc_ids: Set[str] = set()
+        self.search_calls: List[Dict[str, Any]] = []
+        self.search_routings: List[Optional[str]] = []
+        self.msearch_calls: List[List[Dict[str, Any]]] = []
+        self.indices = self
+
+    async def get_mapping(self, index: str):
+        mappings = {"_routing": {"required": True}} if self.routed else {}
+        return {index: {"mappings": mappings}}
+
+    async def search(
+        self, index: str, body: Dict[str, Any], routing: Optional[str] = None
+    ):
+        self.search_calls.append(body)
+        self.search_routings.append(routing)
+        doc_filter = body["query"]["bool"]["filter"][0]
+        if "terms" in doc_filter:
+            doc_ids = doc_filter["terms"]["doc_id"]
+        else:
+            doc_ids = [doc_filter["term"]["doc_id"]]
+        chunks = sorted(
+            (chunk for doc_id in doc_ids for chunk in self.chunks.get(doc_id, [])),
+            key=lambda chunk: chunk.order,
+        )
+        hits = [
+            {"_source": chunk.model_dump(mode="json")}
+            for chunk in chunks[: body["size"]]
+        ]
+        return {"hits": {"hits": hits}}
+
+    async def msearch(self, index: str, searches: List[Dict[str, Any]]):
+        self.msearch_calls.append(searches)
+        responses = []
+        for body in searches[1::2]:
+            doc_id = body["query"]["bool"]["filter"][0]["term"]["doc_id"]
+            if doc_id in self.fail_doc_ids:
+                responses.append(
+                    {
+                        "error": {
+                            "type": "search_phase_execution_exception",
+                            "reason": "shard failure",
+                        },
+                        "status": 500,
+                    }
+                )
+                continue
+            hits = [
+                {"_source": chunk.model_dump(mode="json")}
+                for chunk in self.chunks.get(doc_id, [])[: body["size"]]
+            ]
+            responses.append({"hits": {"hits": hits}})
+        return {"responses": responses}
+
+
+class FakeAsyncSessionManager:
+    async def __aenter__(self):
+        return None
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+class FakeCollectionRepository(CollectionRepository):
+    def __init__(self):
+        self.collections: Dict[str, List[uuid.UUID]] = {}
+        self.doc_ids: Set[uuid.UUID] = set()
+        self.lookups = 0
+
+    async def get_doc_ids(self, session: Any, name: str) -> Optional[List[uuid.UUID]]:
+        self.lookups += 1
+        doc_ids = self.collections.get(name)
+        return list(doc_ids) if doc_ids is not None else None
+
+    async def fetch_existing_doc_ids(
+        self, session: Any, doc_ids: List[uuid.UUID]
+    ) -> List[uuid.UUID]:
+        return [doc_id for doc_id in doc_ids if doc_id in self.doc_ids]
+
+    async def put_collection(
+        self, session: Any, name: str, doc_ids: List[uuid.UUID]
+    ) -> None:
+        self.collections[name] = list(doc_ids)
+
+
+class FakeBotoS3Client:
+    # In-memory stand-in for the boto3 S3 client, answering ranged GETs as S3
+    # does, with the object size in ContentRange
+    def __init__(self, objects: Dict[str, bytes]):
+        self.objects = objects
+        self.ranges: List[str] = []
+
+    def get_object(self, Bucket: str, Key: str, Range: str = "") -> Dict[str, Any]:
+        data = self.objects[Key]
+        if not Range:
+            return {
+                "Body": StreamingBody(io.BytesIO(data), len(data)),
+                "ContentLength": len(data),
+            }
+
+        self.ranges.append(Range)
+        if not data:
+            raise ClientError(
+                {"Error": {"Code": "InvalidRange", "Message": "Not satisfiable"}},
+                "GetObject",
+            )
+        start, end = (int(pos) for pos in Range.removeprefix("bytes=").split("-"))
+        part = data[start : end + 1]
+        return {
+            "Body": StreamingBody(io.BytesIO(part), len(part)),
+            "ContentLength": len(part),
+            "ContentRange": f"bytes {start}-{start + len(part) - 1}/{len(data)}",
+        }
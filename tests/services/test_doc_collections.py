@@ -0,0 +1,70 @@
+import asyncio
+import uuid
+
+import pytest
+
+from docs.exceptions import CollectionNotFoundError, DocNotFoundError
+from docs.services.doc_collections import DocCollections
+from tests.fakes import FakeAsyncSessionManager, FakeCollectionRepository
+
+
+def _doc_collections(repo: FakeCollectionRepository, ttl: float = 60) -> DocCollections:
+    return DocCollections(
+        read_session_manager=FakeAsyncSessionManager,
+        write_session_manager=FakeAsyncSessionManager,
+        repo=repo,
+        cache_size=10,
+        cache_ttl=ttl,
+    )
+
+
+class TestDocCollections:
+
+    def test_lookups_are_cached(self):
+        # Arrange
+        repo = FakeCollectionRepository()
+        doc_ids = [uuid.uuid4(), uuid.uuid4()]
+        repo.collections = {"reports": doc_ids}
+        doc_collections = _doc_collections(repo)
+
+        async def run():
+            return [await doc_collections.get_doc_ids("reports") for _ in range(3)]
+
+        # Act
+        results = asyncio.run(run())
+
+        # Assert
+        assert results == [doc_ids] * 3
+        assert repo.lookups == 1
+
+    def test_put_replaces_the_cached_docs(self):
+        # Arrange
+        repo = FakeCollectionRepository()
+        old_doc_id, new_doc_id = uuid.uuid4(), uuid.uuid4()
+        repo.doc_ids = {old_doc_id, new_doc_id}
+        repo.collections = {"reports": [old_doc_id]}
+        doc_collections = _doc_collections(repo)
+
+        async def run():
+            await doc_collections.get_doc_ids("reports")
+            await doc_collections.put("reports", [new_doc_id, new_doc_id])
+            return await doc_collections.get_doc_ids("reports")
+
+        # Act
+        doc_ids = asyncio.run(run())
+
+        # Assert
+        assert doc_ids == [new_doc_id]
+        assert repo.lookups == 1
+
+    def test_unknown_collection_and_docs_are_rejected(self):
+        # Arrange
+        repo = FakeCollectionRepository()
+        doc_collections = _doc_collections(repo)
+
+        # Act / Assert
+        with pytest.raises(CollectionNotFoundError):
+            asyncio.run(doc_collections.get_doc_ids("missing"))
+        with pytest.raises(DocNotFoundError):
+            asyncio.run(doc_collections.put("reports", [uuid.uuid4()]))
+        assert repo.collections == {}
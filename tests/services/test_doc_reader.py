@@ -0,0 +1,144 @@
+import asyncio
+import uuid
+
+from clients.elasticsearch.dto import SearchQuery
+from clients.elasticsearch.es import EsClient
+from clients.elasticsearch.schema import DocMetadata, DocSchema
+from docs.models.doc_model import DocStatus, Docs
+from docs.services.doc_reader import DocReader
+from docs.services.search_cache import SearchCache
+from tests.fakes import FakeAsyncElasticsearch, FakeAsyncRedis, FakeDocStatusHub
+
+
+def _doc_reader(hub: FakeDocStatusHub) -> DocReader:
+    return DocReader(
+        es_client=None,
+        doc_index_name="test-index",
+        session_manager=None,
+        repo=None,
+        status_hub=hub,
+        events_heartbeat=0.01,
+        events_timeout=60,
+    )
+
+
+class TestDocReaderWatchStatus:
+
+    def test_yields_pushed_statuses_until_done(self, mocker):
+        # Arrange
+        doc_id = uuid.uuid4()
+        hub = FakeDocStatusHub()
+        doc_reader = _doc_reader(hub)
+        get_doc = mocker.patch.object(
+            doc_reader,
+            "get_doc",
+            return_value=Docs(id=doc_id, status=DocStatus.UPLOADED),
+        )
+
+        async def watch():
+            statuses = []
+            async for status in doc_reader.watch_status(doc_id):
+                if not statuses:
+                    # Published while the doc was being read, then later ones
+                    for pushed in (
+                        DocStatus.UPLOADED,
+                        DocStatus.INDEXING,
+                        DocStatus.INDEXED,
+                    ):
+                        hub.queues[doc_id].put_nowait(pushed)
+                statuses.append(status)
+            return statuses
+
+        # Act
+        statuses = asyncio.run(watch())
+
+        # Assert
+        assert statuses == [DocStatus.UPLOADED, DocStatus.INDEXING, DocStatus.INDEXED]
+        assert get_doc.call_count == 1
+        assert hub.queues == {}
+
+    def test_heartbeats_while_quiet(self, mocker):
+        # Arrange
+        doc_id = uuid.uuid4()
+        hub = FakeDocStatusHub()
+        doc_reader = _doc_reader(hub)
+        mocker.patch.object(
+            doc_reader,
+            "get_doc",
+            return_value=Docs(id=doc_id, status=DocStatus.INDEXING),
+        )
+
+        async def watch():
+            statuses = []
+            async for status in doc_reader.watch_status(doc_id):
+                statuses.append(status)
+                if status is None:
+                    hub.queues[doc_id].put_nowait(DocStatus.INDEXING_FAILED)
+            return statuses
+
+        # Act
+        statuses = asyncio.run(watch())
+
+        # Assert
+        assert statuses == [DocStatus.INDEXING, None, DocStatus.INDEXING_FAILED]
+
+    def test_unknown_doc_yields_nothing(self, mocker):
+        # Arrange
+        hub = FakeDocStatusHub()
+        doc_reader = _doc_reader(hub)
+        mocker.patch.object(doc_reader, "get_doc", return_value=None)
+
+        async def watch():
+            return [status async for status in doc_reader.watch_status(uuid.uuid4())]
+
+        # Act
+        statuses = asyncio.run(watch())
+
+        # Assert
+        assert statuses == []
+        assert hub.queues == {}
+
+
+class TestDocReaderSearchDocsBatch:
+
+    def test_only_uncached_queries_are_searched(self):
+        # Arrange
+        doc_ids = [str(uuid.uuid4()) for _ in range(3)]
+        es = FakeAsyncElasticsearch(
+            {
+                doc_id: [
+                    DocSchema(
+                        doc_id=doc_id,
+                        order=1,
+                        content=doc_id,
+                        metadata=DocMetadata(ext="txt"),
+                    )
+                ]
+                for doc_id in doc_ids
+            }
+        )
+        doc_reader = _doc_reader(FakeDocStatusHub())
+        doc_reader.es_client = EsClient(es)
+        doc_reader.search_cache = SearchCache(
+            redis_client=FakeAsyncRedis(),
+            key_prefix="docs:search:",
+            max_size=100,
+            ttl=60,
+            shared=False,
+        )
+        queries = [SearchQuery(doc_id=doc_id, query="question") for doc_id in doc_ids]
+
+        async def run():
+            await doc_reader.search_docs_batch(queries[:1])
+            results = await doc_reader.search_docs_batch(queries)
+            await doc_reader.search_cache.close()
+            return results
+
+        # Act
+        results = asyncio.run(run())
+
+        # Assert
+        assert [[doc.content for doc in result] for result in results] == [
+            [doc_id] for doc_id in doc_ids
+        ]
+        assert [len(searches) // 2 for searches in es.msearch_calls] == [1, 2]
@@ -0,0 +1,170 @@
+import asyncio
+import json
+import time
+import uuid
+
+import pytest
+
+from clients.elasticsearch.schema import DocMetadata, DocSchema
+from docs.services.search_cache import SearchCache
+from tests.fakes import FakeAsyncRedis
+
+
+def _search_cache(redis: FakeAsyncRedis, shared: bool = True) -> SearchCache:
+    return SearchCache(
+        redis_client=redis,
+        key_prefix="docs:search:",
+        max_size=100,
+        ttl=60,
+        shared=shared,
+    )
+
+
+class FakeSearch:
+    def __init__(self, doc_id: str):
+        self.calls = 0
+        self.doc_id = doc_id
+
+    async def __call__(self):
+        self.calls += 1
+        return [
+            DocSchema(
+                doc_id=self.doc_id,
+                order=1,
+                content=f"result {self.calls}",
+                metadata=DocMetadata(ext="txt"),
+            )
+        ]
+
+
+class TestSearchCache:
+
+    def test_normalized_questions_hit_the_local_tier(self):
+        # Arrange
+        doc_id = str(uuid.uuid4())
+        cache = _search_cache(FakeAsyncRedis(), shared=False)
+        search = FakeSearch(doc_id)
+
+        async def run():
+            first = await cache.get_or_search(doc_id, "What is  RAG?", 10, search)
+            second = await cache.get_or_search(
+                doc_id.upper(), " what is rag? ", 10, search
+            )
+            await cache.close()
+            return first, second
+
+        # Act
+        first, second = asyncio.run(run())
+
+        # Assert
+        assert search.calls == 1
+        assert second == first
+        assert (cache.stats.local_hits, cache.stats.misses) == (1, 1)
+
+    def test_processes_share_the_redis_tier(self):
+        # Arrange
+        doc_id = str(uuid.uuid4())
+        redis = FakeAsyncRedis()
+        caches = [_search_cache(redis), _search_cache(redis)]
+        search = FakeSearch(doc_id)
+
+        async def run():
+            results = [
+                await cache.get_or_search(doc_id, "question", 10, search)
+                for cache in caches
+            ]
+            for cache in caches:
+                await cache.close()
+            return results
+
+        # Act
+        first, second = asyncio.run(run())
+
+        # Assert
+        assert search.calls == 1
+        assert second == first
+        assert caches[1].stats.shared_hits == 1
+
+    @pytest.mark.parametrize(
+        "value",
+        [
+            "{not json",
+            json.dumps({"expiresAt": time.time() + 60, "docs": [{"order": "x"}]}),
+        ],
+        ids=["invalid_json", "invalid_docs"],
+    )
+    def test_unreadable_shared_entry_is_a_miss(self, value):
+        # Arrange
+        doc_id = str(uuid.uuid4())
+        redis = FakeAsyncRedis()
+        writer, reader = _search_cache(redis), _search_cache(redis)
+        search = FakeSearch(doc_id)
+
+        async def run():
+            await writer.get_or_search(doc_id, "question", 10, search)
+            for fields in redis.hashes.values():
+                for field in fields:
+                    fields[field] = value
+            docs = await reader.get_or_search(doc_id, "question", 10, search)
+            await writer.close()
+            await reader.close()
+            return docs
+
+        # Act
+        docs = asyncio.run(run())
+
+        # Assert: searched again, and the fresh result replaced the entry
+        assert search.calls == 2
+        assert [doc.content for doc in docs] == ["result 2"]
+        assert reader.stats.misses == 1
+        assert all(
+            json.loads(field)["docs"][0]["content"] == "result 2"
+            for fields in redis.hashes.values()
+            for field in fields.values()
+        )
+
+    def test_invalidated_doc_is_searched_again(self):
+        # Arrange
+        doc_id = str(uuid.uuid4())
+        other_doc_id = str(uuid.uuid4())
+        cache = _search_cache(FakeAsyncRedis(), shared=False)
+        search = FakeSearch(doc_id)
+        other_search = FakeSearch(other_doc_id)
+
+        async def run():
+            await cache.get_or_search(doc_id, "question", 10, search)
+            await cache.get_or_search(other_doc_id, "question", 10, other_search)
+            cache.invalidate_local(doc_id)
+            await cache.get_or_search(doc_id, "question", 10, search)
+            await cache.get_or_search(other_doc_id, "question", 10, other_search)
+            await cache.close()
+
+        # Act
+        asyncio.run(run())
+
+        # Assert
+        assert search.calls == 2
+        assert other_search.calls == 1
+
+    def test_search_overlapping_an_invalidation_is_not_cached(self):
+        # Arrange
+        doc_id = str(uuid.uuid4())
+        cache = _search_cache(FakeAsyncRedis(), shared=False)
+        search = FakeSearch(doc_id)
+
+        async def invalidating_search():
+            # The doc is re-indexed while its old chunks are being searched
+            cache.invalidate_local(doc_id)
+            return await search()
+
+        async def run():
+            await cache.get_or_search(doc_id, "question", 10, invalidating_search)
+            await cache.get_or_search(doc_id, "question", 10, search)
+            await cache.close()
+
+        # Act
+        asyncio.run(run())
+
+        # Assert
+        assert search.calls == 2
+        assert cache.stats.misses == 2
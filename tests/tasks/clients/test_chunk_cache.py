@@ -0,0 +1,106 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from docs.tasks.clients.chunk_cache import ChunkCache
+
+
+class TestChunkCache:
+
+    def test_put_then_get_round_trips_contents(self, tmp_path):
+        # Arrange
+        cache = ChunkCache(cache_dir=str(tmp_path), max_bytes=1024 * 1024)
+        contents = ["첫 번째 청크", "second chunk", ""]
+
+        # Act
+        stored = cache.put("hash", "v1-100-10", iter(contents))
+        cached = cache.get("hash", "v1-100-10")
+
+        # Assert
+        assert stored is True
+        assert cached is not None
+        assert list(cached) == contents
+        assert cache.get("hash", "v1-200-20") is None
+
+    def test_tee_passes_contents_through_and_caches_them_once_exhausted(self, tmp_path):
+        # Arrange
+        cache = ChunkCache(cache_dir=str(tmp_path), max_bytes=1024 * 1024)
+        contents = ["a", "b", "c"]
+
+        # Act
+        stream = cache.tee("hash", "v1", iter(contents))
+        first = next(stream)
+        visible_midway = cache.get("hash", "v1")
+        rest = list(stream)
+
+        # Assert
+        assert [first, *rest] == contents
+        assert visible_midway is None
+        assert list(cache.get("hash", "v1")) == contents
+
+    def test_failed_contents_are_not_cached(self, tmp_path):
+        # Arrange
+        cache = ChunkCache(cache_dir=str(tmp_path), max_bytes=1024 * 1024)
+
+        def failing_contents():
+            yield "a"
+            raise ValueError("split failed")
+
+        # Act & Assert
+        with pytest.raises(ValueError):
+            cache.put("hash", "v1", failing_contents())
+
+        assert cache.get("hash", "v1") is None
+        assert list(tmp_path.iterdir()) == []
+
+    def test_unwritable_cache_dir_leaves_contents_uncached(self, tmp_path):
+        # Arrange
+        cache_dir = tmp_path / "file"
+        cache_dir.write_text("not a directory")
+        cache = ChunkCache(cache_dir=str(cache_dir), max_bytes=1024 * 1024)
+
+        # Act
+        streamed = list(cache.tee("hash", "v1", iter(["a", "b"])))
+        stored = cache.put("hash", "v1", ["a"])
+
+        # Assert
+        assert streamed == ["a", "b"]
+        assert stored is False
+        assert cache.get("hash", "v1") is None
+
+    def test_evicts_least_recently_used_entries_past_budget(self, tmp_path, mocker):
+        # Arrange
+        contents = [os.urandom(600).hex()]
+        cache = ChunkCache(cache_dir=str(tmp_path), max_bytes=2000)
+        cache.put("old", "v1", contents)
+        cache.put("used", "v1", contents)
+        list(cache.get("used", "v1"))
+        glob = mocker.spy(Path, "glob")
+
+        # Act
+        stored = cache.put("new", "v1", contents)
+
+        # Assert
+        assert stored is True
+        assert cache.get("old", "v1") is None
+        assert cache.get("used", "v1") is not None
+        assert cache.get("new", "v1") is not None
+        # Sizes are kept as a running total, the directory is not rescanned
+        assert glob.call_count == 0
+
+    def test_picks_up_entries_left_by_a_previous_process(self, tmp_path):
+        # Arrange
+        contents = [os.urandom(600).hex()]
+        ChunkCache(cache_dir=str(tmp_path), max_bytes=2000).put("old", "v1", contents)
+        os.utime(tmp_path / "old_v1.msgpack.gz", (0, 0))
+        cache = ChunkCache(cache_dir=str(tmp_path), max_bytes=2000)
+
+        # Act
+        cache.put("a", "v1", contents)
+        cache.put("b", "v1", contents)
+
+        # Assert
+        assert cache.get("old", "v1") is None
+        assert cache.get("a", "v1") is not None
+        assert cache.get("b", "v1") is not None
@@ -0,0 +1,236 @@
+import asyncio
+import uuid
+from typing import List
+
+from clients.elasticsearch.schema import DocMetadata, DocSchema
+from docs.tasks.clients.es_task import AsyncEsTaskClient, EsTaskClient
+
+
+def _make_docs(count: int, content: str = "chunk") -> List[DocSchema]:
+    doc_id = uuid.uuid4()
+    return [
+        DocSchema(
+            doc_id=doc_id,
+            order=order,
+            content=content,
+            chunk_version="v1-100-10",
+            metadata=DocMetadata(ext="txt"),
+        )
+        for order in range(1, count + 1)
+    ]
+
+
+def _record_bulk_batches(mocker) -> List[list]:
+    batches: List[list] = []
+
+    def fake_bulk(actions, **kwargs):
+        batches.append(actions)
+        return len(actions), []
+
+    mocker.patch("docs.tasks.clients.es_task.bulk", side_effect=fake_bulk)
+    return batches
+
+
+def _mock_es(mocker, routed: bool = True, is_async: bool = False):
+    # Elasticsearch client whose index mapping does, or for an index created
+    # before chunks were routed doesn't, require routing
+    es = mocker.Mock()
+    mapping = {"_routing": {"required": True}} if routed else {}
+    get_mapping = mocker.AsyncMock() if is_async else mocker.Mock()
+    get_mapping.side_effect = lambda index: {index: {"mappings": mapping}}
+    es.indices.get_mapping = get_mapping
+    return es
+
+
+class TestEsTaskClientIndexDocs:
+
+    def test_splits_batches_by_action_count(self, mocker):
+        # Arrange
+        batches = _record_bulk_batches(mocker)
+        es_client = EsTaskClient(es_client=_mock_es(mocker), chunk_size=4)
+
+        # Act
+        stats = es_client.index_docs(_make_docs(10), "test-index")
+
+        # Assert
+        assert sorted(len(batch) for batch in batches) == [2, 4, 4]
+        assert stats.indexed == 10
+        assert len(stats.batch_latencies) == 3
+
+    def test_splits_batches_by_bytes(self, mocker):
+        # Arrange
+        batches = _record_bulk_batches(mocker)
+        es_client = EsTaskClient(
+            es_client=_mock_es(mocker), chunk_size=500, max_chunk_bytes=3000
+        )
+
+        # Act
+        stats = es_client.index_docs(_make_docs(6, content="a" * 1000), "test-index")
+
+        # Assert
+        assert [len(batch) for batch in batches] == [2, 2, 2]
+        assert stats.indexed == 6
+
+    def test_uses_deterministic_ids_and_retries_rejections(self, mocker):
+        # Arrange
+        mock_bulk = mocker.patch(
+            "docs.tasks.clients.es_task.bulk", return_value=(1, [])
+        )
+        es_client = EsTaskClient(es_client=_mock_es(mocker), max_retries=3)
+        docs = _make_docs(1)
+
+        # Act
+        es_client.index_docs(docs, "test-index", refresh="wait_for")
+
+        # Assert
+        kwargs = mock_bulk.call_args.kwargs
+        assert kwargs["actions"][0]["_id"] == docs[0].chunk_id
+        assert kwargs["refresh"] == "wait_for"
+        assert kwargs["max_retries"] == 3
+
+    def test_routes_chunks_by_doc_id(self, mocker):
+        # Arrange
+        batches = _record_bulk_batches(mocker)
+        es_client = EsTaskClient(es_client=_mock_es(mocker))
+        docs = _make_docs(2) + _make_docs(2)
+
+        # Act
+        es_client.index_docs(docs, "test-index")
+
+        # Assert
+        assert [action["_routing"] for action in batches[0]] == [
+            str(doc.doc_id) for doc in docs
+        ]
+
+    def test_leaves_chunks_unrouted_on_an_index_created_before_routing(self, mocker):
+        # Arrange
+        batches = _record_bulk_batches(mocker)
+        es_client = EsTaskClient(es_client=_mock_es(mocker, routed=False))
+
+        # Act
+        es_client.index_docs(_make_docs(2), "legacy-index")
+
+        # Assert
+        assert all("_routing" not in action for action in batches[0])
+
+
+class TestEsTaskClientDeleteChunks:
+
+    def test_deletes_every_chunk_of_the_docs(self, mocker):
+        # Arrange
+        es = _mock_es(mocker)
+        doc_ids = [uuid.uuid4(), uuid.uuid4()]
+
+        # Act
+        EsTaskClient(es_client=es).delete_chunks("test-index", doc_ids)
+
+        # Assert
+        kwargs = es.delete_by_query.call_args.kwargs
+        assert kwargs["query"] == {"terms": {"doc_id": [str(d) for d in doc_ids]}}
+        assert kwargs["routing"] == f"{doc_ids[0]},{doc_ids[1]}"
+
+
+class TestEsTaskClientDeleteStaleChunks:
+
+    def test_deletes_only_from_the_docs_shards(self, mocker):
+        # Arrange
+        es = _mock_es(mocker)
+        es_client = EsTaskClient(es_client=es)
+        doc_ids = [uuid.uuid4(), uuid.uuid4()]
+
+        # Act
+        es_client.delete_stale_chunks(
+            "test-index", "v1-100-10", {doc_id: 3 for doc_id in doc_ids}
+        )
+
+        # Assert
+        kwargs = es.delete_by_query.call_args.kwargs
+        assert kwargs["routing"] == f"{doc_ids[0]},{doc_ids[1]}"
+
+    def test_many_docs_delete_from_every_shard(self, mocker):
+        # Arrange: 1000 ids would overflow the 4 KB request line as routing
+        es = _mock_es(mocker)
+        es_client = EsTaskClient(es_client=es)
+        chunk_counts = {uuid.uuid4(): 3 for _ in range(1000)}
+
+        # Act
+        es_client.delete_stale_chunks("test-index", "v1-100-10", chunk_counts)
+
+        # Assert
+        assert es.delete_by_query.call_args.kwargs["routing"] is None
+
+    def test_deletes_from_every_shard_of_an_unrouted_index(self, mocker):
+        # Arrange: its chunks may sit on any shard, whatever their doc_id
+        es = _mock_es(mocker, routed=False)
+        es_client = EsTaskClient(es_client=es)
+
+        # Act
+        es_client.delete_stale_chunks("legacy-index", "v1-100-10", {uuid.uuid4(): 3})
+
+        # Assert
+        assert es.delete_by_query.call_args.kwargs["routing"] is None
+
+
+class TestEsTaskClientCopyChunks:
+
+    def test_reindexes_source_chunks_under_new_doc_id(self, mocker):
+        # Arrange
+        es = _mock_es(mocker)
+        es.reindex.return_value = {"created": 3, "updated": 1}
+        es_client = EsTaskClient(es_client=es)
+        source_id, doc_id = uuid.uuid4(), uuid.uuid4()
+
+        # Act
+        copied = es_client.copy_chunks("test-index", source_id, doc_id, "v1-100-10")
+
+        # Assert
+        kwargs = es.reindex.call_args.kwargs
+        assert copied == 4
+        assert kwargs["source"]["query"]["bool"]["filter"] == [
+            {"term": {"doc_id": str(source_id)}},
+            {"term": {"chunk_version": "v1-100-10"}},
+        ]
+        assert kwargs["script"]["params"] == {"doc_id": str(doc_id)}
+        assert "ctx._routing = params.doc_id" in kwargs["script"]["source"]
+
+    def test_leaves_copies_unrouted_on_an_unrouted_index(self, mocker):
+        # Arrange
+        es = _mock_es(mocker, routed=False)
+        es.reindex.return_value = {"created": 3, "updated": 0}
+
+        # Act
+        EsTaskClient(es_client=es).copy_chunks(
+            "legacy-index", uuid.uuid4(), uuid.uuid4(), "v1-100-10"
+        )
+
+        # Assert
+        assert "ctx._routing" not in es.reindex.call_args.kwargs["script"]["source"]
+
+
+class TestAsyncEsTaskClientIndexDocs:
+
+    def test_bounds_bulk_requests_in_flight(self, mocker):
+        # Arrange
+        in_flight = {"now": 0, "max": 0}
+
+        async def fake_async_bulk(actions, **kwargs):
+            in_flight["now"] += 1
+            in_flight["max"] = max(in_flight["max"], in_flight["now"])
+            await asyncio.sleep(0.01)
+            in_flight["now"] -= 1
+            return len(actions), []
+
+        mocker.patch(
+            "docs.tasks.clients.es_task.async_bulk", side_effect=fake_async_bulk
+        )
+        es_client = AsyncEsTaskClient(
+            es_client=_mock_es(mocker, is_async=True), chunk_size=2, concurrency=3
+        )
+
+        # Act
+        stats = asyncio.run(es_client.index_docs(_make_docs(20), "test-index"))
+
+        # Assert
+        assert stats.indexed == 20
+        assert len(stats.batch_latencies) == 10
+        assert in_flight["max"] == 3
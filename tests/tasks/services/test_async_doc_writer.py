@@ -0,0 +1,111 @@
+import asyncio
+import hashlib
+import uuid
+
+from docs.dtos.docs_dto import IndexDocsParams
+from docs.models.doc_model import DocStatus, Docs, IndexStage
+from docs.tasks.clients.chunk_cache import ChunkCache
+from docs.tasks.services.async_doc_writer import AsyncDocWriter
+from tests.fakes import FakeDocTaskRepository
+
+
+def _txt_params(doc_id: uuid.UUID) -> IndexDocsParams:
+    return IndexDocsParams(key=f"docs/{doc_id}.txt")
+
+
+class TestAsyncDocWriterIndexDocs:
+
+    def test_index_docs_success(
+        self, async_doc_writer: AsyncDocWriter, fake_repo: FakeDocTaskRepository
+    ):
+        # Arrange
+        doc_id = uuid.uuid4()
+        fake_repo.docs_db = {doc_id: Docs(id=doc_id, status=DocStatus.UPLOADED)}
+        params = _txt_params(doc_id)
+
+        # Act
+        asyncio.run(async_doc_writer.index_docs(params))
+
+        # Assert
+        assert [update["status"] for update in fake_repo.status_update_history] == [
+            DocStatus.INDEXING,
+            DocStatus.REFRESH_PENDING,
+        ]
+        assert [doc.content for doc in async_doc_writer.es_client.indexed_docs] == [
+            "fake file content"
+        ]
+        assert fake_repo.docs_db[doc_id].completed_stage == IndexStage.WRITTEN
+        assert fake_repo.docs_db[doc_id].chunk_version == params.chunk_version
+
+    def test_s3_download_failed(
+        self, async_doc_writer: AsyncDocWriter, fake_repo: FakeDocTaskRepository
+    ):
+        # Arrange
+        doc_id = uuid.uuid4()
+        fake_repo.docs_db = {doc_id: Docs(id=doc_id, status=DocStatus.UPLOADED)}
+        params = _txt_params(doc_id)
+        async_doc_writer.s3_client.fail_keys = {params.key}
+
+        # Act
+        asyncio.run(async_doc_writer.index_docs(params))
+
+        # Assert
+        assert fake_repo.docs_db[doc_id].status == DocStatus.DOWNLOAD_FAILED
+        assert async_doc_writer.es_client.indexed_docs == []
+
+    def test_cached_content_is_reused_without_a_checkpoint(
+        self,
+        async_doc_writer: AsyncDocWriter,
+        fake_repo: FakeDocTaskRepository,
+        tmp_path,
+        mocker,
+    ):
+        # Arrange: split by a previous run under another doc id
+        doc_id = uuid.uuid4()
+        params = _txt_params(doc_id)
+        async_doc_writer.chunk_cache = ChunkCache(str(tmp_path), max_bytes=1024 * 1024)
+        content_hash = hashlib.sha256(b"fake file content").hexdigest()
+        async_doc_writer.chunk_cache.put(
+            content_hash, params.chunk_version, ["cached chunk"]
+        )
+        fake_repo.docs_db = {doc_id: Docs(id=doc_id, status=DocStatus.UPLOADED)}
+        split = mocker.spy(async_doc_writer, "_split_contents")
+
+        # Act
+        asyncio.run(async_doc_writer.index_docs(params))
+
+        # Assert
+        split.assert_not_called()
+        assert [doc.content for doc in async_doc_writer.es_client.indexed_docs] == [
+            "cached chunk"
+        ]
+        assert fake_repo.docs_db[doc_id].status == DocStatus.REFRESH_PENDING
+
+
+class TestAsyncDocWriterIndexDocsMany:
+
+    def test_keeps_downloads_in_flight_and_isolates_failures(
+        self, async_doc_writer: AsyncDocWriter, fake_repo: FakeDocTaskRepository
+    ):
+        # Arrange
+        doc_ids = [uuid.uuid4() for _ in range(10)]
+        fake_repo.docs_db = {
+            doc_id: Docs(id=doc_id, status=DocStatus.UPLOADED) for doc_id in doc_ids
+        }
+        params_list = [_txt_params(doc_id) for doc_id in doc_ids]
+        params_list.append(IndexDocsParams(key=f"docs/{uuid.uuid4()}.zip"))
+        async_doc_writer.s3_client.fail_keys = {params_list[0].key}
+
+        # Act
+        asyncio.run(async_doc_writer.index_docs_many(params_list))
+
+        # Assert
+        assert async_doc_writer.s3_client.max_in_flight == async_doc_writer.concurrency
+        assert fake_repo.docs_db[doc_ids[0]].status == DocStatus.DOWNLOAD_FAILED
+        assert all(
+            fake_repo.docs_db[doc_id].status == DocStatus.REFRESH_PENDING
+            for doc_id in doc_ids[1:]
+        )
+        assert {doc.doc_id for doc in async_doc_writer.es_client.indexed_docs} == set(
+            doc_ids[1:]
+        )
@@ -0,0 +1,73 @@
+from types import SimpleNamespace
+
+from docs.models.doc_model import IndexStage
+from docs.tasks.clients.chunk_cache import ChunkCache
+from docs.tasks.services.doc_indexing import is_written, resume_key
+
+
+def _checkpoint(
+    content_hash: str,
+    artifact_key: str,
+    stage: IndexStage = IndexStage.SPLIT,
+    chunk_version: str = "v1-100-10",
+) -> SimpleNamespace:
+    return SimpleNamespace(
+        completed_stage=stage,
+        content_hash=content_hash,
+        artifact_key=artifact_key,
+        chunk_version=chunk_version,
+    )
+
+
+class TestResumeKey:
+
+    def test_resumes_from_the_entry_of_the_same_chunking_params(self, tmp_path):
+        # Arrange
+        cache = ChunkCache(str(tmp_path), max_bytes=1024)
+        checkpoint = _checkpoint("hash", cache.key("hash", "v1-100-10"))
+
+        # Act & Assert
+        assert resume_key(cache, checkpoint, "v1-100-10") == "hash_v1-100-10"
+
+    def test_starts_over_when_the_chunking_params_changed(self, tmp_path):
+        # Arrange
+        cache = ChunkCache(str(tmp_path), max_bytes=1024)
+        checkpoint = _checkpoint("hash", cache.key("hash", "v1-100-10"))
+
+        # Act & Assert
+        assert resume_key(cache, checkpoint, "v1-200-20") is None
+
+    def test_starts_over_without_a_checkpoint_or_cache(self, tmp_path):
+        # Arrange
+        cache = ChunkCache(str(tmp_path), max_bytes=1024)
+        checkpoint = _checkpoint("hash", cache.key("hash", "v1-100-10"))
+
+        # Act & Assert
+        assert resume_key(cache, None, "v1-100-10") is None
+        assert resume_key(None, checkpoint, "v1-100-10") is None
+
+    def test_written_doc_does_not_replay_the_cache(self, tmp_path):
+        # Arrange
+        cache = ChunkCache(str(tmp_path), max_bytes=1024)
+        checkpoint = _checkpoint(
+            "hash", cache.key("hash", "v1-100-10"), stage=IndexStage.WRITTEN
+        )
+
+        # Act & Assert
+        assert resume_key(cache, checkpoint, "v1-100-10") is None
+
+
+class TestIsWritten:
+
+    def test_written_with_the_same_chunking_params(self):
+        # Arrange
+        checkpoint = _checkpoint("hash", None, stage=IndexStage.WRITTEN)
+
+        # Act & Assert
+        assert is_written(checkpoint, "v1-100-10") is True
+        assert is_written(checkpoint, "v1-200-20") is False
+
+    def test_split_or_missing_checkpoint_is_not_written(self):
+        # Act & Assert
+        assert is_written(_checkpoint("hash", "key"), "v1-100-10") is False
+        assert is_written(None, "v1-100-10") is False
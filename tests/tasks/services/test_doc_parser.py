@@ -0,0 +1,79 @@
+import billiard
+import pytest
+
+from docs.models.doc_model import DocStatus
+from docs.tasks.exceptions import StageError
+from docs.tasks.services.doc_parser import (
+    get_reader,
+    get_splitter,
+    init_parser_pool,
+    parse_chunks,
+)
+
+
+def _parse_in_daemon(queue) -> None:
+    # Runs in a daemonic process, like the child of a prefork worker
+    try:
+        pool_resource = init_parser_pool(processes=1)
+        pool = next(pool_resource)
+        try:
+            queue.put(pool.submit(parse_chunks, b"daemon", "txt", 100, 10).result())
+        finally:
+            pool_resource.close()
+    except BaseException as e:
+        queue.put(repr(e))
+
+
+class TestDocParserWarmCaches:
+
+    def test_stateless_readers_are_shared_and_hwp_is_not(self):
+        # Act
+        pdf_readers = [get_reader("pdf"), get_reader("PDF")]
+        hwp_readers = [get_reader("hwp"), get_reader("hwp")]
+
+        # Assert
+        assert pdf_readers[0] is pdf_readers[1]
+        assert hwp_readers[0] is not hwp_readers[1]
+
+    def test_splitters_are_cached_per_chunking_params(self):
+        # Act
+        splitter = get_splitter(512, 64)
+
+        # Assert
+        assert get_splitter(512, 64) is splitter
+        assert get_splitter(512, 32) is not splitter
+        assert splitter.chunk_size == 512
+        assert splitter.chunk_overlap == 64
+
+
+class TestParserPool:
+
+    def test_starts_inside_a_daemonic_process(self):
+        # Arrange
+        ctx = billiard.get_context("fork")
+        queue = ctx.Queue()
+        process = ctx.Process(target=_parse_in_daemon, args=(queue,), daemon=True)
+
+        # Act
+        process.start()
+        result = queue.get(timeout=60)
+        process.join(timeout=10)
+
+        # Assert
+        assert result == ["daemon"]
+
+    def test_parse_errors_reach_the_caller(self):
+        # Arrange
+        pool_resource = init_parser_pool(processes=1)
+        pool = next(pool_resource)
+
+        # Act
+        try:
+            future = pool.submit(parse_chunks, "/missing/file.pdf", "pdf", 100, 10)
+            with pytest.raises(StageError) as e:
+                future.result()
+        finally:
+            pool_resource.close()
+
+        # Assert
+        assert e.value.status == DocStatus.READ_FAILED
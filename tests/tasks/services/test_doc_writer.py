@@ -1,20 +1,33 @@
 import pytest
+import hashlib
+import tracemalloc
 import uuid
 from pathlib import Path
 from datetime import timedelta
 
+from llama_index.core.node_parser import SentenceSplitter
+
 from base.date import get_utc_now
 from docs.dtos.docs_dto import IndexDocsParams
 from docs.exceptions import NotAllowedExtensionError
-from docs.models.doc_model import DocStatus, Docs
+from docs.models.doc_model import DocStatus, Docs, IndexStage
+from docs.tasks.clients.chunk_cache import ChunkCache
+from docs.tasks.services.doc_indexing import validate_extension
+from docs.tasks.services.doc_parser import init_parser_pool
 from docs.tasks.services.doc_writer import DocWriter
+from docs.tasks.services.queue_router import DocQueueRouter
+from docs.tasks.services.status_buffer import StatusBuffer
 from tests.fakes import (
     FakeDocTaskRepository,
     FakeEsTaskClient,
     FakeIndexHandler,
+    FakeLargeReader,
     FakeReader,
     FakeS3Client,
+    FakeSearchCacheInvalidator,
     FakeSession,
+    FakeStatusPublisher,
+    FakeWriteSessionManager,
 )
 
 
@@ -41,6 +54,31 @@ class TestDocWriterIndexDocs:
         assert len(fake_es_client.indexed_docs) > 0
         assert fake_es_client.indexed_docs[0].doc_id == doc_id
         assert fake_es_client.indexed_docs[0].metadata.ext == "pdf"
+        assert fake_es_client.refresh_args == [False]
+
+        last_status_update = fake_repo.status_update_history[-1]
+        assert last_status_update["status"] == DocStatus.REFRESH_PENDING
+        assert doc_id in last_status_update["doc_ids"]
+
+    def test_index_docs_wait_for_refresh(
+        self,
+        doc_writer: DocWriter,
+        fake_es_client: FakeEsTaskClient,
+        fake_repo: FakeDocTaskRepository,
+        index_params: IndexDocsParams,
+        doc_id: uuid.UUID,
+        mocker,
+    ):
+        # Arrange
+        doc_writer.refresh_mode = "wait_for"
+        fake_reader = FakeReader()
+        mocker.patch.object(doc_writer, "_get_reader", return_value=fake_reader)
+
+        # Act
+        doc_writer.index_docs(params=index_params)
+
+        # Assert
+        assert fake_es_client.refresh_args == ["wait_for"]
 
         last_status_update = fake_repo.status_update_history[-1]
         assert last_status_update["status"] == DocStatus.INDEXED
@@ -90,6 +128,28 @@ class TestDocWriterIndexDocs:
         assert doc_id in last_status_update["doc_ids"]
         mock_unlink.assert_called_once()
 
+    def test_read_failed_midway_leaves_no_chunks_indexed(
+        self,
+        doc_writer: DocWriter,
+        fake_es_client: FakeEsTaskClient,
+        fake_repo: FakeDocTaskRepository,
+        index_params: IndexDocsParams,
+        doc_id: uuid.UUID,
+        mocker,
+    ):
+        # Arrange: the first pages stream to Elasticsearch before page 3 fails
+        fake_reader = FakeLargeReader(pages=5, page_size=1024, fail_at=3)
+        mocker.patch.object(doc_writer, "_get_reader", return_value=fake_reader)
+
+        # Act
+        with pytest.raises(Exception, match="Fake reader failed on page 3"):
+            doc_writer.index_docs(params=index_params)
+
+        # Assert
+        assert fake_es_client.indexed_docs
+        assert fake_es_client.chunk_deletes == [[doc_id]]
+        assert fake_repo.status_update_history[-1]["status"] == DocStatus.READ_FAILED
+
     def test_splitting_failed(
         self,
         doc_writer: DocWriter,
@@ -139,6 +199,31 @@ class TestDocWriterIndexDocs:
         assert last_status_update["status"] == DocStatus.INDEXING_FAILED
         assert doc_id in last_status_update["doc_ids"]
 
+    def test_reindex_overwrites_chunks_and_deletes_stale_ones(
+        self,
+        doc_writer: DocWriter,
+        fake_es_client: FakeEsTaskClient,
+        index_params: IndexDocsParams,
+        doc_id: uuid.UUID,
+        mocker,
+    ):
+        # Arrange
+        fake_reader = FakeReader()
+        mocker.patch.object(doc_writer, "_get_reader", return_value=fake_reader)
+
+        # Act
+        doc_writer.index_docs(params=index_params)
+        doc_writer.index_docs(params=index_params)
+
+        # Assert
+        chunk_ids = [doc.chunk_id for doc in fake_es_client.indexed_docs]
+        assert len(chunk_ids) == 2
+        assert chunk_ids[0] == chunk_ids[1]
+        assert fake_es_client.stale_deletes[-1] == {
+            "chunk_version": index_params.chunk_version,
+            "chunk_counts": {doc_id: 1},
+        }
+
     def test_not_allowed_extension(self, doc_writer: DocWriter):
         # Arrange
         params_wrong_ext = IndexDocsParams(
@@ -152,58 +237,1098 @@ class TestDocWriterIndexDocs:
             doc_writer.index_docs(params=params_wrong_ext)
 
 
-class TestDocWriterRetryDocs:
-    def test_retry_when_no_docs_to_retry(
+class TestDocWriterContentDedup:
+
+    def test_identical_indexed_doc_lends_its_chunks(
         self,
         doc_writer: DocWriter,
+        fake_es_client: FakeEsTaskClient,
         fake_repo: FakeDocTaskRepository,
-        fake_index_handler: FakeIndexHandler,
+        index_params: IndexDocsParams,
+        doc_id: uuid.UUID,
+        mocker,
     ):
         # Arrange
+        source_id = uuid.uuid4()
+        fake_repo.docs_db = {
+            source_id: Docs(
+                id=source_id,
+                status=DocStatus.INDEXED,
+                content_hash=hashlib.sha256(b"fake file content").hexdigest(),
+                chunk_version=index_params.chunk_version,
+            ),
+            doc_id: Docs(id=doc_id, status=DocStatus.UPLOADED),
+        }
+        fake_reader = FakeReader()
+        fake_reader.should_fail = True
+        mocker.patch.object(doc_writer, "_get_reader", return_value=fake_reader)
+
         # Act
-        doc_writer.retry_unhandled_docs(index_handler=fake_index_handler)
+        doc_writer.index_docs(params=index_params)
 
         # Assert
-        assert fake_index_handler.called is False
+        assert fake_es_client.copies == [{"source_doc_id": source_id, "doc_id": doc_id}]
+        assert fake_es_client.call_count == 0
+        assert fake_repo.docs_db[doc_id].status == DocStatus.REFRESH_PENDING
+        assert fake_repo.docs_db[doc_id].content_hash == (
+            fake_repo.docs_db[source_id].content_hash
+        )
 
-    def test_retry_success(
+    def test_different_chunk_params_are_parsed_again(
         self,
         doc_writer: DocWriter,
+        fake_es_client: FakeEsTaskClient,
         fake_repo: FakeDocTaskRepository,
-        fake_session: FakeSession,
-        fake_index_handler: FakeIndexHandler,
+        index_params: IndexDocsParams,
+        doc_id: uuid.UUID,
+        mocker,
     ):
         # Arrange
-        now = get_utc_now()
-        doc1_id = uuid.uuid4()
-        doc2_id = uuid.uuid4()
+        source_id = uuid.uuid4()
         fake_repo.docs_db = {
-            doc1_id: Docs(
-                id=doc1_id,
-                bucket="b",
-                key="k1",
-                status=DocStatus.UPLOADED,
-                updated_at=now - timedelta(minutes=20),
+            source_id: Docs(
+                id=source_id,
+                status=DocStatus.INDEXED,
+                content_hash=hashlib.sha256(b"fake file content").hexdigest(),
+                chunk_version="v1-2048-204",
             ),
-            doc2_id: Docs(
-                id=doc2_id,
-                bucket="b",
-                key="k2",
-                status=DocStatus.INDEXING,
-                updated_at=now - timedelta(minutes=30),
+            doc_id: Docs(id=doc_id, status=DocStatus.UPLOADED),
+        }
+        mocker.patch.object(doc_writer, "_get_reader", return_value=FakeReader())
+
+        # Act
+        doc_writer.index_docs(params=index_params)
+
+        # Assert
+        assert fake_es_client.copies == []
+        assert fake_es_client.call_count == 1
+        assert fake_repo.docs_db[doc_id].chunk_version == index_params.chunk_version
+
+    def test_batch_reuses_chunks_of_identical_doc(
+        self,
+        doc_writer: DocWriter,
+        fake_es_client: FakeEsTaskClient,
+        fake_repo: FakeDocTaskRepository,
+        mocker,
+    ):
+        # Arrange
+        source_id, doc_id = uuid.uuid4(), uuid.uuid4()
+        params = IndexDocsParams(key=f"docs/{doc_id}.pdf")
+        fake_repo.docs_db = {
+            source_id: Docs(
+                id=source_id,
+                status=DocStatus.INDEXED,
+                content_hash=hashlib.sha256(b"fake file content").hexdigest(),
+                chunk_version=params.chunk_version,
             ),
         }
+        mocker.patch.object(doc_writer, "_get_reader", return_value=FakeReader())
 
         # Act
-        doc_writer.retry_unhandled_docs(index_handler=fake_index_handler)
+        doc_writer.index_docs_batch([params])
 
         # Assert
-        assert fake_repo.docs_db[doc1_id].status == DocStatus.RETRYING
-        assert fake_repo.docs_db[doc2_id].status == DocStatus.RETRYING
+        assert fake_es_client.copies == [{"source_doc_id": source_id, "doc_id": doc_id}]
+        assert fake_es_client.indexed_docs == []
+        assert fake_es_client.stale_deletes[0]["chunk_counts"] == {doc_id: 1}
+        assert fake_repo.status_update_history[-1] == {
+            "doc_ids": [doc_id],
+            "status": DocStatus.REFRESH_PENDING,
+        }
 
-        assert fake_session.commit_called is True
 
-        assert fake_index_handler.called is True
-        assert len(fake_index_handler.payload) == 2
-        assert {"bucket": "b", "key": "k1"} in fake_index_handler.payload
-        assert {"bucket": "b", "key": "k2"} in fake_index_handler.payload
+class TestDocWriterChunkCache:
+
+    def test_retry_resumes_at_write_stage_from_cache(
+        self,
+        doc_writer: DocWriter,
+        fake_s3_client: FakeS3Client,
+        fake_es_client: FakeEsTaskClient,
+        fake_repo: FakeDocTaskRepository,
+        index_params: IndexDocsParams,
+        doc_id: uuid.UUID,
+        tmp_path,
+        mocker,
+    ):
+        # Arrange
+        doc_writer.chunk_cache = ChunkCache(str(tmp_path), max_bytes=1024 * 1024)
+        fake_repo.docs_db = {doc_id: Docs(id=doc_id, status=DocStatus.UPLOADED)}
+        fake_reader = FakeReader()
+        mocker.patch.object(doc_writer, "_get_reader", return_value=fake_reader)
+
+        fake_es_client.should_fail = True
+        with pytest.raises(Exception, match="Fake Elasticsearch indexing failed"):
+            doc_writer.index_docs(params=index_params)
+
+        fake_es_client.should_fail = False
+        fake_s3_client.should_fail = True
+        fake_reader.should_fail = True
+
+        # Act
+        doc_writer.index_docs(params=index_params)
+
+        # Assert
+        assert [doc.content for doc in fake_es_client.indexed_docs] == [
+            "This is a sentence from a fake document."
+        ]
+        assert fake_repo.docs_db[doc_id].status == DocStatus.REFRESH_PENDING
+        assert fake_repo.docs_db[doc_id].chunk_version == index_params.chunk_version
+        assert fake_repo.docs_db[doc_id].completed_stage == IndexStage.WRITTEN
+        assert fake_repo.docs_db[doc_id].artifact_key is None
+
+    def test_retry_of_a_written_doc_only_writes_its_status(
+        self,
+        doc_writer: DocWriter,
+        fake_s3_client: FakeS3Client,
+        fake_es_client: FakeEsTaskClient,
+        fake_repo: FakeDocTaskRepository,
+        index_params: IndexDocsParams,
+        doc_id: uuid.UUID,
+    ):
+        # Arrange: the worker died between the bulk write and the status write
+        fake_repo.docs_db = {
+            doc_id: Docs(
+                id=doc_id,
+                status=DocStatus.RETRYING,
+                completed_stage=IndexStage.WRITTEN,
+                content_hash="hash",
+                chunk_version=index_params.chunk_version,
+            )
+        }
+        fake_s3_client.should_fail = True
+
+        # Act
+        doc_writer.index_docs(params=index_params)
+
+        # Assert
+        assert fake_es_client.indexed_docs == []
+        assert fake_repo.docs_db[doc_id].status == DocStatus.REFRESH_PENDING
+
+    def test_cached_content_is_reused_without_a_checkpoint(
+        self,
+        doc_writer: DocWriter,
+        fake_es_client: FakeEsTaskClient,
+        fake_repo: FakeDocTaskRepository,
+        index_params: IndexDocsParams,
+        doc_id: uuid.UUID,
+        tmp_path,
+        mocker,
+    ):
+        # Arrange
+        doc_writer.chunk_cache = ChunkCache(str(tmp_path), max_bytes=1024 * 1024)
+        content_hash = hashlib.sha256(b"fake file content").hexdigest()
+        doc_writer.chunk_cache.put(
+            content_hash, index_params.chunk_version, ["cached chunk"]
+        )
+        fake_repo.docs_db = {doc_id: Docs(id=doc_id, status=DocStatus.UPLOADED)}
+        fake_reader = FakeReader()
+        fake_reader.should_fail = True
+        mocker.patch.object(doc_writer, "_get_reader", return_value=fake_reader)
+
+        # Act
+        doc_writer.index_docs(params=index_params)
+
+        # Assert
+        assert [doc.content for doc in fake_es_client.indexed_docs] == ["cached chunk"]
+        assert fake_repo.docs_db[doc_id].status == DocStatus.REFRESH_PENDING
+
+    def test_marks_indexing_and_checkpoints_split_after_failed_write(
+        self,
+        doc_writer: DocWriter,
+        fake_es_client: FakeEsTaskClient,
+        fake_repo: FakeDocTaskRepository,
+        index_params: IndexDocsParams,
+        doc_id: uuid.UUID,
+        tmp_path,
+        mocker,
+    ):
+        # Arrange
+        doc_writer.chunk_cache = ChunkCache(str(tmp_path), max_bytes=1024 * 1024)
+        fake_repo.docs_db = {doc_id: Docs(id=doc_id, status=DocStatus.UPLOADED)}
+        fake_es_client.should_fail = True
+        mocker.patch.object(doc_writer, "_get_reader", return_value=FakeReader())
+
+        # Act
+        with pytest.raises(Exception, match="Fake Elasticsearch indexing failed"):
+            doc_writer.index_docs(params=index_params)
+
+        # Assert
+        doc = fake_repo.docs_db[doc_id]
+        assert fake_repo.status_update_history[0]["status"] == DocStatus.INDEXING
+        assert doc.status == DocStatus.INDEXING_FAILED
+        assert doc.completed_stage == IndexStage.SPLIT
+        assert doc.artifact_key == doc_writer.chunk_cache.key(
+            doc.content_hash, index_params.chunk_version
+        )
+
+    def test_unwritable_cache_never_fails_the_doc(
+        self,
+        doc_writer: DocWriter,
+        fake_es_client: FakeEsTaskClient,
+        fake_repo: FakeDocTaskRepository,
+        index_params: IndexDocsParams,
+        doc_id: uuid.UUID,
+        tmp_path,
+        mocker,
+    ):
+        # Arrange
+        cache_dir = tmp_path / "read-only"
+        cache_dir.write_text("not a directory")
+        doc_writer.chunk_cache = ChunkCache(str(cache_dir), max_bytes=1024 * 1024)
+        fake_repo.docs_db = {doc_id: Docs(id=doc_id, status=DocStatus.UPLOADED)}
+        mocker.patch.object(doc_writer, "_get_reader", return_value=FakeReader())
+
+        # Act
+        doc_writer.index_docs(params=index_params)
+
+        # Assert
+        assert [doc.content for doc in fake_es_client.indexed_docs] == [
+            "This is a sentence from a fake document."
+        ]
+        assert fake_repo.docs_db[doc_id].status == DocStatus.REFRESH_PENDING
+
+    def test_batch_caches_chunks_of_failed_write(
+        self,
+        doc_writer: DocWriter,
+        fake_s3_client: FakeS3Client,
+        fake_es_client: FakeEsTaskClient,
+        fake_repo: FakeDocTaskRepository,
+        tmp_path,
+        mocker,
+    ):
+        # Arrange
+        doc_writer.chunk_cache = ChunkCache(str(tmp_path), max_bytes=1024 * 1024)
+        doc_id = uuid.uuid4()
+        params = IndexDocsParams(key=f"docs/{doc_id}.pdf")
+        fake_repo.docs_db = {doc_id: Docs(id=doc_id, status=DocStatus.UPLOADED)}
+        fake_es_client.should_fail = True
+        mocker.patch.object(doc_writer, "_get_reader", return_value=FakeReader())
+        doc_writer.index_docs_batch([params])
+        fake_es_client.should_fail = False
+        fake_s3_client.should_fail = True
+
+        # Act
+        doc_writer.index_docs_batch([params])
+
+        # Assert
+        assert [doc.content for doc in fake_es_client.indexed_docs] == [
+            "This is a sentence from a fake document."
+        ]
+        assert fake_repo.docs_db[doc_id].status == DocStatus.REFRESH_PENDING
+
+    def test_batch_resumes_from_split_checkpoint(
+        self,
+        doc_writer: DocWriter,
+        fake_s3_client: FakeS3Client,
+        fake_es_client: FakeEsTaskClient,
+        fake_repo: FakeDocTaskRepository,
+        tmp_path,
+        mocker,
+    ):
+        # Arrange
+        doc_writer.chunk_cache = ChunkCache(str(tmp_path), max_bytes=1024 * 1024)
+        doc_id = uuid.uuid4()
+        params = IndexDocsParams(key=f"docs/{doc_id}.pdf")
+        artifact_key = doc_writer.chunk_cache.key("hash", params.chunk_version)
+        doc_writer.chunk_cache.put("hash", params.chunk_version, ["cached chunk"])
+        fake_repo.docs_db = {
+            doc_id: Docs(
+                id=doc_id,
+                status=DocStatus.INDEXING_FAILED,
+                content_hash="hash",
+                completed_stage=IndexStage.SPLIT,
+                artifact_key=artifact_key,
+            )
+        }
+        fake_s3_client.should_fail = True
+        mocker.patch.object(doc_writer, "_get_reader", return_value=FakeReader())
+
+        # Act
+        doc_writer.index_docs_batch([params])
+
+        # Assert
+        assert [doc.content for doc in fake_es_client.indexed_docs] == ["cached chunk"]
+        assert fake_repo.docs_db[doc_id].status == DocStatus.REFRESH_PENDING
+        assert fake_repo.docs_db[doc_id].completed_stage == IndexStage.WRITTEN
+
+
+class TestDocWriterStatusBuffer:
+
+    def test_outcomes_are_written_on_flush(
+        self,
+        doc_writer: DocWriter,
+        fake_repo: FakeDocTaskRepository,
+        fake_session_manager: FakeWriteSessionManager,
+        mocker,
+    ):
+        # Arrange
+        doc_writer.status_buffer = StatusBuffer(
+            write_session_manager=lambda: fake_session_manager,
+            repo=fake_repo,
+            max_size=100,
+            flush_interval=60,
+        )
+        doc_ids = [uuid.uuid4() for _ in range(3)]
+        mocker.patch.object(doc_writer, "_get_reader", return_value=FakeReader())
+
+        # Act
+        for doc_id in doc_ids:
+            doc_writer.index_docs(params=IndexDocsParams(key=f"docs/{doc_id}.pdf"))
+        written_before_flush = [
+            update
+            for update in fake_repo.status_update_history
+            if update["status"] != DocStatus.INDEXING
+        ]
+        doc_writer.status_buffer.flush()
+
+        # Assert
+        assert written_before_flush == []
+        assert fake_repo.status_update_history[-1]["status"] == (
+            DocStatus.REFRESH_PENDING
+        )
+        assert set(fake_repo.status_update_history[-1]["doc_ids"]) == set(doc_ids)
+
+
+class TestDocWriterStatusEvents:
+
+    def test_transitions_are_published(
+        self,
+        doc_writer: DocWriter,
+        fake_repo: FakeDocTaskRepository,
+        doc_id: uuid.UUID,
+        mocker,
+    ):
+        # Arrange
+        fake_repo.docs_db = {doc_id: Docs(id=doc_id, status=DocStatus.UPLOADED)}
+        doc_writer.status_publisher = FakeStatusPublisher()
+        mocker.patch.object(doc_writer, "_get_reader", return_value=FakeReader())
+
+        # Act
+        doc_writer.index_docs(params=IndexDocsParams(key=f"docs/{doc_id}.pdf"))
+        doc_writer.refresh_pending_docs()
+
+        # Assert
+        assert doc_writer.status_publisher.events == [
+            (doc_id, DocStatus.INDEXING),
+            (doc_id, DocStatus.REFRESH_PENDING),
+            (doc_id, DocStatus.INDEXED),
+        ]
+
+    def test_buffered_outcomes_are_published_on_flush(
+        self,
+        doc_writer: DocWriter,
+        fake_repo: FakeDocTaskRepository,
+        fake_session_manager: FakeWriteSessionManager,
+        doc_id: uuid.UUID,
+        mocker,
+    ):
+        # Arrange
+        publisher = FakeStatusPublisher()
+        doc_writer.status_publisher = publisher
+        doc_writer.status_buffer = StatusBuffer(
+            write_session_manager=lambda: fake_session_manager,
+            repo=fake_repo,
+            max_size=100,
+            flush_interval=60,
+            status_publisher=publisher,
+        )
+        mocker.patch.object(doc_writer, "_get_reader", return_value=FakeReader())
+
+        # Act
+        doc_writer.index_docs(params=IndexDocsParams(key=f"docs/{doc_id}.pdf"))
+        published_before_flush = list(publisher.events)
+        doc_writer.status_buffer.flush()
+
+        # Assert
+        assert published_before_flush == [(doc_id, DocStatus.INDEXING)]
+        assert publisher.events[-1] == (doc_id, DocStatus.REFRESH_PENDING)
+
+
+class TestDocWriterSearchCacheInvalidation:
+
+    def test_invalidated_once_refreshed(
+        self,
+        doc_writer: DocWriter,
+        fake_repo: FakeDocTaskRepository,
+        doc_id: uuid.UUID,
+        mocker,
+    ):
+        # Arrange
+        fake_repo.docs_db = {doc_id: Docs(id=doc_id, status=DocStatus.UPLOADED)}
+        doc_writer.search_cache_invalidator = FakeSearchCacheInvalidator()
+        mocker.patch.object(doc_writer, "_get_reader", return_value=FakeReader())
+
+        # Act
+        doc_writer.index_docs(params=IndexDocsParams(key=f"docs/{doc_id}.pdf"))
+        invalidated_before_refresh = list(
+            doc_writer.search_cache_invalidator.invalidated
+        )
+        doc_writer.refresh_pending_docs()
+
+        # Assert
+        assert invalidated_before_refresh == []
+        assert doc_writer.search_cache_invalidator.invalidated == [doc_id]
+
+    def test_invalidated_once_written_with_wait_for(
+        self, doc_writer: DocWriter, doc_id: uuid.UUID, mocker
+    ):
+        # Arrange
+        doc_writer.refresh_mode = "wait_for"
+        doc_writer.search_cache_invalidator = FakeSearchCacheInvalidator()
+        mocker.patch.object(doc_writer, "_get_reader", return_value=FakeReader())
+
+        # Act
+        doc_writer.index_docs(params=IndexDocsParams(key=f"docs/{doc_id}.pdf"))
+
+        # Assert
+        assert doc_writer.search_cache_invalidator.invalidated == [doc_id]
+
+
+class TestDocWriterIndexDocsBatch:
+
+    def test_batch_shares_one_bulk_stream(
+        self,
+        doc_writer: DocWriter,
+        fake_es_client: FakeEsTaskClient,
+        fake_repo: FakeDocTaskRepository,
+        mocker,
+    ):
+        # Arrange
+        doc_ids = [uuid.uuid4() for _ in range(3)]
+        params_list = [IndexDocsParams(key=f"docs/{doc_id}.pdf") for doc_id in doc_ids]
+        mocker.patch.object(doc_writer, "_get_reader", return_value=FakeReader())
+
+        # Act
+        doc_writer.index_docs_batch(params_list)
+
+        # Assert
+        assert fake_es_client.call_count == 1
+        assert {doc.doc_id for doc in fake_es_client.indexed_docs} == set(doc_ids)
+        assert fake_repo.status_update_history[0] == {
+            "doc_ids": doc_ids,
+            "status": DocStatus.INDEXING,
+        }
+        assert len(fake_repo.status_update_history) == 2
+        assert fake_repo.status_update_history[1]["status"] == (
+            DocStatus.REFRESH_PENDING
+        )
+        assert set(fake_repo.status_update_history[1]["doc_ids"]) == set(doc_ids)
+
+    def test_batch_groups_status_updates_by_outcome(
+        self,
+        doc_writer: DocWriter,
+        fake_s3_client: FakeS3Client,
+        fake_es_client: FakeEsTaskClient,
+        fake_repo: FakeDocTaskRepository,
+        mocker,
+    ):
+        # Arrange
+        ok_ids = [uuid.uuid4(), uuid.uuid4()]
+        download_failed_id = uuid.uuid4()
+        not_allowed_id = uuid.uuid4()
+        params_list = [
+            IndexDocsParams(key=f"docs/{ok_ids[0]}.pdf"),
+            IndexDocsParams(key=f"docs/{download_failed_id}.pdf"),
+            IndexDocsParams(key=f"docs/{ok_ids[1]}.txt"),
+            IndexDocsParams(key=f"docs/{not_allowed_id}.zip"),
+        ]
+        fake_s3_client.fail_keys = {f"docs/{download_failed_id}.pdf"}
+
+        def get_reader(ext: str) -> FakeReader:
+            validate_extension(ext, doc_writer.allowed_extensions)
+            return FakeReader()
+
+        mocker.patch.object(doc_writer, "_get_reader", side_effect=get_reader)
+
+        # Act
+        doc_writer.index_docs_batch(params_list)
+
+        # Assert
+        updates = {
+            update["status"]: set(update["doc_ids"])
+            for update in fake_repo.status_update_history[1:]
+        }
+        assert len(fake_repo.status_update_history) == 4
+        assert updates == {
+            DocStatus.REFRESH_PENDING: set(ok_ids),
+            DocStatus.DOWNLOAD_FAILED: {download_failed_id},
+            DocStatus.READ_FAILED: {not_allowed_id},
+        }
+        assert {doc.doc_id for doc in fake_es_client.indexed_docs} == set(ok_ids)
+
+    def test_batch_indexing_failed(
+        self,
+        doc_writer: DocWriter,
+        fake_es_client: FakeEsTaskClient,
+        fake_repo: FakeDocTaskRepository,
+        mocker,
+    ):
+        # Arrange
+        doc_ids = [uuid.uuid4() for _ in range(2)]
+        params_list = [IndexDocsParams(key=f"docs/{doc_id}.pdf") for doc_id in doc_ids]
+        fake_es_client.should_fail = True
+        mocker.patch.object(doc_writer, "_get_reader", return_value=FakeReader())
+
+        # Act
+        doc_writer.index_docs_batch(params_list)
+
+        # Assert
+        assert fake_repo.status_update_history == [
+            {"doc_ids": doc_ids, "status": DocStatus.INDEXING},
+            {"doc_ids": doc_ids, "status": DocStatus.INDEXING_FAILED},
+        ]
+
+    def test_batch_indexing_failed_keeps_the_stage_each_doc_reached(
+        self,
+        doc_writer: DocWriter,
+        fake_s3_client: FakeS3Client,
+        fake_es_client: FakeEsTaskClient,
+        fake_repo: FakeDocTaskRepository,
+        mocker,
+    ):
+        # Arrange
+        written_id, download_failed_id = uuid.uuid4(), uuid.uuid4()
+        params_list = [
+            IndexDocsParams(key=f"docs/{written_id}.pdf"),
+            IndexDocsParams(key=f"docs/{download_failed_id}.pdf"),
+        ]
+        fake_s3_client.fail_keys = {f"docs/{download_failed_id}.pdf"}
+        # The bulk stream fails before it pulls a single chunk
+        fake_es_client.should_fail = True
+        mocker.patch.object(doc_writer, "_get_reader", return_value=FakeReader())
+
+        # Act
+        doc_writer.index_docs_batch(params_list)
+
+        # Assert
+        updates = {
+            update["status"]: update["doc_ids"]
+            for update in fake_repo.status_update_history[1:]
+        }
+        assert updates == {
+            DocStatus.DOWNLOAD_FAILED: [download_failed_id],
+            DocStatus.INDEXING_FAILED: [written_id],
+        }
+
+    def test_batch_deletes_chunks_of_docs_failing_midway(
+        self,
+        doc_writer: DocWriter,
+        fake_es_client: FakeEsTaskClient,
+        fake_repo: FakeDocTaskRepository,
+        mocker,
+    ):
+        # Arrange: the pdf fails to read on page 3, after its first pages
+        written_id, read_failed_id = uuid.uuid4(), uuid.uuid4()
+        params_list = [
+            IndexDocsParams(key=f"docs/{written_id}.txt"),
+            IndexDocsParams(key=f"docs/{read_failed_id}.pdf"),
+        ]
+        readers = {
+            "txt": FakeReader(),
+            "pdf": FakeLargeReader(pages=5, page_size=1024, fail_at=3),
+        }
+        mocker.patch.object(doc_writer, "_get_reader", side_effect=readers.get)
+
+        # Act
+        doc_writer.index_docs_batch(params_list)
+
+        # Assert
+        assert {chunk.doc_id for chunk in fake_es_client.indexed_docs} == {
+            written_id,
+            read_failed_id,
+        }
+        assert fake_es_client.chunk_deletes == [[read_failed_id]]
+        updates = {
+            update["status"]: update["doc_ids"]
+            for update in fake_repo.status_update_history[1:]
+        }
+        assert updates == {
+            DocStatus.READ_FAILED: [read_failed_id],
+            DocStatus.REFRESH_PENDING: [written_id],
+        }
+
+
+class TestDocWriterInMemoryDownload:
+
+    def test_stream_reader_never_touches_filesystem(
+        self,
+        doc_writer: DocWriter,
+        fake_es_client: FakeEsTaskClient,
+        doc_id: uuid.UUID,
+        mocker,
+    ):
+        # Arrange
+        mock_tmp = mocker.patch("tempfile.NamedTemporaryFile")
+
+        # Act
+        doc_writer.index_docs(IndexDocsParams(key=f"docs/{doc_id}.txt"))
+
+        # Assert
+        assert [doc.content for doc in fake_es_client.indexed_docs] == [
+            "fake file content"
+        ]
+        mock_tmp.assert_not_called()
+
+    def test_path_only_reader_gets_temporary_copy(
+        self,
+        doc_writer: DocWriter,
+        index_params: IndexDocsParams,
+        mocker,
+    ):
+        # Arrange
+        fake_reader = FakeReader()
+        mocker.patch.object(doc_writer, "_get_reader", return_value=fake_reader)
+        load_data = mocker.spy(fake_reader, "load_data")
+
+        # Act
+        doc_writer.index_docs(params=index_params)
+
+        # Assert
+        tmp_path = load_data.call_args.args[0]
+        assert isinstance(tmp_path, Path)
+        assert not tmp_path.exists()
+
+
+class TestDocWriterParserPool:
+
+    def test_index_docs_parses_in_parser_process(
+        self,
+        doc_writer: DocWriter,
+        fake_es_client: FakeEsTaskClient,
+        fake_repo: FakeDocTaskRepository,
+        doc_id: uuid.UUID,
+    ):
+        # Arrange
+        pool_resource = init_parser_pool(processes=1)
+        doc_writer.parser_pool = next(pool_resource)
+
+        # Act
+        try:
+            doc_writer.index_docs(IndexDocsParams(key=f"docs/{doc_id}.txt"))
+        finally:
+            pool_resource.close()
+
+        # Assert
+        assert [doc.content for doc in fake_es_client.indexed_docs] == [
+            "fake file content"
+        ]
+        assert fake_repo.status_update_history[-1]["status"] == (
+            DocStatus.REFRESH_PENDING
+        )
+
+
+class TestDocWriterStreaming:
+
+    def test_index_docs_keeps_peak_memory_bounded(
+        self,
+        doc_writer: DocWriter,
+        fake_es_client: FakeEsTaskClient,
+        index_params: IndexDocsParams,
+        mocker,
+    ):
+        # Arrange
+        pages, page_size = 100, 20 * 1024
+        fake_reader = FakeLargeReader(pages=pages, page_size=page_size)
+        fake_es_client.keep_docs = False
+        mocker.patch.object(doc_writer, "_get_reader", return_value=fake_reader)
+
+        # Load the tokenizer up front so its one-off allocation is not measured
+        SentenceSplitter(chunk_size=100, chunk_overlap=10).split_text("warm up")
+
+        # Act
+        tracemalloc.start()
+        try:
+            doc_writer.index_docs(params=index_params)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        # Assert
+        # Materializing documents, nodes and chunks would hold several copies of
+        # the ~2MB text; the streaming pipeline only holds a page worth of chunks.
+        assert fake_es_client.indexed_count > pages
+        assert peak < pages * page_size / 4
+
+    def test_index_docs_batch_keeps_peak_memory_bounded(
+        self,
+        doc_writer: DocWriter,
+        fake_es_client: FakeEsTaskClient,
+        mocker,
+    ):
+        # Arrange
+        pages, page_size = 100, 20 * 1024
+        fake_reader = FakeLargeReader(pages=pages, page_size=page_size)
+        fake_es_client.keep_docs = False
+        mocker.patch.object(doc_writer, "_get_reader", return_value=fake_reader)
+        params_list = [
+            IndexDocsParams(key=f"docs/{uuid.uuid4()}.pdf") for _ in range(3)
+        ]
+
+        SentenceSplitter(chunk_size=100, chunk_overlap=10).split_text("warm up")
+
+        # Act
+        tracemalloc.start()
+        try:
+            doc_writer.index_docs_batch(params_list)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        # Assert: no doc's chunks are collected into a list before the write
+        assert fake_es_client.indexed_count > 3 * pages
+        assert peak < pages * page_size / 4
+
+
+class TestDocWriterRefreshDocs:
+    def test_refresh_when_no_pending_docs(
+        self,
+        doc_writer: DocWriter,
+        fake_es_client: FakeEsTaskClient,
+    ):
+        # Act
+        doc_writer.refresh_pending_docs()
+
+        # Assert
+        assert fake_es_client.refreshed_indexes == []
+
+    def test_refresh_flips_pending_docs_to_indexed(
+        self,
+        doc_writer: DocWriter,
+        fake_es_client: FakeEsTaskClient,
+        fake_repo: FakeDocTaskRepository,
+    ):
+        # Arrange
+        pending_id = uuid.uuid4()
+        indexing_id = uuid.uuid4()
+        fake_repo.docs_db = {
+            pending_id: Docs(id=pending_id, status=DocStatus.REFRESH_PENDING),
+            indexing_id: Docs(id=indexing_id, status=DocStatus.INDEXING),
+        }
+
+        # Act
+        doc_writer.refresh_pending_docs()
+
+        # Assert
+        assert fake_es_client.refreshed_indexes == ["test-index"]
+        assert fake_repo.docs_db[pending_id].status == DocStatus.INDEXED
+        assert fake_repo.docs_db[indexing_id].status == DocStatus.INDEXING
+
+    def test_refresh_keeps_docs_a_newer_attempt_moved_on(
+        self,
+        doc_writer: DocWriter,
+        fake_es_client: FakeEsTaskClient,
+        fake_repo: FakeDocTaskRepository,
+        mocker,
+    ):
+        # Arrange
+        pending_id = uuid.uuid4()
+        restarted_id = uuid.uuid4()
+        fake_repo.docs_db = {
+            pending_id: Docs(id=pending_id, status=DocStatus.REFRESH_PENDING),
+            restarted_id: Docs(id=restarted_id, status=DocStatus.REFRESH_PENDING),
+        }
+        publisher = FakeStatusPublisher()
+        doc_writer.status_publisher = publisher
+
+        def restart_during_refresh(index_name: str) -> None:
+            # A retry starts on the doc between the fetch and the UPDATE
+            fake_repo.docs_db[restarted_id].status = DocStatus.INDEXING
+
+        mocker.patch.object(
+            fake_es_client, "refresh", side_effect=restart_during_refresh
+        )
+
+        # Act
+        doc_writer.refresh_pending_docs()
+
+        # Assert
+        assert fake_repo.docs_db[pending_id].status == DocStatus.INDEXED
+        assert fake_repo.docs_db[restarted_id].status == DocStatus.INDEXING
+        assert publisher.events == [(pending_id, DocStatus.INDEXED)]
+
+
+class TestDocWriterRetryDocs:
+    def test_retry_when_no_docs_to_retry(
+        self,
+        doc_writer: DocWriter,
+        fake_repo: FakeDocTaskRepository,
+        fake_index_handler: FakeIndexHandler,
+    ):
+        # Arrange
+        # Act
+        doc_writer.retry_unhandled_docs(index_handler=fake_index_handler)
+
+        # Assert
+        assert fake_index_handler.called is False
+
+    def test_retry_success(
+        self,
+        doc_writer: DocWriter,
+        fake_repo: FakeDocTaskRepository,
+        fake_session: FakeSession,
+        fake_index_handler: FakeIndexHandler,
+    ):
+        # Arrange
+        now = get_utc_now()
+        doc1_id = uuid.uuid4()
+        doc2_id = uuid.uuid4()
+        fake_repo.docs_db = {
+            doc1_id: Docs(
+                id=doc1_id,
+                bucket="b",
+                key="k1",
+                status=DocStatus.UPLOADED,
+                created_at=now - timedelta(minutes=20),
+            ),
+            doc2_id: Docs(
+                id=doc2_id,
+                bucket="b",
+                key="k2",
+                status=DocStatus.INDEXING,
+                created_at=now - timedelta(hours=3),
+                updated_at=now - timedelta(hours=2),
+            ),
+        }
+
+        # Act
+        doc_writer.retry_unhandled_docs(index_handler=fake_index_handler)
+
+        # Assert
+        assert fake_repo.docs_db[doc1_id].status == DocStatus.RETRYING
+        assert fake_repo.docs_db[doc2_id].status == DocStatus.RETRYING
+
+        assert fake_session.commit_called is True
+
+        assert fake_index_handler.called is True
+        assert len(fake_index_handler.payload) == 2
+        assert {"bucket": "b", "key": "k1"} in fake_index_handler.payload
+        assert {"bucket": "b", "key": "k2"} in fake_index_handler.payload
+
+    def test_retry_routes_docs_by_size_and_extension(
+        self,
+        doc_writer: DocWriter,
+        fake_repo: FakeDocTaskRepository,
+        fake_index_handler: FakeIndexHandler,
+    ):
+        # Arrange
+        doc_writer.queue_router = DocQueueRouter(
+            small_queue="docs.small",
+            bulk_queue="docs.bulk",
+            small_size_limit=1024,
+            small_extensions=["txt"],
+        )
+        created_at = get_utc_now() - timedelta(minutes=20)
+        docs = {
+            "small.txt": (100, "txt"),
+            "large.txt": (4096, "txt"),
+            "small.pdf": (100, "pdf"),
+        }
+        fake_repo.docs_db = {}
+        for key, (size, ext) in docs.items():
+            doc_id = uuid.uuid4()
+            fake_repo.docs_db[doc_id] = Docs(
+                id=doc_id,
+                bucket="b",
+                key=key,
+                size=size,
+                extension=ext,
+                status=DocStatus.UPLOADED,
+                created_at=created_at,
+            )
+
+        # Act
+        doc_writer.retry_unhandled_docs(index_handler=fake_index_handler)
+
+        # Assert
+        queues = fake_index_handler.queues
+        assert queues.keys() == {"docs.small", "docs.bulk"}
+        assert queues["docs.small"] == [{"bucket": "b", "key": "small.txt"}]
+        assert sorted(row["key"] for row in queues["docs.bulk"]) == [
+            "large.txt",
+            "small.pdf",
+        ]
+
+    def test_retry_claims_pages_by_keyset(
+        self,
+        doc_writer: DocWriter,
+        fake_repo: FakeDocTaskRepository,
+        mocker,
+    ):
+        # Arrange
+        now = get_utc_now()
+        doc_writer.retry_batch_size = 2
+        docs = [
+            Docs(
+                id=uuid.uuid4(),
+                bucket="b",
+                key=f"k{minutes}",
+                status=DocStatus.UPLOADED,
+                created_at=now - timedelta(minutes=minutes),
+            )
+            for minutes in (50, 40, 30, 20, 5)
+        ]
+        fake_repo.docs_db = {doc.id: doc for doc in docs}
+        payloads = []
+
+        # Act
+        doc_writer.retry_unhandled_docs(
+            index_handler=lambda payload, queue: payloads.append(payload)
+        )
+
+        # Assert
+        assert [[row["key"] for row in payload] for payload in payloads] == [
+            ["k50", "k40"],
+            ["k30", "k20"],
+        ]
+        assert [
+            after
+            for status, after in fake_repo.claim_calls
+            if status == DocStatus.UPLOADED
+        ] == [
+            None,
+            (docs[1].created_at, docs[1].id),
+            (docs[3].created_at, docs[3].id),
+        ]
+        assert docs[4].status == DocStatus.UPLOADED
+
+    def test_retry_backs_off_exponentially(
+        self,
+        doc_writer: DocWriter,
+        fake_repo: FakeDocTaskRepository,
+        fake_index_handler: FakeIndexHandler,
+    ):
+        # Arrange
+        now = get_utc_now()
+        first_id, third_id = uuid.uuid4(), uuid.uuid4()
+        fake_repo.docs_db = {
+            first_id: Docs(
+                id=first_id,
+                bucket="b",
+                key="k1",
+                status=DocStatus.INDEXING,
+                created_at=now - timedelta(hours=2),
+                updated_at=now - timedelta(hours=2),
+            ),
+            third_id: Docs(
+                id=third_id,
+                bucket="b",
+                key="k3",
+                status=DocStatus.INDEXING_FAILED,
+                created_at=now - timedelta(minutes=20),
+                attempt_count=2,
+                next_attempt_at=now - timedelta(minutes=1),
+            ),
+        }
+
+        # Act
+        doc_writer.retry_unhandled_docs(index_handler=fake_index_handler)
+
+        # Assert
+        first, third = fake_repo.docs_db[first_id], fake_repo.docs_db[third_id]
+        assert first.attempt_count == 1
+        assert third.attempt_count == 3
+        assert timedelta(minutes=9) < first.next_attempt_at - now
+        assert first.next_attempt_at - now <= timedelta(minutes=10, seconds=1)
+        assert timedelta(minutes=39) < third.next_attempt_at - now
+        assert len(fake_index_handler.payload) == 2
+
+    def test_retry_skips_docs_not_due_and_dead_letters_exhausted_ones(
+        self,
+        doc_writer: DocWriter,
+        fake_repo: FakeDocTaskRepository,
+        fake_index_handler: FakeIndexHandler,
+    ):
+        # Arrange
+        now = get_utc_now()
+        waiting_id, exhausted_id = uuid.uuid4(), uuid.uuid4()
+        fake_repo.docs_db = {
+            waiting_id: Docs(
+                id=waiting_id,
+                bucket="b",
+                key="k1",
+                status=DocStatus.INDEXING_FAILED,
+                created_at=now - timedelta(hours=2),
+                attempt_count=1,
+                next_attempt_at=now + timedelta(minutes=5),
+            ),
+            exhausted_id: Docs(
+                id=exhausted_id,
+                bucket="b",
+                key="k2",
+                status=DocStatus.RETRYING,
+                created_at=now - timedelta(days=1),
+                attempt_count=doc_writer.retry_max_attempts,
+                next_attempt_at=now - timedelta(minutes=1),
+            ),
+        }
+
+        # Act
+        doc_writer.retry_unhandled_docs(index_handler=fake_index_handler)
+
+        # Assert
+        assert fake_index_handler.called is False
+        assert fake_repo.docs_db[waiting_id].status == DocStatus.INDEXING_FAILED
+        assert fake_repo.docs_db[exhausted_id].status == DocStatus.DEAD_LETTER
+
+    @pytest.mark.parametrize("status", [DocStatus.INDEXING, DocStatus.RETRYING])
+    def test_retry_leaves_docs_in_flight_until_their_lease_expires(
+        self,
+        doc_writer: DocWriter,
+        fake_repo: FakeDocTaskRepository,
+        fake_index_handler: FakeIndexHandler,
+        status: DocStatus,
+    ):
+        # Arrange: due for a retry, but a worker picked it up minutes ago
+        now = get_utc_now()
+        doc_id = uuid.uuid4()
+        fake_repo.docs_db = {
+            doc_id: Docs(
+                id=doc_id,
+                bucket="b",
+                key="k",
+                status=status,
+                created_at=now - timedelta(hours=2),
+                updated_at=now - timedelta(minutes=5),
+                attempt_count=1,
+                next_attempt_at=now - timedelta(minutes=1),
+            )
+        }
+
+        # Act
+        doc_writer.retry_unhandled_docs(index_handler=fake_index_handler)
+
+        # Assert
+        assert fake_index_handler.called is False
+        assert fake_repo.docs_db[doc_id].status == status
+        assert fake_repo.docs_db[doc_id].attempt_count == 1
+
+    def test_successful_retry_resets_the_retry_state(
+        self,
+        doc_writer: DocWriter,
+        fake_repo: FakeDocTaskRepository,
+        index_params: IndexDocsParams,
+        doc_id: uuid.UUID,
+        mocker,
+    ):
+        # Arrange
+        now = get_utc_now()
+        fake_repo.docs_db = {
+            doc_id: Docs(
+                id=doc_id,
+                status=DocStatus.RETRYING,
+                attempt_count=3,
+                next_attempt_at=now - timedelta(minutes=1),
+                last_error_stage=DocStatus.INDEXING_FAILED.value,
+            )
+        }
+        mocker.patch.object(doc_writer, "_get_reader", return_value=FakeReader())
+
+        # Act
+        doc_writer.index_docs(params=index_params)
+
+        # Assert: a later failure backs off from the first attempt again
+        doc = fake_repo.docs_db[doc_id]
+        assert doc.status == DocStatus.REFRESH_PENDING
+        assert doc.attempt_count == 0
+        assert doc.next_attempt_at is None
+        assert doc.last_error_stage is None
@@ -0,0 +1,119 @@
+import uuid
+
+from docs.models.doc_model import DocStatus, Docs, IndexStage
+from docs.tasks.services.status_buffer import StatusBuffer, init_status_buffer
+from tests.fakes import FakeDocTaskRepository, FakeWriteSessionManager
+
+
+def _make_buffer(
+    fake_repo: FakeDocTaskRepository,
+    fake_session_manager: FakeWriteSessionManager,
+    max_size: int = 100,
+) -> StatusBuffer:
+    return StatusBuffer(
+        write_session_manager=lambda: fake_session_manager,
+        repo=fake_repo,
+        max_size=max_size,
+        flush_interval=60,
+    )
+
+
+class TestStatusBuffer:
+
+    def test_flush_groups_docs_by_latest_status(
+        self,
+        fake_repo: FakeDocTaskRepository,
+        fake_session_manager: FakeWriteSessionManager,
+    ):
+        # Arrange
+        buffer = _make_buffer(fake_repo, fake_session_manager)
+        doc_ids = [uuid.uuid4() for _ in range(3)]
+        fake_repo.docs_db = {
+            doc_id: Docs(id=doc_id, status=DocStatus.INDEXING) for doc_id in doc_ids
+        }
+        buffer.add(doc_ids, DocStatus.INDEXING_FAILED)
+        buffer.add(doc_ids[:2], DocStatus.REFRESH_PENDING, {doc_ids[0]: ("hash", "v1")})
+
+        # Act
+        buffer.flush()
+
+        # Assert
+        updates = {
+            update["status"]: set(update["doc_ids"])
+            for update in fake_repo.status_update_history
+        }
+        assert updates == {
+            DocStatus.REFRESH_PENDING: set(doc_ids[:2]),
+            DocStatus.INDEXING_FAILED: {doc_ids[2]},
+        }
+        assert fake_repo.docs_db[doc_ids[0]].completed_stage == IndexStage.WRITTEN
+
+    def test_flush_drops_outcomes_of_docs_that_moved_on(
+        self,
+        fake_repo: FakeDocTaskRepository,
+        fake_session_manager: FakeWriteSessionManager,
+    ):
+        # Arrange: the sweeper re-queued one doc after its outcome was buffered
+        buffer = _make_buffer(fake_repo, fake_session_manager)
+        indexing_id, retrying_id = uuid.uuid4(), uuid.uuid4()
+        fake_repo.docs_db = {
+            indexing_id: Docs(id=indexing_id, status=DocStatus.INDEXING),
+            retrying_id: Docs(id=retrying_id, status=DocStatus.INDEXING),
+        }
+        buffer.add(
+            [indexing_id, retrying_id],
+            DocStatus.REFRESH_PENDING,
+            {indexing_id: ("hash", "v1"), retrying_id: ("hash", "v1")},
+        )
+        fake_repo.docs_db[retrying_id].status = DocStatus.RETRYING
+
+        # Act
+        buffer.flush()
+
+        # Assert
+        assert fake_repo.docs_db[indexing_id].status == DocStatus.REFRESH_PENDING
+        assert fake_repo.docs_db[retrying_id].status == DocStatus.RETRYING
+        assert fake_repo.docs_db[retrying_id].completed_stage is None
+
+    def test_flushes_once_max_size_docs_are_pending(
+        self,
+        fake_repo: FakeDocTaskRepository,
+        fake_session_manager: FakeWriteSessionManager,
+    ):
+        # Arrange
+        buffer = _make_buffer(fake_repo, fake_session_manager, max_size=3)
+
+        # Act
+        for _ in range(2):
+            buffer.add([uuid.uuid4()], DocStatus.INDEXED)
+        pending_before_full = len(fake_repo.status_update_history)
+        buffer.add([uuid.uuid4()], DocStatus.INDEXED)
+
+        # Assert
+        assert pending_before_full == 0
+        assert len(fake_repo.status_update_history) == 1
+        assert len(fake_repo.status_update_history[0]["doc_ids"]) == 3
+
+    def test_shutdown_flushes_pending_statuses(
+        self,
+        fake_repo: FakeDocTaskRepository,
+        fake_session_manager: FakeWriteSessionManager,
+    ):
+        # Arrange
+        doc_id = uuid.uuid4()
+        resource = init_status_buffer(
+            write_session_manager=lambda: fake_session_manager,
+            repo=fake_repo,
+            max_size=100,
+            flush_interval=60,
+        )
+        buffer = next(resource)
+        buffer.add([doc_id], DocStatus.INDEXED)
+
+        # Act
+        resource.close()
+
+        # Assert
+        assert fake_repo.status_update_history == [
+            {"doc_ids": [doc_id], "status": DocStatus.INDEXED}
+        ]
@@ -0,0 +1,114 @@
+import os
+import uuid
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+import pytest
+from celery.signals import (
+    worker_init,
+    worker_process_init,
+    worker_process_shutdown,
+    worker_shutdown,
+)
+from dependency_injector import providers
+
+from celery_app import celery_app
+from docs.models.doc_model import DocStatus
+from tests.fakes import FakeDocTaskRepository, FakeWriteSessionManager
+
+
+class FakeWorkController:
+    # Signal senders must be hashable, so no SimpleNamespace
+    def __init__(self, pool_cls: str):
+        self.pool_cls = pool_cls
+
+
+@pytest.fixture
+def process_init(mocker):
+    container = celery_app.container
+    es_client = Mock()
+    parser_pool = Mock()
+    warm_up = mocker.patch("celery_app.warm_up")
+
+    with container.es_client.override(providers.Callable(es_client)):
+        with container.parser_pool.override(providers.Callable(parser_pool)):
+            yield SimpleNamespace(
+                es_client=es_client, parser_pool=parser_pool, warm_up=warm_up
+            )
+
+
+@pytest.fixture
+def status_buffer(
+    fake_repo: FakeDocTaskRepository, fake_session_manager: FakeWriteSessionManager
+):
+    container = celery_app.container
+
+    with (
+        container.write_session_manager.override(
+            providers.Object(fake_session_manager)
+        ),
+        container.doc_repository.override(providers.Object(fake_repo)),
+        container.status_publisher.override(providers.Object(None)),
+        container.config.DOCUMENT.STATUS_BUFFER_SIZE.override(100),
+        container.config.DOCUMENT.STATUS_FLUSH_INTERVAL.override(60),
+    ):
+        yield container.status_buffer()
+        container.shutdown_resources()
+
+
+class TestWorkerInit:
+    def test_worker_process_init_warms_up_the_process(self, process_init):
+        # Act: prefork children and the solo pool send it without a sender
+        worker_process_init.send(sender=None)
+
+        # Assert
+        process_init.es_client.assert_called_once()
+        process_init.parser_pool.assert_called_once()
+        process_init.warm_up.assert_called_once()
+
+    def test_worker_init_warms_up_pools_without_child_processes(self, process_init):
+        # Act: the thread pool, like gevent, never sends worker_process_init
+        worker_init.send(sender=FakeWorkController("threads"))
+
+        # Assert
+        process_init.parser_pool.assert_called_once()
+        process_init.warm_up.assert_called_once()
+
+    @pytest.mark.parametrize("pool_cls", ["prefork", "solo"])
+    def test_worker_init_leaves_process_pools_to_worker_process_init(
+        self, process_init, pool_cls
+    ):
+        # Act
+        worker_init.send(sender=FakeWorkController(pool_cls))
+
+        # Assert
+        process_init.warm_up.assert_not_called()
+
+
+class TestWorkerShutdown:
+    @pytest.mark.parametrize(
+        "send_shutdown",
+        [
+            # Prefork children, with sender=None
+            lambda: worker_process_shutdown.send(
+                sender=None, pid=os.getpid(), exitcode=0
+            ),
+            # The worker's own process, the only one with gevent or solo pools
+            lambda: worker_shutdown.send(sender=None),
+        ],
+        ids=["worker_process_shutdown", "worker_shutdown"],
+    )
+    def test_shutdown_flushes_the_status_buffer(
+        self, status_buffer, fake_repo: FakeDocTaskRepository, send_shutdown
+    ):
+        # Arrange
+        doc_id = uuid.uuid4()
+        status_buffer.add([doc_id], DocStatus.INDEXED)
+
+        # Act
+        send_shutdown()
+
+        # Assert
+        assert fake_repo.status_update_history == [
+            {"doc_ids": [doc_id], "status": DocStatus.INDEXED}
+        ]